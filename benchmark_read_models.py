@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+Benchmark the projected timetable read model against full ORM entities.
+
+Seeds a synthetic database with loadtest.seed_database() and loads every
+batch's timetable two ways:
+
+  - entities:  query(Timetable, Subject, Faculty, Classroom), as the views did
+  - projected: load_timetable_slots(), the TimetableSlot read model
+
+For each it reports the time per batch load and the peak memory allocated
+while loading one batch and while loading all rows at once (tracemalloc).
+
+Usage:
+    python benchmark_read_models.py --batches 200 --repeat 5
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import loadtest
+
+
+def load_entities(db, Timetable, Subject, Faculty, Classroom, *criteria):
+    """The (Timetable, Subject, Faculty, Classroom) join the views used before read models"""
+    return db.session.query(Timetable, Subject, Faculty, Classroom).join(
+        Subject, Timetable.subject_id == Subject.id
+    ).join(
+        Faculty, Timetable.faculty_id == Faculty.id
+    ).join(
+        Classroom, Timetable.classroom_id == Classroom.id
+    ).filter(*criteria).all()
+
+
+def measure(load, batch_ids, repeat):
+    """(median ms per batch load, peak KiB for one batch, peak KiB for all rows)"""
+    from timetable_scheduler.app import db, Timetable
+
+    timings = []
+    for _ in range(repeat):
+        for batch_id in batch_ids:
+            # A fresh session per load, like a fresh request
+            db.session.remove()
+            started = time.perf_counter()
+            load(Timetable.batch_id == batch_id)
+            timings.append((time.perf_counter() - started) * 1000)
+
+    peaks = []
+    for criteria in ((Timetable.batch_id == batch_ids[0],), ()):
+        db.session.remove()
+        tracemalloc.start()
+        rows = load(*criteria)
+        peaks.append(tracemalloc.get_traced_memory()[1] / 1024)
+        tracemalloc.stop()
+        del rows
+    db.session.remove()
+    return statistics.median(timings), peaks[0], peaks[1]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--database-url', help='Database to seed (default: a temporary SQLite file). '
+                                                'It is wiped first.')
+    parser.add_argument('--batches', type=int, default=200)
+    parser.add_argument('--subjects-per-batch', type=int, default=6)
+    parser.add_argument('--repeat', type=int, default=5, help='Passes over every batch')
+    args = parser.parse_args(argv)
+
+    database_url = args.database_url
+    if not database_url:
+        database_url = 'sqlite:///' + os.path.join(tempfile.mkdtemp(prefix='readmodels-'), 'bench.db')
+    seeded = loadtest.seed_database(database_url, args.batches, 0, args.subjects_per_batch)
+    print(f"Seeded {args.batches} batches, {seeded['entries']} timetable entries")
+
+    from timetable_scheduler.app import app, db, load_timetable_slots, Batch, Timetable, Subject, Faculty, Classroom
+
+    with app.app_context():
+        batch_ids = [batch_id for (batch_id,) in db.session.query(Batch.id).order_by(Batch.id)]
+        loaders = {
+            'entities': lambda *criteria: load_entities(db, Timetable, Subject, Faculty, Classroom, *criteria),
+            'projected': load_timetable_slots
+        }
+        # Warm up statement caches so neither side pays for compilation
+        for load in loaders.values():
+            load(Timetable.batch_id == batch_ids[0])
+
+        print(f"\n{'loader':<12}{'ms/batch':>10}{'KiB/batch':>12}{'KiB all rows':>15}")
+        results = {}
+        for name, load in loaders.items():
+            results[name] = measure(load, batch_ids, args.repeat)
+            ms, batch_kib, all_kib = results[name]
+            print(f'{name:<12}{ms:>10.2f}{batch_kib:>12.1f}{all_kib:>15.1f}')
+
+        entities, projected = results['entities'], results['projected']
+        print(f"\nprojected vs entities: {entities[0] / projected[0]:.1f}x faster per batch, "
+              f"{entities[1] / projected[1]:.1f}x less memory per batch, "
+              f"{entities[2] / projected[2]:.1f}x less memory for all rows")
+
+
+if __name__ == '__main__':
+    sys.exit(main())
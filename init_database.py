@@ -15,12 +15,13 @@ def initialize_database():
         print("Starting database initialization...")
         
         # Import Flask app
-        from timetable_scheduler.app import app, db, init_db
+        from timetable_scheduler.app import app, db, init_db, ensure_indexes
         
         # Initialize database within app context
         with app.app_context():
             print("Creating database tables...")
             db.create_all()
+            ensure_indexes()
             
             print("Ensuring default users exist...")
             from timetable_scheduler.app import ensure_default_users
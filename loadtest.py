@@ -0,0 +1,392 @@
+#!/usr/bin/env python3
+"""
+HTTP load test for the timetable scheduler.
+
+Seeds a synthetic database, starts the app under gunicorn and drives a mix
+of concurrent traffic against it:
+
+  - students: log in, open student_dashboard, then view_timetable
+  - admins:   log in, then view_all_timetables
+  - editors:  log in, then bursts of update_timetable_entry
+
+For every endpoint it reports throughput, p50/p95/p99 latency and the SQL
+statements per request (from the X-SQL-Statements header the app sends
+when SQL_STATS is on). Passing several --workers values runs the same mix
+against each gunicorn configuration and prints them side by side.
+
+Usage:
+    python loadtest.py --batches 40 --users 50 --duration 30 --workers 1,2,4
+"""
+import argparse
+import gzip
+import http.cookiejar
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+STUDENT_PASSWORD = 'loadtest123'
+EDITOR_USERNAME = 'admin'
+EDITOR_PASSWORD = 'admin123'
+
+
+def seed_database(database_url, batches, students_per_batch, subjects_per_batch):
+    """Fill database_url with a full synthetic institution and return the ids the scenarios need"""
+    os.environ['DATABASE_URL'] = database_url
+    sys.path.insert(0, ROOT)
+    from werkzeug.security import generate_password_hash
+    from timetable_scheduler.app import (app, db, ensure_indexes, ensure_default_users, bump_timetable_version,
+                                         Classroom, Faculty, Subject, Batch, User, Timetable,
+                                         DAYS, TIME_SLOTS, LUNCH_SLOT)
+
+    teaching_slots = [slot for slot in TIME_SLOTS if slot != LUNCH_SLOT]
+    # One faculty member and one room per batch per slot keeps the seed conflict-free
+    faculty_count = batches + subjects_per_batch
+    room_count = batches + 5
+
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        ensure_indexes()
+        ensure_default_users()
+
+        rooms = [Classroom(name=f'Room {i + 1:03d}', capacity=random.choice([40, 60, 80]),
+                           type='lab' if i % 6 == 0 else 'regular') for i in range(room_count)]
+        faculty = [Faculty(name=f'Faculty {i + 1:03d}', email=f'faculty{i + 1}@example.edu',
+                           department='CSE', max_hours_per_day=6) for i in range(faculty_count)]
+        db.session.add_all(rooms + faculty)
+
+        batch_rows = []
+        subjects_by_batch = []
+        for b in range(batches):
+            semester = b % 8 + 1
+            batch = Batch(name=f'CSE-{b + 1:03d}', year=(semester + 1) // 2, semester=semester,
+                          department='CSE', strength=random.randint(30, 70))
+            batch_rows.append(batch)
+            subjects = [Subject(name=f'Subject {b + 1}-{s + 1}', code=f'LT{b + 1:03d}{s + 1:02d}', semester=semester,
+                                department='CSE', hours_per_week=4, type='practical' if s == 0 else 'theory')
+                        for s in range(subjects_per_batch)]
+            for s, subject in enumerate(subjects):
+                subject.faculty.append(faculty[(b + s) % faculty_count])
+            subjects_by_batch.append(subjects)
+            db.session.add(batch)
+            db.session.add_all(subjects)
+        db.session.flush()
+
+        # Hashing is deliberately slow, every student shares one password
+        password_hash = generate_password_hash(STUDENT_PASSWORD)
+        students = []
+        for b, batch in enumerate(batch_rows):
+            for n in range(students_per_batch):
+                username = f'student_{b + 1:03d}_{n + 1:03d}'
+                students.append((username, batch.id))
+                db.session.add(User(username=username, password_hash=password_hash, role='student', batch_id=batch.id))
+
+        entries = []
+        editable = []
+        for b, batch in enumerate(batch_rows):
+            subjects = subjects_by_batch[b]
+            for d, day in enumerate(DAYS):
+                for s, slot in enumerate(teaching_slots):
+                    entry = Timetable(batch_id=batch.id, subject_id=subjects[(d + s) % len(subjects)].id,
+                                      faculty_id=faculty[(b + s) % faculty_count].id,
+                                      classroom_id=rooms[(b + d) % room_count].id,
+                                      day_of_week=day, time_slot=slot)
+                    entries.append(entry)
+                    editable.append((entry, subjects))
+        db.session.add_all(entries)
+        db.session.flush()
+
+        # Editors swap the subject of an existing class, which never creates a clash
+        editable = [{'entry_id': e.id, 'batch_id': e.batch_id, 'day': e.day_of_week, 'time_slot': e.time_slot,
+                     'faculty_id': e.faculty_id, 'classroom_id': e.classroom_id,
+                     'subject_ids': [subject.id for subject in subjects]}
+                    for e, subjects in editable]
+        bump_timetable_version()
+        db.session.commit()
+
+    return {'students': students, 'editable': editable, 'entries': len(entries)}
+
+
+class GunicornServer:
+    """Run the app under gunicorn on a free local port for the duration of a with-block"""
+
+    def __init__(self, database_url, workers=1, threads=1, worker_class='sync', preload=False, extra_args=()):
+        self.database_url = database_url
+        self.workers = workers
+        self.threads = threads
+        self.worker_class = worker_class
+        self.preload = preload
+        self.extra_args = list(extra_args)
+        self.port = _free_port()
+        self.process = None
+
+    @property
+    def base_url(self):
+        return f'http://127.0.0.1:{self.port}'
+
+    @property
+    def label(self):
+        label = f'{self.workers}w x {self.threads}t {self.worker_class}'
+        return label + (' preload' if self.preload else '')
+
+    def __enter__(self):
+        command = [sys.executable, '-m', 'gunicorn', '--bind', f'127.0.0.1:{self.port}',
+                   '--workers', str(self.workers), '--threads', str(self.threads),
+                   '--worker-class', self.worker_class, '--timeout', '180', '--log-level', 'warning']
+        if self.preload:
+            command.append('--preload')
+        command += self.extra_args + ['timetable_scheduler.app:app']
+        env = dict(os.environ, DATABASE_URL=self.database_url, SQL_STATS='1', PYTHONUNBUFFERED='1')
+        self.process = subprocess.Popen(command, cwd=ROOT, env=env, stdout=subprocess.DEVNULL)
+        self._wait_until_ready()
+        return self
+
+    def __exit__(self, *exc):
+        self.process.terminate()
+        try:
+            self.process.wait(timeout=15)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+
+    def _wait_until_ready(self, timeout=60):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if self.process.poll() is not None:
+                raise RuntimeError(f'gunicorn exited with status {self.process.returncode}')
+            try:
+                with urllib.request.urlopen(self.base_url + '/health', timeout=5):
+                    return
+            except OSError:  # refused, reset or timed out while workers boot
+                time.sleep(0.2)
+        raise RuntimeError('gunicorn did not become ready in time')
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+class _NoRedirect(urllib.request.HTTPRedirectHandler):
+    """Time each request on its own instead of folding the redirect target into it"""
+
+    def redirect_request(self, req, fp, code, msg, headers, newurl):
+        return None
+
+
+class Recorder:
+    """Per-endpoint latency, status and SQL statement samples, shared by all virtual users"""
+
+    def __init__(self):
+        self.samples = {}
+        self._lock = threading.Lock()
+
+    def record(self, endpoint, seconds, ok, sql_statements):
+        with self._lock:
+            sample = self.samples.setdefault(endpoint, {'latencies': [], 'errors': 0, 'sql': []})
+            sample['latencies'].append(seconds)
+            if not ok:
+                sample['errors'] += 1
+            if sql_statements is not None:
+                sample['sql'].append(sql_statements)
+
+    def summary(self, elapsed):
+        report = {}
+        for endpoint, sample in sorted(self.samples.items()):
+            latencies = sorted(sample['latencies'])
+            report[endpoint] = {
+                'requests': len(latencies),
+                'errors': sample['errors'],
+                'throughput_rps': round(len(latencies) / elapsed, 1),
+                'p50_ms': _percentile(latencies, 50),
+                'p95_ms': _percentile(latencies, 95),
+                'p99_ms': _percentile(latencies, 99),
+                'sql_per_request': round(sum(sample['sql']) / len(sample['sql']), 1) if sample['sql'] else None
+            }
+        return report
+
+
+def _percentile(sorted_values, percent):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, max(0, int(round(percent / 100 * len(sorted_values))) - 1))
+    return round(sorted_values[index] * 1000, 1)
+
+
+class VirtualUser:
+    """One browser session: its own cookie jar and no automatic redirects"""
+
+    def __init__(self, base_url, recorder):
+        self.base_url = base_url
+        self.recorder = recorder
+        self.reset()
+
+    def reset(self):
+        self.opener = urllib.request.build_opener(
+            urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()), _NoRedirect())
+
+    def request(self, endpoint, path, data=None, json_body=None):
+        headers = {'Accept-Encoding': 'gzip'}
+        if json_body is not None:
+            data = json.dumps(json_body).encode()
+            headers['Content-Type'] = 'application/json'
+        elif data is not None:
+            data = urllib.parse.urlencode(data).encode()
+        req = urllib.request.Request(self.base_url + path, data=data, headers=headers)
+
+        started = time.perf_counter()
+        try:
+            response = self.opener.open(req, timeout=60)
+            status, response_headers, body = response.status, response.headers, response.read()
+        except urllib.error.HTTPError as e:
+            status, response_headers, body = e.code, e.headers, e.read()
+        except OSError:
+            self.recorder.record(endpoint, time.perf_counter() - started, False, None)
+            return None, None
+        elapsed = time.perf_counter() - started
+
+        sql = response_headers.get('X-SQL-Statements')
+        ok = status < 400
+        if ok and json_body is not None:
+            if response_headers.get('Content-Encoding') == 'gzip':
+                body = gzip.decompress(body)
+            ok = json.loads(body).get('success', False)
+        self.recorder.record(endpoint, elapsed, ok, int(sql) if sql is not None else None)
+        return status, response_headers
+
+    def login(self, username, password):
+        self.reset()
+        status, headers = self.request('login', '/login', data={'username': username, 'password': password})
+        # A successful login redirects away from the login page
+        return status == 302 and not headers.get('Location', '').endswith('/login')
+
+
+def student_scenario(user, seed):
+    username, batch_id = random.choice(seed['students'])
+    if user.login(username, STUDENT_PASSWORD):
+        user.request('student_dashboard', '/student')
+        user.request('view_timetable', f'/view_timetable/{batch_id}')
+
+
+def admin_scenario(user, seed):
+    if user.login(EDITOR_USERNAME, EDITOR_PASSWORD):
+        user.request('view_all_timetables', '/view_all_timetables')
+
+
+def editor_scenario(user, seed, burst=10):
+    if not user.login(EDITOR_USERNAME, EDITOR_PASSWORD):
+        return
+    for _ in range(burst):
+        entry = random.choice(seed['editable'])
+        user.request('update_timetable_entry', '/update_timetable_entry', json_body={
+            'action': 'update', 'entry_id': entry['entry_id'], 'batch_id': entry['batch_id'],
+            'day': entry['day'], 'time_slot': entry['time_slot'],
+            'subject_id': random.choice(entry['subject_ids']),
+            'faculty_id': entry['faculty_id'], 'classroom_id': entry['classroom_id']
+        })
+
+
+SCENARIOS = {'student': student_scenario, 'admin': admin_scenario, 'editor': editor_scenario}
+
+
+def run_load(base_url, seed, users, duration, mix):
+    """Run `users` concurrent virtual users for `duration` seconds, picking scenarios by weight"""
+    recorder = Recorder()
+    names = list(mix)
+    weights = [mix[name] for name in names]
+    deadline = time.monotonic() + duration
+
+    def worker():
+        user = VirtualUser(base_url, recorder)
+        while time.monotonic() < deadline:
+            SCENARIOS[random.choices(names, weights)[0]](user, seed)
+
+    started = time.monotonic()
+    threads = [threading.Thread(target=worker, daemon=True) for _ in range(users)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return recorder.summary(time.monotonic() - started)
+
+
+def print_report(label, report):
+    print(f'\n== {label} ==')
+    print(f"{'endpoint':<24}{'reqs':>7}{'err':>6}{'rps':>8}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'sql/req':>9}")
+    for endpoint, row in report.items():
+        sql = '-' if row['sql_per_request'] is None else row['sql_per_request']
+        print(f"{endpoint:<24}{row['requests']:>7}{row['errors']:>6}{row['throughput_rps']:>8}"
+              f"{row['p50_ms']:>9}{row['p95_ms']:>9}{row['p99_ms']:>9}{sql:>9}")
+
+
+def parse_mix(text):
+    mix = {}
+    for part in text.split(','):
+        name, _, weight = part.partition('=')
+        if name.strip() not in SCENARIOS:
+            raise argparse.ArgumentTypeError(f'unknown scenario {name!r}, expected one of {", ".join(SCENARIOS)}')
+        mix[name.strip()] = float(weight or 1)
+    return mix
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Load test the timetable scheduler under gunicorn.')
+    parser.add_argument('--database-url', help='Database to seed and serve (default: a temporary SQLite file). '
+                                               'It is wiped first.')
+    parser.add_argument('--batches', type=int, default=40)
+    parser.add_argument('--students-per-batch', type=int, default=30)
+    parser.add_argument('--subjects-per-batch', type=int, default=6)
+    parser.add_argument('--users', type=int, default=25, help='Concurrent virtual users')
+    parser.add_argument('--duration', type=float, default=30, help='Seconds of load per configuration')
+    parser.add_argument('--mix', type=parse_mix, default=parse_mix('student=8,admin=1,editor=1'),
+                        help='Scenario weights, e.g. student=8,admin=1,editor=1')
+    parser.add_argument('--workers', default='1', help='Comma-separated gunicorn worker counts to compare')
+    parser.add_argument('--threads', type=int, default=1, help='gunicorn threads per worker')
+    parser.add_argument('--worker-class', default='sync')
+    parser.add_argument('--preload', action='store_true', help='Pass --preload like render.yaml does')
+    parser.add_argument('--base-url', help='Load an already running server instead of starting gunicorn '
+                                           '(it must serve the seeded database)')
+    parser.add_argument('--output', '-o', help='Write all results as JSON to this file')
+    args = parser.parse_args()
+
+    database_url = args.database_url
+    if not database_url:
+        database_url = 'sqlite:///' + os.path.join(tempfile.mkdtemp(prefix='timetable-loadtest-'), 'loadtest.db')
+
+    print(f'Seeding {database_url} ...')
+    started = time.monotonic()
+    seed = seed_database(database_url, args.batches, args.students_per_batch, args.subjects_per_batch)
+    print(f"Seeded {args.batches} batches, {len(seed['students'])} students, {seed['entries']} timetable entries "
+          f"in {time.monotonic() - started:.1f}s")
+
+    results = {}
+    if args.base_url:
+        results[args.base_url] = run_load(args.base_url, seed, args.users, args.duration, args.mix)
+        print_report(args.base_url, results[args.base_url])
+    else:
+        for workers in [int(w) for w in args.workers.split(',')]:
+            server = GunicornServer(database_url, workers=workers, threads=args.threads,
+                                    worker_class=args.worker_class, preload=args.preload)
+            with server:
+                results[server.label] = run_load(server.base_url, seed, args.users, args.duration, args.mix)
+            print_report(server.label, results[server.label])
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f'\nResults written to {args.output}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,195 @@
+"""
+Vectorized utilization analytics for rooms and faculty.
+
+The whole Timetable table is loaded once into integer columns and turned
+into occupancy tensors of shape (resource, day, period). Every metric is
+then a NumPy reduction over those tensors, so report time grows with the
+number of rows only through a handful of array operations.
+"""
+import numpy as np
+
+
+def _codes(values, vocabulary):
+    """Map a sequence of labels to their positions in vocabulary (-1 if unknown)"""
+    labels, inverse = np.unique(np.asarray(values, dtype=object).astype(str), return_inverse=True)
+    lookup = {label: i for i, label in enumerate(vocabulary)}
+    label_codes = np.array([lookup.get(label, -1) for label in labels], dtype=np.int64)
+    return label_codes[inverse.reshape(-1)]
+
+
+def _positions(ids, known_ids):
+    """Positions of ids within the sorted known_ids array (-1 if unknown)"""
+    if len(known_ids) == 0:
+        return np.full(len(ids), -1, dtype=np.int64)
+    ids = np.asarray(ids, dtype=np.int64)
+    positions = np.searchsorted(known_ids, ids)
+    positions = np.clip(positions, 0, len(known_ids) - 1)
+    return np.where(known_ids[positions] == ids, positions, -1)
+
+
+def _distribution(values):
+    if values.size == 0:
+        return {'mean': 0, 'median': 0, 'p90': 0, 'max': 0, 'min': 0}
+    return {
+        'mean': round(float(values.mean()), 2),
+        'median': round(float(np.median(values)), 2),
+        'p90': round(float(np.percentile(values, 90)), 2),
+        'max': round(float(values.max()), 2),
+        'min': round(float(values.min()), 2)
+    }
+
+
+def compute_utilization(entries, classrooms, faculty, batches, days, periods, slot_periods,
+                        teaching_periods, top_n=10):
+    """Compute room, faculty, congestion, lab and seat-fit metrics.
+
+    entries: iterable of (batch_id, faculty_id, classroom_id, day, time_slot)
+    classrooms: iterable of (id, name, capacity, type)
+    faculty: iterable of (id, name, max_hours_per_day)
+    batches: iterable of (id, strength)
+    teaching_periods: the periods classes may use (e.g. excluding lunch)
+    """
+    entries = list(entries)
+    classrooms = sorted(classrooms)
+    faculty = sorted(faculty)
+    batches = sorted(batches)
+
+    room_ids = np.array([row[0] for row in classrooms], dtype=np.int64)
+    room_names = [row[1] for row in classrooms]
+    room_capacity = np.array([row[2] for row in classrooms], dtype=np.int64)
+    room_is_lab = np.array([row[3] == 'lab' for row in classrooms], dtype=bool)
+    faculty_ids = np.array([row[0] for row in faculty], dtype=np.int64)
+    faculty_names = [row[1] for row in faculty]
+    faculty_limit = np.array([row[2] or 0 for row in faculty], dtype=np.int64)
+    batch_ids = np.array([row[0] for row in batches], dtype=np.int64)
+    batch_strength = np.array([row[1] for row in batches], dtype=np.int64)
+
+    n_days, n_periods = len(days), len(periods)
+    slots = list(slot_periods)
+    period_index = {period: i for i, period in enumerate(periods)}
+    # slot code -> one-hot row over periods (2-hour labs light up two periods)
+    slot_matrix = np.zeros((len(slots), n_periods), dtype=np.int16)
+    for code, slot in enumerate(slots):
+        for period in slot_periods[slot]:
+            slot_matrix[code, period_index[period]] = 1
+    teaching_mask = np.zeros(n_periods, dtype=bool)
+    teaching_mask[[period_index[p] for p in teaching_periods]] = True
+
+    room_occupancy = np.zeros((len(room_ids), n_days, n_periods), dtype=np.int32)
+    faculty_occupancy = np.zeros((len(faculty_ids), n_days, n_periods), dtype=np.int32)
+    seat_fit = {'undersized_hours': 0, 'tight_hours': 0, 'oversized_hours': 0,
+                'seat_utilization': 0.0, 'wasted_seat_hours': 0, 'shortfall_seat_hours': 0}
+
+    if entries:
+        batch_col, faculty_col, room_col, day_col, slot_col = zip(*entries)
+        b = _positions(batch_col, batch_ids)
+        f = _positions(faculty_col, faculty_ids)
+        r = _positions(room_col, room_ids)
+        d = _codes(day_col, days)
+        s = _codes(slot_col, slots)
+
+        valid = (d >= 0) & (s >= 0)
+        hours_by_row = slot_matrix[np.where(s >= 0, s, 0)]  # (rows, periods)
+
+        rows = valid & (r >= 0)
+        np.add.at(room_occupancy, (r[rows], d[rows]), hours_by_row[rows])
+        rows = valid & (f >= 0)
+        np.add.at(faculty_occupancy, (f[rows], d[rows]), hours_by_row[rows])
+
+        # Seat fit, weighted by the hours each booking occupies the room
+        rows = valid & (r >= 0) & (b >= 0)
+        hours = hours_by_row[rows].sum(axis=1)
+        capacity = room_capacity[r[rows]]
+        strength = batch_strength[b[rows]]
+        ratio = np.divide(strength, capacity, out=np.zeros(len(capacity)), where=capacity > 0)
+        booked_seat_hours = int((capacity * hours).sum())
+        seat_fit = {
+            'undersized_hours': int(hours[strength > capacity].sum()),
+            'tight_hours': int(hours[(strength <= capacity) & (ratio >= 0.75)].sum()),
+            'oversized_hours': int(hours[ratio < 0.5].sum()),
+            'seat_utilization': round(float((np.minimum(strength, capacity) * hours).sum()) / booked_seat_hours, 3)
+                                if booked_seat_hours else 0.0,
+            'wasted_seat_hours': int((np.maximum(capacity - strength, 0) * hours).sum()),
+            'shortfall_seat_hours': int((np.maximum(strength - capacity, 0) * hours).sum())
+        }
+
+    slots_per_week = n_days * int(teaching_mask.sum())
+
+    # Room utilization: share of teachable periods in which the room is in use
+    room_in_use = room_occupancy[:, :, teaching_mask] > 0
+    room_used_periods = room_in_use.sum(axis=(1, 2))
+    room_utilization = room_used_periods / slots_per_week if slots_per_week else np.zeros(len(room_ids))
+    room_order = np.argsort(-room_utilization, kind='stable')
+    rooms_report = [{
+        'id': int(room_ids[i]),
+        'name': room_names[i],
+        'capacity': int(room_capacity[i]),
+        'is_lab': bool(room_is_lab[i]),
+        'used_periods': int(room_used_periods[i]),
+        'utilization': round(float(room_utilization[i]), 3)
+    } for i in room_order]
+
+    # Faculty load: weekly hours and days above the personal daily limit
+    faculty_daily = faculty_occupancy.sum(axis=2)  # (faculty, day)
+    faculty_weekly = faculty_daily.sum(axis=1)
+    overloaded_days = (faculty_daily > faculty_limit[:, None]) & (faculty_limit[:, None] > 0)
+    load_bins = np.array([0, 1, 6, 11, 16, 21, 26, 31], dtype=np.int64)
+    histogram, _ = np.histogram(faculty_weekly, bins=np.append(load_bins, max(int(faculty_weekly.max(initial=0)) + 1, 32)))
+    load_labels = ['0', '1-5', '6-10', '11-15', '16-20', '21-25', '26-30', '31+']
+    faculty_order = np.argsort(-faculty_weekly, kind='stable')[:top_n]
+
+    # Congestion: rooms in use per (day, period) across the institution
+    rooms_in_use = (room_occupancy > 0).sum(axis=0)  # (day, period)
+    available_rooms = max(len(room_ids), 1)
+    peak = np.unravel_index(np.argmax(np.where(teaching_mask[None, :], rooms_in_use, -1)), rooms_in_use.shape)
+
+    # Labs: the same grid restricted to lab rooms
+    lab_occupancy = room_occupancy[room_is_lab]
+    labs_in_use = (lab_occupancy > 0).sum(axis=0)
+    lab_count = int(room_is_lab.sum())
+    lab_used = int((lab_occupancy[:, :, teaching_mask] > 0).sum())
+
+    return {
+        'totals': {
+            'bookings': len(entries),
+            'rooms': len(room_ids),
+            'labs': lab_count,
+            'faculty': len(faculty_ids),
+            'teaching_periods_per_week': slots_per_week
+        },
+        'rooms': {
+            'mean_utilization': round(float(room_utilization.mean()), 3) if len(room_ids) else 0.0,
+            'idle_rooms': int((room_used_periods == 0).sum()),
+            'distribution': _distribution(room_utilization),
+            'busiest': rooms_report[:top_n],
+            'least_used': rooms_report[::-1][:top_n]
+        },
+        'faculty': {
+            'weekly_hours': _distribution(faculty_weekly),
+            'histogram': [{'label': label, 'count': int(count)} for label, count in zip(load_labels, histogram)],
+            'overloaded_faculty_days': int(overloaded_days.sum()),
+            'overloaded_faculty': int(overloaded_days.any(axis=1).sum()),
+            'busiest': [{
+                'id': int(faculty_ids[i]),
+                'name': faculty_names[i],
+                'weekly_hours': int(faculty_weekly[i]),
+                'max_daily_hours': int(faculty_daily[i].max(initial=0)),
+                'limit': int(faculty_limit[i])
+            } for i in faculty_order]
+        },
+        'congestion': {
+            'rooms_in_use': rooms_in_use.tolist(),
+            'share_in_use': np.round(rooms_in_use / available_rooms, 3).tolist(),
+            'peak': {
+                'day': days[peak[0]],
+                'period': periods[peak[1]],
+                'rooms_in_use': int(rooms_in_use[peak]),
+                'share': round(float(rooms_in_use[peak]) / available_rooms, 3)
+            }
+        },
+        'labs': {
+            'labs_in_use': labs_in_use.tolist(),
+            'utilization': round(lab_used / (lab_count * slots_per_week), 3) if lab_count and slots_per_week else 0.0
+        },
+        'seat_fit': seat_fit
+    }
@@ -1,9 +1,39 @@
-from flask import Flask, render_template, request, redirect, url_for, flash, session, jsonify
+from flask import Flask, render_template, request, redirect, url_for, flash, session, jsonify, abort, g, has_request_context
+from markupsafe import Markup
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.schema import CreateIndex
 from werkzeug.security import generate_password_hash, check_password_hash
 from datetime import datetime, timedelta
 import os
+import sys
+import gc
 import json
+import time
+import click
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+# Make the helper modules next to this file importable both under gunicorn
+# (timetable_scheduler.app:app) and when running `python app.py` directly
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import analytics
+import assets
+import audit
+import caching
+import database
+import exams
+import profiling
+import provisioning
+import pubsub
+import readmodels
+import snapshots
+import solver
+import suggestions
 
 app = Flask(__name__)
 
@@ -30,7 +60,239 @@ else:
 
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 
-db = SQLAlchemy(app)
+# Optional SQLite production profile (SQLITE_PROFILE=wal): WAL journal and tuned
+# pragmas, one writer connection per process and a pool of read-only connections
+# that serve reads without waiting on the writer
+SQLITE_WAL = (os.environ.get('SQLITE_PROFILE', '').lower() == 'wal'
+              and app.config['SQLALCHEMY_DATABASE_URI'].startswith('sqlite'))
+SQLITE_PRAGMAS = {
+    'synchronous': 'NORMAL',
+    'busy_timeout': int(os.environ.get('SQLITE_BUSY_TIMEOUT_MS', 5000)),
+    'mmap_size': int(os.environ.get('SQLITE_MMAP_SIZE', 256 * 1024 * 1024)),
+    'cache_size': -int(os.environ.get('SQLITE_CACHE_SIZE_KB', 32 * 1024)),
+    'temp_store': 'MEMORY'
+}
+if SQLITE_WAL:
+    pool_timeout = SQLITE_PRAGMAS['busy_timeout'] / 1000 * 4
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {'pool_size': 1, 'max_overflow': 0, 'pool_timeout': pool_timeout}
+    app.config['SQLALCHEMY_BINDS'] = {
+        database.READER_BIND: {
+            'url': app.config['SQLALCHEMY_DATABASE_URI'],
+            'pool_size': int(os.environ.get('SQLITE_READ_POOL_SIZE', 8)),
+            'max_overflow': 0,
+            'pool_timeout': pool_timeout
+        }
+    }
+
+# Responses smaller than this are not worth compressing on the fly
+app.config['COMPRESS_MIN_SIZE'] = int(os.environ.get('COMPRESS_MIN_SIZE', 1024))
+app.config['COMPRESS_MIMETYPES'] = {'text/html', 'application/json', 'text/csv'}
+
+# Report SQL statements per request in an X-SQL-Statements header (used by loadtest.py)
+app.config['SQL_STATS'] = os.environ.get('SQL_STATS', '').lower() in ('1', 'true', 'yes')
+
+# Admin-only profiling of live workers; with PROFILING unset none of its hooks or routes exist
+app.config['PROFILING'] = os.environ.get('PROFILING', '').lower() in ('1', 'true', 'yes')
+PROFILE_MAX_REQUESTS = 100
+PROFILE_MAX_SECONDS = 120
+PROFILE_SORT_KEYS = ('cumulative', 'tottime', 'calls', 'name')
+# The profiler's own control routes, which it must never be armed on
+PROFILING_ENDPOINTS = frozenset({'profiling_overview', 'profile_requests', 'sample_stacks',
+                                 'reset_profiling', 'download_profile'})
+
+# Optional read replica (DATABASE_REPLICA_URL): read-only GET traffic is served from it
+# whenever it has caught up with the writes the reader could have seen (see route_reads_to_replica)
+replica_url = os.environ.get('DATABASE_REPLICA_URL')
+if replica_url:
+    if replica_url.startswith('postgres://'):
+        replica_url = replica_url.replace('postgres://', 'postgresql://', 1)
+    app.config['SQLALCHEMY_BINDS'] = {
+        database.READER_BIND: dict(app.config.get('SQLALCHEMY_ENGINE_OPTIONS') or {}, url=replica_url)
+    }
+
+db = SQLAlchemy(app, session_options={'class_': database.RoutingSession})
+
+if SQLITE_WAL:
+    with app.app_context():
+        database.configure_sqlite(db.engines[None], SQLITE_PRAGMAS, writer=True)
+        if not replica_url:
+            database.configure_sqlite(db.engines[database.READER_BIND], SQLITE_PRAGMAS)
+            # Readers see every commit at once, so even POST requests read there and use the
+            # writer (and hold the write lock) only from their first write on
+            app.config[database.READER_SHARES_PRIMARY] = True
+        # Switch the file to WAL before any reader opens it
+        with db.engine.connect():
+            pass
+
+# Static asset pipeline - content-hashed URLs with precompressed variants
+_asset_manifest = None
+_asset_signature = None
+
+def get_asset_manifest():
+    """Build the asset manifest once per worker; in debug mode, rebuild it uncompressed when a static file changes"""
+    global _asset_manifest, _asset_signature
+    if _asset_manifest is None or app.debug:
+        signature = assets.static_signature(app.static_folder) if app.debug else None
+        if _asset_manifest is None or signature != _asset_signature:
+            _asset_manifest = assets.build_manifest(app.static_folder, compress=not app.debug)
+            _asset_signature = signature
+    return _asset_manifest
+
+@app.template_global()
+def asset_url(filename):
+    """Fingerprinted URL for a file under static/, falling back to the plain static URL"""
+    by_source, _ = get_asset_manifest()
+    asset = by_source.get(filename)
+    if asset is None:
+        return url_for('static', filename=filename)
+    return url_for('hashed_asset', filename=asset.hashed_path)
+
+@app.route('/assets/<path:filename>')
+def hashed_asset(filename):
+    """Serve a fingerprinted asset with immutable caching and the best precompressed variant"""
+    _, by_hashed = get_asset_manifest()
+    asset = by_hashed.get(filename)
+    if asset is None:
+        abort(404)
+    
+    if asset.etag in request.if_none_match:
+        response = app.response_class(status=304)
+    else:
+        body, encoding = asset.variant(request.headers.get('Accept-Encoding'))
+        response = app.response_class(body, mimetype=asset.mimetype)
+        if encoding:
+            response.headers['Content-Encoding'] = encoding
+    
+    response.set_etag(asset.etag)
+    response.headers['Cache-Control'] = assets.IMMUTABLE_CACHE_CONTROL
+    response.vary.add('Accept-Encoding')
+    return response
+
+if app.config['SQL_STATS']:
+    @event.listens_for(Engine, 'before_cursor_execute')
+    def count_sql_statement(conn, cursor, statement, parameters, context, executemany):
+        if has_request_context():
+            g.sql_statements = g.get('sql_statements', 0) + 1
+    
+    @app.after_request
+    def report_sql_statements(response):
+        response.headers['X-SQL-Statements'] = str(g.get('sql_statements', 0))
+        return response
+
+if app.config['PROFILING']:
+    request_profiler = profiling.RequestProfiler()
+    stack_sampler = profiling.StackSampler()
+    
+    @app.before_request
+    def start_request_profile():
+        stack_sampler.request_started()
+        g.profile = request_profiler.start(request.endpoint)
+    
+    @app.teardown_request
+    def finish_request_profile(exc):
+        stack_sampler.request_finished()
+        profile = g.pop('profile', None)
+        if profile is not None:
+            request_profiler.finish(profile)
+    
+    def profiling_status():
+        return {'requests': request_profiler.status(), 'sampler': stack_sampler.status()}
+    
+    @app.route('/profiling')
+    def profiling_overview():
+        """What is armed or sampling in this worker, and what has been captured"""
+        if 'user_id' not in session or session.get('user_role') != 'admin':
+            return jsonify({'error': 'Access denied'}), 403
+        return jsonify(dict(profiling_status(), pid=os.getpid()))
+    
+    @app.route('/profiling/requests', methods=['POST'])
+    def profile_requests():
+        """Profile the next `count` requests to `endpoint` in this worker with cProfile"""
+        if 'user_id' not in session or session.get('user_role') != 'admin':
+            return jsonify({'error': 'Access denied'}), 403
+        
+        data = request.get_json(silent=True) or request.form
+        endpoint = data.get('endpoint')
+        if endpoint not in app.view_functions or endpoint in PROFILING_ENDPOINTS:
+            return jsonify({'error': f'Unknown endpoint: {endpoint}'}), 400
+        try:
+            count = max(1, min(int(data.get('count', 1)), PROFILE_MAX_REQUESTS))
+        except (TypeError, ValueError):
+            return jsonify({'error': 'count must be a number'}), 400
+        
+        request_profiler.arm(endpoint, count)
+        return jsonify(dict(profiling_status(), pid=os.getpid()))
+    
+    @app.route('/profiling/sample', methods=['POST'])
+    def sample_stacks():
+        """Sample the stacks of this worker's request threads (or all threads) for a time window"""
+        if 'user_id' not in session or session.get('user_role') != 'admin':
+            return jsonify({'error': 'Access denied'}), 403
+        
+        data = request.get_json(silent=True) or request.form
+        try:
+            seconds = max(0.1, min(float(data.get('seconds', 10)), PROFILE_MAX_SECONDS))
+            interval = max(1.0, float(data.get('interval_ms', 10))) / 1000
+        except (TypeError, ValueError):
+            return jsonify({'error': 'seconds and interval_ms must be numbers'}), 400
+        all_threads = str(data.get('threads', 'requests')).lower() == 'all'
+        
+        if not stack_sampler.start(seconds, interval, all_threads):
+            return jsonify({'error': 'A sampling window is already running'}), 409
+        return jsonify(dict(profiling_status(), pid=os.getpid())), 202
+    
+    @app.route('/profiling/reset', methods=['POST'])
+    def reset_profiling():
+        if 'user_id' not in session or session.get('user_role') != 'admin':
+            return jsonify({'error': 'Access denied'}), 403
+        request_profiler.reset()
+        stack_sampler.stop()
+        return jsonify(dict(profiling_status(), pid=os.getpid()))
+    
+    @app.route('/profiling/download/<string:kind>')
+    def download_profile(kind):
+        """requests.prof (pstats), requests.txt (pstats table, ?sort=) or stacks.txt (collapsed stacks)"""
+        if 'user_id' not in session or session.get('user_role') != 'admin':
+            return jsonify({'error': 'Access denied'}), 403
+        
+        if kind == 'requests.prof':
+            body, mimetype = request_profiler.dump(), 'application/octet-stream'
+        elif kind == 'requests.txt':
+            sort = request.args.get('sort', 'cumulative')
+            if sort not in PROFILE_SORT_KEYS:
+                return jsonify({'error': f'Unknown sort key: {sort}'}), 400
+            body, mimetype = request_profiler.report(sort, request.args.get('limit', 60, type=int)), 'text/plain'
+        elif kind == 'stacks.txt':
+            body, mimetype = stack_sampler.collapsed() or None, 'text/plain'
+        else:
+            abort(404)
+        if body is None:
+            return jsonify({'error': 'Nothing captured yet'}), 404
+        
+        response = app.response_class(body, mimetype=mimetype)
+        response.headers['Content-Disposition'] = f'attachment; filename="{os.getpid()}-{kind}"'
+        return response
+
+@app.after_request
+def compress_response(response):
+    """Compress large dynamic responses (e.g. full timetable grids) on the fly"""
+    if (response.status_code != 200
+            or response.direct_passthrough
+            or response.is_streamed
+            or 'Content-Encoding' in response.headers
+            or response.mimetype not in app.config['COMPRESS_MIMETYPES']):
+        return response
+    
+    body = response.get_data()
+    if len(body) < app.config['COMPRESS_MIN_SIZE']:
+        return response
+    
+    response.vary.add('Accept-Encoding')
+    compressed, encoding = assets.compress_body(body, request.headers.get('Accept-Encoding'))
+    if compressed is not None:
+        response.set_data(compressed)
+        response.headers['Content-Encoding'] = encoding
+    return response
 
 # Association table for many-to-many relationship between subjects and faculty
 subject_faculty = db.Table('subject_faculty',
@@ -98,13 +360,769 @@ class Timetable(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     is_approved = db.Column(db.Boolean, default=False)
 
+class BatchTimetableState(db.Model):
+    """Per-batch timetable version, bumped on every write so cached views can be keyed by it"""
+    # No foreign key: the counter outlives a deleted batch so a reused id never repeats a version
+    batch_id = db.Column(db.Integer, primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+class ResourceDayVersion(db.Model):
+    """Version of one faculty member's or classroom's bookings on one day, for compare-and-swap edits"""
+    kind = db.Column(db.String(10), primary_key=True)  # faculty, classroom
+    resource_id = db.Column(db.Integer, primary_key=True)
+    day_of_week = db.Column(db.String(10), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+
+class FacultyDayLoad(db.Model):
+    """Hours a faculty member teaches on one day across all batches, kept in step with every Timetable write"""
+    # No foreign key: rows are removed together with the faculty member
+    faculty_id = db.Column(db.Integer, primary_key=True)
+    day_of_week = db.Column(db.String(10), primary_key=True)
+    hours = db.Column(db.Integer, nullable=False, default=0)
+
+class FacultyAvailability(db.Model):
+    """When a faculty member can and would rather teach, as bitmasks over DAYS x TIME_SLOTS periods"""
+    # No foreign key: the row is removed together with the faculty member; no row means always available
+    faculty_id = db.Column(db.Integer, primary_key=True)
+    available = db.Column(db.BigInteger, nullable=False)
+    preferred = db.Column(db.BigInteger, nullable=False, default=0)  # 0: no preference
+
+class CacheVersion(db.Model):
+    """Named version counters for cached payloads that are not tied to one batch"""
+    name = db.Column(db.String(50), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+
+class TimetableApproval(db.Model):
+    """Approval of one timetable version of a batch - any later edit makes it stale"""
+    batch_id = db.Column(db.Integer, db.ForeignKey('batch.id'), primary_key=True)
+    version = db.Column(db.Integer, nullable=False)
+    approved_by = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=True)
+    approved_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    approver = db.relationship('User')
+
+class TimetableSnapshot(db.Model):
+    """Immutable, compactly encoded copy of one batch timetable (see snapshots.py)"""
+    id = db.Column(db.Integer, primary_key=True)
+    batch_id = db.Column(db.Integer, db.ForeignKey('batch.id'), nullable=False, index=True)
+    source = db.Column(db.String(20), nullable=False)  # generated, edited
+    entry_count = db.Column(db.Integer, nullable=False)
+    payload = db.Column(db.LargeBinary, nullable=False)
+    created_by = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    creator = db.relationship('User')
+
+class ActiveTimetableSnapshot(db.Model):
+    """Pointer to the snapshot a batch's live timetable was last generated or restored from"""
+    batch_id = db.Column(db.Integer, db.ForeignKey('batch.id'), primary_key=True)
+    snapshot_id = db.Column(db.Integer, db.ForeignKey('timetable_snapshot.id'), nullable=False)
+    activated_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+class TimetableGenerationRun(db.Model):
+    """Solver seed and settings behind a generated snapshot, so the result can be reproduced"""
+    # No foreign key: rows are removed together with their snapshot when it is pruned
+    snapshot_id = db.Column(db.Integer, primary_key=True)
+    batch_id = db.Column(db.Integer, nullable=False, index=True)
+    seed = db.Column(db.BigInteger, nullable=False)
+    config_index = db.Column(db.Integer, nullable=False, default=0)
+    mode = db.Column(db.String(10), nullable=False, default='first')
+    attempts = db.Column(db.Integer, nullable=False, default=1)
+    finished = db.Column(db.Integer, nullable=False, default=1)
+    score = db.Column(db.Float)
+    complete = db.Column(db.Boolean, default=False)
+    elapsed_ms = db.Column(db.Integer)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+class ExamEntry(db.Model):
+    """One batch's sitting of a subject's exam, from the last exam schedule (see exams.py)"""
+    # No foreign keys: the schedule is replaced as a whole, and rows go with their subject, batch or room
+    id = db.Column(db.Integer, primary_key=True)
+    subject_id = db.Column(db.Integer, nullable=False, index=True)
+    batch_id = db.Column(db.Integer, nullable=False, index=True)
+    classroom_id = db.Column(db.Integer, nullable=False, index=True)
+    slot = db.Column(db.Integer, nullable=False)  # 0-based, exam_day and session follow from it
+    exam_day = db.Column(db.Integer, nullable=False)  # 1-based day of the exam period
+    session = db.Column(db.String(20), nullable=False)  # Morning, Afternoon, Evening
+
+# Expression indexes backing the case-insensitive prefix search on the manage pages
+db.Index('ix_classroom_name_lower', db.func.lower(Classroom.name))
+db.Index('ix_faculty_name_lower', db.func.lower(Faculty.name))
+db.Index('ix_subject_name_lower', db.func.lower(Subject.name))
+db.Index('ix_subject_code_lower', db.func.lower(Subject.code))
+db.Index('ix_batch_name_lower', db.func.lower(Batch.name))
+db.Index('ix_user_username_lower', db.func.lower(User.username))
+
+# Timetable lookups by batch and by resource (faculty/classroom views, conflict checks)
+db.Index('ix_timetable_batch_id', Timetable.batch_id)
+db.Index('ix_timetable_faculty_slot', Timetable.faculty_id, Timetable.day_of_week, Timetable.time_slot)
+db.Index('ix_timetable_classroom_slot', Timetable.classroom_id, Timetable.day_of_week, Timetable.time_slot)
+
+def ensure_indexes():
+    """Create indexes declared on tables that already existed (create_all skips those)"""
+    with db.engine.begin() as conn:
+        for table in db.metadata.sorted_tables:
+            for index in table.indexes:
+                conn.execute(CreateIndex(index, if_not_exists=True))
+
+# Weekly grid layout shared by the timetable views
+DAYS = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday']
+TIME_SLOTS = ['09:15-10:15', '10:15-11:15', '11:15-12:15', '12:15-01:00', '01:00-02:00', '02:00-03:00', '03:00-04:00']
+LAB_TIME_SLOTS = ['09:15-11:15', '10:15-12:15', '01:00-03:00', '02:00-04:00']
+LUNCH_SLOT = '12:15-01:00'
+
+# One-hour periods covered by each slot (2-hour labs span two periods)
+SLOT_PERIODS = {slot: (slot,) for slot in TIME_SLOTS}
+SLOT_PERIODS.update({
+    '09:15-11:15': ('09:15-10:15', '10:15-11:15'),
+    '10:15-12:15': ('10:15-11:15', '11:15-12:15'),
+    '01:00-03:00': ('01:00-02:00', '02:00-03:00'),
+    '02:00-04:00': ('02:00-03:00', '03:00-04:00')
+})
+
+# Rendered timetable grids keyed by (fragment, batch_id, version)
+grid_cache = caching.LRUCache(max_entries=int(os.environ.get('GRID_CACHE_SIZE', 512)))
+
+# Subject/faculty payloads for the generation form keyed by (semester, department, version)
+subject_faculty_cache = caching.LRUCache(max_entries=int(os.environ.get('SUBJECT_CACHE_SIZE', 256)))
+
+# Utilization reports keyed by the institution-wide 'timetables' version
+analytics_cache = caching.LRUCache(max_entries=4)
+
+# Occupancy bitmasks of every booking for the editor's suggestions, keyed by the 'timetables' version
+occupancy_cache = caching.LRUCache(max_entries=2)
+
+# Solver results keyed by a hash of everything the solver reads; values are
+# (encoded placements, result metadata) and are charged by payload size
+solution_cache = caching.LRUCache(max_entries=int(os.environ.get('SOLUTION_CACHE_SIZE', 128)),
+                                  max_bytes=int(os.environ.get('SOLUTION_CACHE_BYTES', 4 * 1024 * 1024)),
+                                  sizeof=lambda value: len(value[0]))
+
+def get_cache_version(name):
+    """Current value of a named cache version counter (0 if never bumped)"""
+    version = db.session.query(CacheVersion.version).filter_by(name=name).scalar()
+    return version or 0
+
+def bump_cache_version(name):
+    """Advance a named cache version counter in the current transaction (rows are seeded at startup)"""
+    CacheVersion.query.filter_by(name=name).update(
+        {'version': CacheVersion.version + 1}, synchronize_session=False)
+
+CACHE_VERSION_NAMES = ('subjects', 'timetables')
+
+def ensure_cache_versions():
+    """Create the cache version rows up front, so concurrent first writes only ever update them"""
+    for name in CACHE_VERSION_NAMES:
+        if db.session.get(CacheVersion, name) is None:
+            try:
+                with db.session.begin_nested():
+                    db.session.add(CacheVersion(name=name, version=0))
+            except IntegrityError:
+                # Another worker seeded it meanwhile
+                pass
+    db.session.commit()
+
+def get_timetable_version(batch_id):
+    """Current timetable version for a batch (0 if it was never written)"""
+    version = db.session.query(BatchTimetableState.version).filter_by(batch_id=batch_id).scalar()
+    return version or 0
+
+def mark_timetables_written():
+    """Have the 'timetables' counter advanced for this write.
+    
+    Within a request the counter is bumped after the response is built (see
+    remember_timetables_version), in a transaction of its own, so edits of
+    different batches never wait on its row lock.
+    """
+    if has_request_context():
+        g.timetables_written = True
+    else:
+        bump_cache_version('timetables')
+
+def bump_timetable_version(batch_id=None):
+    """Advance the timetable version of one batch (or every batch) in the current transaction"""
+    query = BatchTimetableState.query
+    if batch_id is not None:
+        query = query.filter_by(batch_id=batch_id)
+    updated = query.update({
+        'version': BatchTimetableState.version + 1,
+        'updated_at': datetime.utcnow()
+    }, synchronize_session=False)
+    if batch_id is not None and not updated:
+        db.session.add(BatchTimetableState(batch_id=int(batch_id), version=1))
+    
+    # Faculty and classroom views span batches, so they follow an institution-wide counter
+    mark_timetables_written()
+
+class TimetableConflict(Exception):
+    """A compare-and-swap found that someone else changed the timetable first"""
+
+def read_resource_versions(keys):
+    """Current versions of (kind, resource_id, day) keys, read before checking for clashes"""
+    keys = set(keys)
+    if not keys:
+        return {}
+    stored = db.session.query(
+        ResourceDayVersion.kind, ResourceDayVersion.resource_id, ResourceDayVersion.day_of_week,
+        ResourceDayVersion.version
+    ).filter(
+        ResourceDayVersion.resource_id.in_({resource_id for _, resource_id, _ in keys}),
+        ResourceDayVersion.day_of_week.in_({day for _, _, day in keys})
+    )
+    versions = {(kind, resource_id, day): version for kind, resource_id, day, version in stored}
+    return {key: versions.get(key, 0) for key in keys}
+
+def placement_resource_keys(placements):
+    """(kind, resource_id, day) keys of the faculty and rooms that (day, time_slot, subject_id, faculty_id, classroom_id) placements book"""
+    return {key for day, _, _, faculty_id, classroom_id in placements
+            for key in (('faculty', faculty_id, day), ('classroom', classroom_id, day))}
+
+def claim_resource_versions(versions):
+    """Advance each (kind, resource_id, day) only if it still has the version read earlier.
+    
+    Two editors booking the same room or faculty member on the same day both
+    pass the clash check, but only the first can move the version on - the
+    second raises TimetableConflict instead of double-booking.
+    """
+    # Fixed order so concurrent editors never wait on each other's rows in a cycle
+    for (kind, resource_id, day), version in sorted(versions.items()):
+        if version:
+            updated = ResourceDayVersion.query.filter_by(
+                kind=kind, resource_id=resource_id, day_of_week=day, version=version
+            ).update({'version': version + 1}, synchronize_session=False)
+            if not updated:
+                raise TimetableConflict(f'The {kind} schedule for {day} was changed by someone else')
+        else:
+            try:
+                with db.session.begin_nested():
+                    db.session.add(ResourceDayVersion(kind=kind, resource_id=resource_id, day_of_week=day, version=1))
+            except IntegrityError:
+                raise TimetableConflict(f'The {kind} schedule for {day} was changed by someone else')
+
+class FacultyOverloaded(Exception):
+    """A booking would take a faculty member past their max_hours_per_day"""
+
+def slot_hours(time_slot):
+    """Teaching hours of a slot (2 for a lab)"""
+    return len(SLOT_PERIODS.get(time_slot, (time_slot,)))
+
+def faculty_load_deltas(removed=(), added=()):
+    """Net {(faculty_id, day): hours} change from removing and adding (faculty_id, day, time_slot) bookings"""
+    deltas = {}
+    for sign, bookings in ((-1, removed), (1, added)):
+        for faculty_id, day, time_slot in bookings:
+            key = (int(faculty_id), day)
+            deltas[key] = deltas.get(key, 0) + sign * slot_hours(time_slot)
+    return {key: delta for key, delta in deltas.items() if delta}
+
+def adjust_faculty_load(deltas, enforce=False):
+    """Apply load changes to the FacultyDayLoad counters in the current transaction.
+    
+    With enforce, an increase that would take someone past max_hours_per_day
+    raises FacultyOverloaded. Check and increment are one conditional UPDATE,
+    so two concurrent edits cannot both slip under the limit.
+    """
+    # Decreases first, so moving a class within the same faculty member's day is never rejected
+    for (faculty_id, day), delta in sorted(deltas.items(), key=lambda item: (item[1] > 0, item[0])):
+        limit = db.select(Faculty.max_hours_per_day).where(Faculty.id == faculty_id).scalar_subquery()
+        query = FacultyDayLoad.query.filter_by(faculty_id=faculty_id, day_of_week=day)
+        if enforce and delta > 0:
+            query = query.filter(db.or_(db.func.coalesce(limit, 0) <= 0, FacultyDayLoad.hours + delta <= limit))
+        if query.update({'hours': FacultyDayLoad.hours + delta}, synchronize_session=False):
+            continue
+        
+        current = db.session.query(FacultyDayLoad.hours).filter_by(faculty_id=faculty_id, day_of_week=day).scalar()
+        max_hours = db.session.query(Faculty.max_hours_per_day).filter_by(id=faculty_id).scalar()
+        if current is not None or (enforce and max_hours and delta > max_hours):
+            name = db.session.query(Faculty.name).filter_by(id=faculty_id).scalar()
+            raise FacultyOverloaded(f'{name} would teach {(current or 0) + delta} hours on {day} '
+                                    f'(limit {max_hours} hours per day)')
+        try:
+            # First booking of this faculty member on this day
+            with db.session.begin_nested():
+                db.session.add(FacultyDayLoad(faculty_id=faculty_id, day_of_week=day, hours=max(delta, 0)))
+        except IntegrityError:
+            # Someone else created the row meanwhile - apply the change to it instead
+            adjust_faculty_load({(faculty_id, day): delta}, enforce)
+
+def rebuild_faculty_day_loads():
+    """Recount every FacultyDayLoad row from the Timetable (after an upgrade, or to repair drift)"""
+    FacultyDayLoad.query.delete()
+    loads = {}
+    for faculty_id, day, time_slot, count in db.session.query(
+            Timetable.faculty_id, Timetable.day_of_week, Timetable.time_slot, db.func.count(Timetable.id)
+    ).group_by(Timetable.faculty_id, Timetable.day_of_week, Timetable.time_slot):
+        loads[(faculty_id, day)] = loads.get((faculty_id, day), 0) + slot_hours(time_slot) * count
+    db.session.add_all([FacultyDayLoad(faculty_id=faculty_id, day_of_week=day, hours=hours)
+                        for (faculty_id, day), hours in loads.items()])
+    return len(loads)
+
+# Availability bit for (day, period) is DAYS.index(day) * len(TIME_SLOTS) + TIME_SLOTS.index(period),
+# so a day's mask shifted down lines up with the slot masks the solver and suggestions use
+WEEK_PERIOD_MASK = (1 << len(DAYS) * len(TIME_SLOTS)) - 1
+DAY_PERIOD_MASK = (1 << len(TIME_SLOTS)) - 1
+TEACHING_PERIOD_MASK = sum(1 << day_index * len(TIME_SLOTS) + period_index
+                           for day_index in range(len(DAYS))
+                           for period_index, period in enumerate(TIME_SLOTS) if period != LUNCH_SLOT)
+
+def slot_week_mask(day, time_slot):
+    """Availability bits covered by a slot on a day (both periods of a lab)"""
+    if day not in DAYS:
+        return 0
+    offset = DAYS.index(day) * len(TIME_SLOTS)
+    return sum(1 << offset + TIME_SLOTS.index(period)
+               for period in SLOT_PERIODS.get(time_slot, ()) if period in TIME_SLOTS)
+
+def load_faculty_windows(faculty_ids=None):
+    """{(faculty_id, day): (available, preferred)} day period masks of faculty with an availability row.
+
+    preferred is None for a member without preferences. Faculty without a row
+    are available everywhere and are left out.
+    """
+    query = db.session.query(FacultyAvailability.faculty_id, FacultyAvailability.available,
+                             FacultyAvailability.preferred)
+    if faculty_ids is not None:
+        query = query.filter(FacultyAvailability.faculty_id.in_(faculty_ids))
+    windows = {}
+    for faculty_id, available, preferred in query:
+        for day_index, day in enumerate(DAYS):
+            shift = day_index * len(TIME_SLOTS)
+            windows[(faculty_id, day)] = ((available >> shift) & DAY_PERIOD_MASK,
+                                          (preferred >> shift) & DAY_PERIOD_MASK if preferred else None)
+    return windows
+
+def faculty_is_available(faculty_id, day, time_slot):
+    """Whether every period of the slot is inside the faculty member's availability"""
+    window = FacultyAvailability.query.get(faculty_id)
+    mask = slot_week_mask(day, time_slot)
+    return window is None or window.available & mask == mask
+
+def claim_timetable_version(batch_id, expected_version):
+    """Compare-and-swap a batch's timetable version from expected_version to the next one"""
+    expected_version = int(expected_version)
+    updated = BatchTimetableState.query.filter_by(batch_id=batch_id, version=expected_version).update({
+        'version': BatchTimetableState.version + 1,
+        'updated_at': datetime.utcnow()
+    }, synchronize_session=False)
+    if not updated:
+        if expected_version or get_timetable_version(batch_id):
+            raise TimetableConflict('This timetable was changed by someone else')
+        try:
+            with db.session.begin_nested():
+                db.session.add(BatchTimetableState(batch_id=int(batch_id), version=1))
+        except IntegrityError:
+            raise TimetableConflict('This timetable was changed by someone else')
+    mark_timetables_written()
+
+def get_timetable_approval(batch_id, version):
+    """Approval record if it covers the given timetable version, else None"""
+    approval = TimetableApproval.query.get(batch_id)
+    if approval is None or approval.version != version:
+        return None
+    return approval
+
+def approve_timetable_version(batch_id, version, user_id):
+    """Record approval of a timetable version with a single upsert-style statement"""
+    values = {'version': version, 'approved_by': user_id, 'approved_at': datetime.utcnow()}
+    updated = TimetableApproval.query.filter_by(batch_id=batch_id).update(values, synchronize_session=False)
+    if not updated:
+        db.session.add(TimetableApproval(batch_id=batch_id, **values))
+
+# Snapshots kept per batch; older ones are pruned, the active one never is
+SNAPSHOT_RETENTION = int(os.environ.get('TIMETABLE_SNAPSHOT_RETENTION', 10))
+
+def encode_live_timetable(batch_id):
+    """Encode a batch's current Timetable rows in the snapshot format"""
+    rows = db.session.query(
+        Timetable.day_of_week, Timetable.time_slot, Timetable.subject_id, Timetable.faculty_id, Timetable.classroom_id
+    ).filter_by(batch_id=batch_id).all()
+    return snapshots.encode_entries(rows, DAYS, TIME_SLOTS + LAB_TIME_SLOTS)
+
+def get_active_snapshot(batch_id):
+    pointer = ActiveTimetableSnapshot.query.get(batch_id)
+    return TimetableSnapshot.query.get(pointer.snapshot_id) if pointer else None
+
+def set_active_snapshot(batch_id, snapshot_id):
+    """Swap the active-version pointer of a batch"""
+    values = {'snapshot_id': snapshot_id, 'activated_at': datetime.utcnow()}
+    updated = ActiveTimetableSnapshot.query.filter_by(batch_id=batch_id).update(values, synchronize_session=False)
+    if not updated:
+        db.session.add(ActiveTimetableSnapshot(batch_id=batch_id, **values))
+
+def save_timetable_snapshot(batch_id, source, payload=None):
+    """Store the live (or given) timetable as a new snapshot, make it active and prune old ones"""
+    if payload is None:
+        payload = encode_live_timetable(batch_id)
+    batch_id = int(batch_id)
+    snapshot = TimetableSnapshot(batch_id=batch_id, source=source, payload=payload,
+                                 entry_count=snapshots.entry_count(payload), created_by=session.get('user_id'))
+    db.session.add(snapshot)
+    db.session.flush()
+    set_active_snapshot(batch_id, snapshot.id)
+    prune_timetable_snapshots(batch_id, keep_id=snapshot.id)
+    return snapshot
+
+def capture_unsaved_edits(batch_id):
+    """Snapshot the live timetable if manual edits made it drift from the active snapshot.
+    
+    Called before anything replaces the live rows, so edits made after the
+    last generation can still be rolled back to.
+    """
+    live = encode_live_timetable(batch_id)
+    active = get_active_snapshot(batch_id)
+    if active is not None and bytes(active.payload) == live:
+        return active
+    if active is None and not snapshots.entry_count(live):
+        return None
+    return save_timetable_snapshot(batch_id, 'edited', live)
+
+def prune_timetable_snapshots(batch_id, keep_id=None):
+    """Delete all but the newest SNAPSHOT_RETENTION snapshots, never the active one"""
+    newest = [snapshot_id for (snapshot_id,) in db.session.query(TimetableSnapshot.id).filter_by(
+        batch_id=batch_id).order_by(TimetableSnapshot.id.desc()).limit(SNAPSHOT_RETENTION)]
+    keep = set(newest) | {keep_id}
+    pointer = ActiveTimetableSnapshot.query.get(batch_id)
+    if pointer:
+        keep.add(pointer.snapshot_id)
+    pruned = [snapshot_id for (snapshot_id,) in db.session.query(TimetableSnapshot.id).filter(
+        TimetableSnapshot.batch_id == batch_id,
+        TimetableSnapshot.id.notin_([snapshot_id for snapshot_id in keep if snapshot_id is not None])
+    )]
+    if pruned:
+        TimetableGenerationRun.query.filter(TimetableGenerationRun.snapshot_id.in_(pruned)).delete(synchronize_session=False)
+        TimetableSnapshot.query.filter(TimetableSnapshot.id.in_(pruned)).delete(synchronize_session=False)
+
+def restore_timetable_snapshot(batch_id, snapshot):
+    """Make snapshot the batch's live timetable and point the batch at it"""
+    entries = snapshots.decode_entries(snapshot.payload)
+    
+    # Subjects, faculty or rooms may have been deleted since the snapshot was taken
+    for model, ids in ((Subject, {e[2] for e in entries}), (Faculty, {e[3] for e in entries}),
+                       (Classroom, {e[4] for e in entries})):
+        if ids and db.session.query(model.id).filter(model.id.in_(ids)).count() != len(ids):
+            raise ValueError(f'This version references a {model.__name__.lower()} that no longer exists')
+    
+    # Other batches may have taken its faculty or rooms since (persist checks), and limits may have dropped
+    changes = persist_batch_timetable(batch_id, entries, enforce=True)
+    set_active_snapshot(batch_id, snapshot.id)
+    return changes
+
+def find_cross_batch_clash(batch_id, placements):
+    """Describe the first placement whose faculty or room another batch books in an overlapping slot, else None"""
+    if not placements:
+        return None
+    booked = {}
+    for day, time_slot, faculty_id, classroom_id in db.session.query(
+            Timetable.day_of_week, Timetable.time_slot, Timetable.faculty_id, Timetable.classroom_id
+    ).filter(
+        Timetable.batch_id != batch_id,
+        Timetable.day_of_week.in_({p[0] for p in placements}),
+        db.or_(Timetable.faculty_id.in_({p[3] for p in placements}),
+               Timetable.classroom_id.in_({p[4] for p in placements}))
+    ):
+        booked.setdefault((Faculty, faculty_id, day), set()).add(time_slot)
+        booked.setdefault((Classroom, classroom_id, day), set()).add(time_slot)
+    
+    for day, time_slot, _, faculty_id, classroom_id in placements:
+        for model, resource_id in ((Faculty, faculty_id), (Classroom, classroom_id)):
+            if booked.get((model, resource_id, day), set()) & set(overlapping_slots(time_slot)):
+                name = db.session.query(model.name).filter_by(id=resource_id).scalar()
+                return f'{name} is already booked on {day} at {time_slot}'
+    return None
+
+def persist_batch_timetable(batch_id, placements, enforce=False):
+    """Apply only the inserts, updates and deletes that turn the stored timetable into placements.
+    
+    placements are (day, time_slot, subject_id, faculty_id, classroom_id)
+    tuples. Unchanged rows keep their id, so editor references survive a
+    regeneration. Added classes are checked against the other batches'
+    bookings and the faculty and room days they touch are claimed like an
+    editor's, so a concurrent edit cannot double-book them (TimetableConflict).
+    With enforce, raises FacultyOverloaded when an added class would break
+    someone's daily limit. Returns counts of what changed.
+    """
+    existing = db.session.query(
+        Timetable.id, Timetable.day_of_week, Timetable.time_slot,
+        Timetable.subject_id, Timetable.faculty_id, Timetable.classroom_id
+    ).filter_by(batch_id=batch_id).all()
+    unchanged, updates, inserts, deletes = snapshots.diff_placements(
+        [(row[0], tuple(row[1:])) for row in existing], placements)
+    
+    # Placements are (day, time_slot, subject_id, faculty_id, classroom_id)
+    stored = {row[0]: row[1:] for row in existing}
+    removed = [stored[row_id] for row_id in deletes] + [stored[row_id] for row_id, _ in updates]
+    added = [placement for _, placement in updates] + list(inserts)
+    
+    # Versions are read before the clash check and swapped on write, as in the editor
+    resource_versions = read_resource_versions(placement_resource_keys(removed + added))
+    clash = find_cross_batch_clash(batch_id, added)
+    if clash:
+        raise TimetableConflict(f'This clashes with the current timetables: {clash}')
+    adjust_faculty_load(faculty_load_deltas(
+        removed=[(faculty_id, day, time_slot) for day, time_slot, _, faculty_id, _ in removed],
+        added=[(faculty_id, day, time_slot) for day, time_slot, _, faculty_id, _ in added]
+    ), enforce)
+    
+    if deletes:
+        Timetable.query.filter(Timetable.id.in_(deletes)).delete(synchronize_session=False)
+    if updates:
+        # Bulk UPDATE ... WHERE id = ? executed once per changed row
+        db.session.execute(db.update(Timetable), [
+            {'id': row_id, 'subject_id': subject_id, 'faculty_id': faculty_id, 'classroom_id': classroom_id}
+            for row_id, (day, time_slot, subject_id, faculty_id, classroom_id) in updates
+        ])
+    if inserts:
+        db.session.add_all([
+            Timetable(batch_id=batch_id, day_of_week=day, time_slot=time_slot, subject_id=subject_id,
+                      faculty_id=faculty_id, classroom_id=classroom_id)
+            for day, time_slot, subject_id, faculty_id, classroom_id in inserts
+        ])
+    
+    # An identical timetable keeps its version, so caches and approval stay valid
+    if updates or inserts or deletes:
+        claim_resource_versions(resource_versions)
+        bump_timetable_version(batch_id)
+    
+    return {'unchanged': len(unchanged), 'updated': len(updates), 'inserted': len(inserts), 'deleted': len(deletes)}
+
+def describe_timetable_changes(changes):
+    return (f"{changes['unchanged']} unchanged, {changes['updated']} updated, "
+            f"{changes['inserted']} added, {changes['deleted']} removed")
+
+def load_timetable_slots(*criteria):
+    """Projected TimetableSlot records for the Timetable rows matching criteria"""
+    rows = db.session.execute(db.select(
+        Timetable.id, Timetable.day_of_week, Timetable.time_slot,
+        Subject.id, Subject.name, Subject.type,
+        Faculty.id, Faculty.name,
+        Classroom.id, Classroom.name
+    ).join(
+        Subject, Timetable.subject_id == Subject.id
+    ).join(
+        Faculty, Timetable.faculty_id == Faculty.id
+    ).join(
+        Classroom, Timetable.classroom_id == Classroom.id
+    ).where(*criteria))
+    return [readmodels.TimetableSlot._make(row) for row in rows]
+
+def build_batch_grid(batch_id):
+    """Load a batch's timetable into a day x slot grid plus its weekly statistics"""
+    timetable_entries = load_timetable_slots(Timetable.batch_id == batch_id)
+    
+    timetable = readmodels.empty_grid(DAYS, TIME_SLOTS + LAB_TIME_SLOTS)
+    for slot in timetable_entries:
+        timetable[slot.day][slot.time_slot] = readmodels.grid_cell(slot)
+    
+    # Count actual hours (lab sessions count as 2 hours each)
+    total_hours = 0
+    theory_count = 0
+    practical_count = 0
+    tutorial_count = 0
+    
+    for slot in timetable_entries:
+        if slot.type == 'theory':
+            theory_count += 1
+            total_hours += 1  # Theory classes are 1 hour
+        elif slot.type == 'practical':
+            practical_count += 1
+            # Check if it's a 2-hour lab session
+            if slot.time_slot in LAB_TIME_SLOTS:
+                total_hours += 2  # Lab sessions are 2 hours
+            else:
+                total_hours += 1  # Regular practical is 1 hour
+        elif slot.type == 'tutorial':
+            tutorial_count += 1
+            total_hours += 1  # Tutorial classes are 1 hour
+    
+    return {
+        'timetable': timetable,
+        'total_hours': total_hours,
+        'theory_count': theory_count,
+        'practical_count': practical_count,
+        'tutorial_count': tutorial_count
+    }
+
+def build_resource_grid(kind, resource_id):
+    """Load one faculty member's or classroom's week from an indexed Timetable lookup"""
+    if kind == 'faculty':
+        resource_column = Timetable.faculty_id
+        detail_column = Classroom.name
+    else:
+        resource_column = Timetable.classroom_id
+        detail_column = Faculty.name
+    
+    rows = db.session.query(
+        Timetable.id, Timetable.day_of_week, Timetable.time_slot, Timetable.batch_id,
+        Subject.name, Subject.type, Batch.name, detail_column
+    ).join(
+        Subject, Timetable.subject_id == Subject.id
+    ).join(
+        Batch, Timetable.batch_id == Batch.id
+    ).join(
+        Faculty, Timetable.faculty_id == Faculty.id
+    ).join(
+        Classroom, Timetable.classroom_id == Classroom.id
+    ).filter(resource_column == resource_id).order_by(Timetable.id).all()
+    
+    grid = {day: {slot: [] for slot in TIME_SLOTS + LAB_TIME_SLOTS} for day in DAYS}
+    entries = []
+    periods_used = {}
+    total_hours = 0
+    
+    for entry_id, day, time_slot, batch_id, subject_name, subject_type, batch_name, detail in rows:
+        entry = {
+            'id': entry_id,
+            'day': day,
+            'time_slot': time_slot,
+            'batch_id': batch_id,
+            'batch': batch_name,
+            'subject': subject_name,
+            'type': subject_type,
+            'detail': detail
+        }
+        entries.append(entry)
+        if day in grid and time_slot in grid[day]:
+            grid[day][time_slot].append(entry)
+        periods = SLOT_PERIODS.get(time_slot, (time_slot,))
+        total_hours += len(periods)
+        for period in periods:
+            periods_used[(day, period)] = periods_used.get((day, period), 0) + 1
+    
+    return {
+        'grid': grid,
+        'entries': entries,
+        'total_hours': total_hours,
+        'batch_count': len({entry['batch_id'] for entry in entries}),
+        'clash_count': sum(1 for count in periods_used.values() if count > 1)
+    }
+
+def render_resource_grid(kind, resource_id):
+    """Faculty/classroom grid with its pre-rendered HTML, cached until any timetable changes"""
+    version = get_cache_version('timetables')
+    
+    def build():
+        grid = build_resource_grid(kind, resource_id)
+        grid['grid_html'] = Markup(render_template('fragments/resource_grid.html', grid=grid['grid'],
+                                                   days=DAYS, time_slots=TIME_SLOTS))
+        return grid
+    
+    return grid_cache.get_or_create(('resource', kind, resource_id, version), build)
+
+def render_timetable_grid(fragment, batch_id, version=None):
+    """Batch grid with its pre-rendered HTML fragment, cached until the timetable version changes"""
+    if version is None:
+        version = get_timetable_version(batch_id)
+    
+    def build():
+        grid = build_batch_grid(batch_id)
+        grid['grid_html'] = Markup(render_template(fragment, timetable=grid['timetable'],
+                                                   days=DAYS, time_slots=TIME_SLOTS))
+        return grid
+    
+    return grid_cache.get_or_create((fragment, batch_id, version), build)
+
+# Live updates: committed changes go out as per-batch deltas to open editors and viewers
+broker = pubsub.create_broker(os.environ.get('PUBSUB_URL'))
+# Streams end after this long and browsers reconnect, so a worker thread is never held indefinitely;
+# keep it below the gunicorn --timeout (180 in the Procfile and render.yaml)
+TIMETABLE_STREAM_SECONDS = int(os.environ.get('TIMETABLE_STREAM_SECONDS', 120))
+TIMETABLE_STREAM_HEARTBEAT = 15
+# auto: stream only from threaded servers (gthread workers, the dev server) - a sync worker would be
+# tied up by one open page. 1 for gevent/eventlet workers, 0 to turn live updates off
+LIVE_UPDATES = os.environ.get('LIVE_UPDATES', 'auto')
+
+@app.template_global()
+def live_updates_enabled():
+    """Whether this server can hold timetable streams open without starving other requests"""
+    if LIVE_UPDATES == 'auto':
+        return has_request_context() and bool(request.environ.get('wsgi.multithread'))
+    return LIVE_UPDATES == '1'
+
+def timetable_channel(batch_id):
+    return f'timetable:{int(batch_id)}'
+
+def timetable_delta(batch_id, days=None):
+    """A batch's classes on the given days (default: the whole week); clients replace those days with it"""
+    days = [day for day in DAYS if days is None or day in days]
+    return {
+        'batch_id': int(batch_id),
+        'version': get_timetable_version(batch_id),
+        'days': days,
+        'cells': [{'day': slot.day, 'time_slot': slot.time_slot, 'entry': readmodels.grid_cell(slot, with_ids=True)}
+                  for slot in load_timetable_slots(Timetable.batch_id == batch_id, Timetable.day_of_week.in_(days))]
+    }
+
+def publish_timetable_change(batch_id, days=None):
+    """Send a committed change of a batch's timetable to its subscribers and return the delta"""
+    delta = timetable_delta(batch_id, days)
+    try:
+        broker.publish(timetable_channel(batch_id), dict(delta, event='timetable'))
+    except Exception as e:
+        # Subscribers resync when they reconnect; the write itself has already succeeded
+        app.logger.warning('Could not publish timetable change for batch %s: %s', batch_id, e)
+    return delta
+
+def publish_timetable_approval(batch_id, version, approved_by):
+    """Tell a batch's subscribers that a committed approval covers the given version"""
+    try:
+        broker.publish(timetable_channel(batch_id), {
+            'event': 'approval', 'batch_id': batch_id, 'version': version,
+            'approved_by': approved_by, 'approved_at': datetime.utcnow().strftime('%d %b %Y, %H:%M')
+        })
+    except Exception as e:
+        # Open pages show the approval once they reload; the approval itself is saved
+        app.logger.warning('Could not publish approval for batch %s: %s', batch_id, e)
+
+# Replica lag is bounded by the 'timetables' counter, which every admin write advances: a replica
+# read is only allowed once the replica has caught up with the newest version this process or this user has written
+_written_timetables_version = 0
+_replica_timetables_version = 0
+
+@app.before_request
+def route_reads_to_replica():
+    global _replica_timetables_version
+    if not replica_url or request.method not in database.READ_METHODS or request.endpoint == 'static':
+        return
+    required = max(_written_timetables_version, session.get('timetables_version', 0))
+    if required <= _replica_timetables_version:
+        session.pop('timetables_version', None)
+        return
+    # Routed to the replica like any other read in a GET request
+    _replica_timetables_version = max(_replica_timetables_version, get_cache_version('timetables'))
+    if _replica_timetables_version < required:
+        database.use_primary(db.session)
+    else:
+        session.pop('timetables_version', None)
+
+@app.after_request
+def remember_timetables_version(response):
+    """After a timetable write, advance the 'timetables' counter and note the version later reads of this user must see"""
+    global _written_timetables_version
+    if not g.get('timetables_written'):
+        return response
+    try:
+        # The request has committed (or rolled back, which only costs a cache refresh)
+        bump_cache_version('timetables')
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        app.logger.warning('Could not advance the timetables version: %s', e)
+        return response
+    if replica_url and response.status_code < 400:
+        # The session wrote, so this read still goes to the primary
+        version = get_cache_version('timetables')
+        _written_timetables_version = max(_written_timetables_version, version)
+        session['timetables_version'] = version
+    return response
+
 # Health check endpoint for monitoring
 @app.route('/health')
 def health_check():
     """Health check endpoint for monitoring services"""
     try:
-        # Test database connection
-        db.session.execute(db.text('SELECT 1'))
+        # Test database connection (the replica, when one is configured)
+        db.session.execute(db.select(db.literal(1)))
         return jsonify({
             'status': 'healthy',
             'database': 'connected',
@@ -125,6 +1143,8 @@ def initialize_database_endpoint():
     try:
         with app.app_context():
             db.create_all()
+            ensure_indexes()
+            ensure_cache_versions()
             ensure_default_users()
             return jsonify({
                 'status': 'success',
@@ -162,6 +1182,8 @@ def ensure_database_initialized():
         try:
             with app.app_context():
                 db.create_all()
+                ensure_indexes()
+                ensure_cache_versions()
                 ensure_default_users()
                 _database_initialized = True
                 print("Database initialized on first request")
@@ -233,66 +1255,22 @@ def student_dashboard():
         flash('Batch not found. Please contact administrator.', 'error')
         return redirect(url_for('logout'))
     
-    # Get timetable for the student's batch
-    timetable_entries = db.session.query(Timetable, Subject, Faculty, Classroom).join(
-        Subject, Timetable.subject_id == Subject.id
-    ).join(
-        Faculty, Timetable.faculty_id == Faculty.id
-    ).join(
-        Classroom, Timetable.classroom_id == Classroom.id
-    ).filter(Timetable.batch_id == batch_id).all()
-    
-    # Organize timetable by day and time
-    days = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday']
-    time_slots = ['09:15-10:15', '10:15-11:15', '11:15-12:15', '12:15-01:00', '01:00-02:00', '02:00-03:00', '03:00-04:00']
-    
-    # Include all possible time slots including 2-hour lab slots
-    all_time_slots = time_slots + ['09:15-11:15', '10:15-12:15', '01:00-03:00', '02:00-04:00']
-    
-    timetable = {}
-    for day in days:
-        timetable[day] = {}
-        for time_slot in all_time_slots:
-            timetable[day][time_slot] = None
-    
-    for entry, subject, faculty, classroom in timetable_entries:
-        timetable[entry.day_of_week][entry.time_slot] = {
-            'subject': subject.name,
-            'faculty': faculty.name,
-            'classroom': classroom.name,
-            'type': subject.type
-        }
-    
-    # Calculate statistics (count actual hours - lab sessions are 2 hours)
-    total_hours = 0
-    theory_count = 0
-    practical_count = 0
-    tutorial_count = 0
-    
-    for entry, subject, _, _ in timetable_entries:
-        if subject.type == 'theory':
-            theory_count += 1
-            total_hours += 1  # Theory classes are 1 hour
-        elif subject.type == 'practical':
-            practical_count += 1
-            # Check if it's a 2-hour lab session
-            if entry.time_slot in ['09:15-11:15', '10:15-12:15', '01:00-03:00', '02:00-04:00']:
-                total_hours += 2  # Lab sessions are 2 hours
-            else:
-                total_hours += 1  # Regular practical is 1 hour
-        elif subject.type == 'tutorial':
-            tutorial_count += 1
-            total_hours += 1  # Tutorial classes are 1 hour
+    # Grid markup and statistics are cached per timetable version
+    version = get_timetable_version(batch_id)
+    grid = render_timetable_grid('fragments/student_grid.html', batch_id, version)
     
     return render_template('student_dashboard.html', 
                           batch=batch, 
-                          timetable=timetable, 
-                          days=days, 
-                          time_slots=time_slots,
-                          total_hours=total_hours,
-                          theory_count=theory_count,
-                          practical_count=practical_count,
-                          tutorial_count=tutorial_count)
+                          version=version,
+                          lunch_slot=LUNCH_SLOT,
+                          timetable=grid['timetable'], 
+                          grid_html=grid['grid_html'],
+                          days=DAYS, 
+                          time_slots=TIME_SLOTS,
+                          total_hours=grid['total_hours'],
+                          theory_count=grid['theory_count'],
+                          practical_count=grid['practical_count'],
+                          tutorial_count=grid['tutorial_count'])
 
 @app.route('/logout')
 def logout():
@@ -307,32 +1285,127 @@ def setup():
         return redirect(url_for('login'))
     return render_template('setup.html')
 
+# Rows per page on the manage pages (keyset paginated by id)
+MANAGE_PAGE_SIZE = int(os.environ.get('MANAGE_PAGE_SIZE', 50))
+
+def prefix_match(column, text):
+    """Case-insensitive prefix filter written as a range so it can use a lower(column) index"""
+    prefix = text.lower()
+    upper_bound = prefix[:-1] + chr(ord(prefix[-1]) + 1)
+    lowered = db.func.lower(column)
+    return db.and_(lowered >= prefix, lowered < upper_bound)
+
+def manage_entity_query(entity):
+    """Column-projected query, keyset column and searchable columns for a manage page"""
+    if entity == 'classrooms':
+        query = db.session.query(Classroom.id, Classroom.name, Classroom.capacity,
+                                 Classroom.type, Classroom.is_available)
+        return query, Classroom.id, [Classroom.name]
+    elif entity == 'faculty':
+        query = db.session.query(Faculty.id, Faculty.name, Faculty.department,
+                                 Faculty.email, Faculty.max_hours_per_day,
+                                 FacultyAvailability.available, FacultyAvailability.preferred
+                                 ).outerjoin(FacultyAvailability, FacultyAvailability.faculty_id == Faculty.id)
+        return query, Faculty.id, [Faculty.name]
+    elif entity == 'subjects':
+        query = db.session.query(Subject.id, Subject.name, Subject.code, Subject.department,
+                                 Subject.semester, Subject.hours_per_week, Subject.type)
+        return query, Subject.id, [Subject.name, Subject.code]
+    elif entity == 'batches':
+        query = db.session.query(Batch.id, Batch.name, Batch.department, Batch.year,
+                                 Batch.semester, Batch.strength)
+        return query, Batch.id, [Batch.name]
+    elif entity == 'students':
+        query = db.session.query(
+            User.id, User.username,
+            Batch.name.label('batch_name'),
+            Batch.department.label('batch_department'),
+            Batch.year.label('batch_year'),
+            Batch.semester.label('batch_semester')
+        ).outerjoin(Batch, User.batch_id == Batch.id).filter(User.role == 'student')
+        return query, User.id, [User.username]
+    return None
+
+def fetch_manage_page(entity, after_id=None, search=None, limit=None):
+    """One keyset page of rows for a manage page: (items, next_after_id)"""
+    limit = limit or MANAGE_PAGE_SIZE
+    spec = manage_entity_query(entity)
+    if spec is None:
+        return [], None
+    query, id_column, search_columns = spec
+    
+    if search:
+        query = query.filter(db.or_(*[prefix_match(column, search) for column in search_columns]))
+    if after_id:
+        query = query.filter(id_column > after_id)
+    
+    # Fetch one extra row to know whether another page exists
+    rows = query.order_by(id_column).limit(limit + 1).all()
+    next_after = rows[limit - 1].id if len(rows) > limit else None
+    items = [row._asdict() for row in rows[:limit]]
+    
+    if entity == 'subjects' and items:
+        # Faculty names for this page only, in a single query
+        faculty_by_subject = {item['id']: [] for item in items}
+        assigned = db.session.query(subject_faculty.c.subject_id, Faculty.id, Faculty.name).join(
+            Faculty, subject_faculty.c.faculty_id == Faculty.id
+        ).filter(subject_faculty.c.subject_id.in_(faculty_by_subject.keys())).order_by(Faculty.name).all()
+        for subject_id, faculty_id, faculty_name in assigned:
+            faculty_by_subject[subject_id].append({'id': faculty_id, 'name': faculty_name})
+        for item in items:
+            item['faculty'] = faculty_by_subject[item['id']]
+    
+    if entity == 'faculty':
+        # Faculty without an availability row can teach any period
+        for item in items:
+            item['available'] = WEEK_PERIOD_MASK if item['available'] is None else item['available']
+            item['preferred'] = item['preferred'] or 0
+            item['available_periods'] = bin(item['available'] & TEACHING_PERIOD_MASK).count('1')
+            item['always_available'] = item['available'] & TEACHING_PERIOD_MASK == TEACHING_PERIOD_MASK
+    
+    return items, next_after
+
 @app.route('/manage/<string:entity>')
 def manage_entity(entity):
     if 'user_id' not in session or session.get('user_role') != 'admin':
         flash('Access denied. Admin privileges required.', 'error')
         return redirect(url_for('login'))
     
-    data = {}
-    if entity == 'classrooms':
-        data['items'] = Classroom.query.all()
+    search = request.args.get('q', '').strip()
+    items, next_after = fetch_manage_page(entity, search=search)
+    
+    data = {'items': items}
+    if entity == 'subjects':
+        # Checkbox list for the add form
+        data['faculty'] = db.session.query(Faculty.id, Faculty.name, Faculty.department).order_by(Faculty.name).all()
     elif entity == 'faculty':
-        data['items'] = Faculty.query.all()
-    elif entity == 'subjects':
-        data['items'] = Subject.query.all()
-        data['faculty'] = Faculty.query.all()
-    elif entity == 'batches':
-        data['items'] = Batch.query.all()
+        # Day x period grid of the availability editor
+        data['days'] = DAYS
+        data['periods'] = [(index, period) for index, period in enumerate(TIME_SLOTS) if period != LUNCH_SLOT]
+        data['periods_per_day'] = len(TIME_SLOTS)
     elif entity == 'students':
-        # Add student management for admin
-        data['items'] = User.query.filter_by(role='student').all()
-        data['batches'] = Batch.query.all()
+        # Batch dropdown for the add form
+        data['batches'] = db.session.query(Batch.id, Batch.name, Batch.department,
+                                           Batch.year, Batch.semester).order_by(Batch.name).all()
+    
+    return render_template('manage.html', entity=entity, data=data, items=items,
+                           next_after=next_after, search=search)
+
+@app.route('/manage/<string:entity>/page')
+def manage_entity_page(entity):
+    """Next page of manage rows as rendered HTML, for lazy loading on scroll"""
+    if 'user_id' not in session or session.get('user_role') != 'admin':
+        return jsonify({'error': 'Access denied'}), 403
     
-    # Ensure data has items key
-    if 'items' not in data:
-        data['items'] = []
+    after_id = request.args.get('after', type=int)
+    search = request.args.get('q', '').strip()
+    items, next_after = fetch_manage_page(entity, after_id=after_id, search=search)
     
-    return render_template('manage.html', entity=entity, data=data)
+    return jsonify({
+        'html': render_template('fragments/manage_rows.html', entity=entity, items=items),
+        'count': len(items),
+        'next_after': next_after
+    })
 
 @app.route('/add/<string:entity>', methods=['POST'])
 def add_entity(entity):
@@ -381,6 +1454,8 @@ def add_entity(entity):
                     if faculty:
                         subject.faculty.append(faculty)
                         print(f"DEBUG: Added faculty {faculty.name} to subject {subject.name}")  # Debug print
+            
+            bump_cache_version('subjects')
         
         elif entity == 'batch':
             batch = Batch(
@@ -401,6 +1476,7 @@ def add_entity(entity):
             )
             db.session.add(student)
         
+        mark_timetables_written()
         db.session.commit()
         flash(f'{entity.title()} added successfully!', 'success')
     
@@ -420,18 +1496,55 @@ def add_entity(entity):
     plural_entity = entity_plurals.get(entity, entity + 's')
     return redirect(url_for('manage_entity', entity=plural_entity))
 
+@app.route('/faculty_availability/<int:faculty_id>', methods=['POST'])
+def faculty_availability(faculty_id):
+    """Save a faculty member's available and preferred periods (week bitmasks from the manage page)"""
+    if 'user_id' not in session or session.get('user_role') != 'admin':
+        flash('Access denied. Admin privileges required.', 'error')
+        return redirect(url_for('login'))
+    
+    faculty = Faculty.query.get_or_404(faculty_id)
+    try:
+        available = int(request.form['available']) & WEEK_PERIOD_MASK
+        preferred = int(request.form.get('preferred') or 0) & available
+        
+        if available == WEEK_PERIOD_MASK and not preferred:
+            FacultyAvailability.query.filter_by(faculty_id=faculty_id).delete()
+        else:
+            db.session.merge(FacultyAvailability(faculty_id=faculty_id, available=available, preferred=preferred))
+        mark_timetables_written()
+        db.session.commit()
+        flash(f'Availability of {faculty.name} saved.', 'success')
+        
+        # Existing classes are kept, but the editor and the generator will not book these periods again
+        outside = sum(1 for day, time_slot in db.session.query(Timetable.day_of_week, Timetable.time_slot)
+                      .filter_by(faculty_id=faculty_id)
+                      if slot_week_mask(day, time_slot) & ~available)
+        if outside:
+            flash(f'{outside} of their current classes fall outside the new availability.', 'warning')
+    
+    except (KeyError, ValueError):
+        flash('Invalid availability.', 'error')
+    except Exception as e:
+        db.session.rollback()
+        flash(f'Error saving availability: {str(e)}', 'error')
+    
+    return redirect(url_for('manage_entity', entity='faculty'))
+
 @app.route('/delete_all/<string:entity>', methods=['POST'])
 def delete_all_entities(entity):
     if 'user_id' not in session or session.get('user_role') != 'admin':
         flash('Access denied. Admin privileges required.', 'error')
         return redirect(url_for('login'))
     
+    cleared_batches = []
     try:
         if entity == 'classrooms':
             # Check if any classrooms are being used in timetables
             if Timetable.query.first():
                 flash('Cannot delete all classrooms. Some are being used in timetables.', 'error')
                 return redirect(url_for('manage_entity', entity='classrooms'))
+            ExamEntry.query.delete()
             Classroom.query.delete()
             flash('All classrooms deleted successfully!', 'success')
         
@@ -441,6 +1554,8 @@ def delete_all_entities(entity):
             if faculty_with_subjects:
                 flash('Cannot delete all faculty. Some are assigned to subjects.', 'error')
                 return redirect(url_for('manage_entity', entity='faculty'))
+            FacultyDayLoad.query.delete()
+            FacultyAvailability.query.delete()
             Faculty.query.delete()
             flash('All faculty deleted successfully!', 'success')
         
@@ -449,7 +1564,9 @@ def delete_all_entities(entity):
             if Timetable.query.first():
                 flash('Cannot delete all subjects. Some are being used in timetables.', 'error')
                 return redirect(url_for('manage_entity', entity='subjects'))
+            ExamEntry.query.delete()
             Subject.query.delete()
+            bump_cache_version('subjects')
             flash('All subjects deleted successfully!', 'success')
         
         elif entity == 'batches':
@@ -457,6 +1574,11 @@ def delete_all_entities(entity):
             if User.query.filter_by(role='student').first() or Timetable.query.first():
                 flash('Cannot delete all batches. Some have students or timetables assigned.', 'error')
                 return redirect(url_for('manage_entity', entity='batches'))
+            TimetableApproval.query.delete()
+            ActiveTimetableSnapshot.query.delete()
+            TimetableGenerationRun.query.delete()
+            TimetableSnapshot.query.delete()
+            ExamEntry.query.delete()
             Batch.query.delete()
             flash('All batches deleted successfully!', 'success')
         
@@ -465,14 +1587,23 @@ def delete_all_entities(entity):
             flash('All students deleted successfully!', 'success')
         
         elif entity == 'timetables':
+            cleared_batches = [batch_id for (batch_id,) in db.session.query(Timetable.batch_id).distinct().all()]
+            for batch_id in cleared_batches:
+                capture_unsaved_edits(batch_id)
             Timetable.query.delete()
+            FacultyDayLoad.query.delete()
+            ActiveTimetableSnapshot.query.delete()
+            bump_timetable_version()
             flash('All timetables deleted successfully!', 'success')
         
         else:
             flash('Invalid entity type.', 'error')
             return redirect(url_for('admin_dashboard'))
         
+        mark_timetables_written()
         db.session.commit()
+        for batch_id in cleared_batches:
+            publish_timetable_change(batch_id)
     
     except Exception as e:
         db.session.rollback()
@@ -506,6 +1637,7 @@ def delete_entity(entity, item_id):
             if Timetable.query.filter_by(classroom_id=item_id).first():
                 flash('Cannot delete classroom. It is being used in timetables.', 'error')
                 return redirect(url_for('manage_entity', entity='classrooms'))
+            ExamEntry.query.filter_by(classroom_id=item_id).delete()
         
         elif entity == 'faculty':
             item = Faculty.query.get_or_404(item_id)
@@ -513,6 +1645,8 @@ def delete_entity(entity, item_id):
             if item.subjects:
                 flash('Cannot delete faculty. They are assigned to subjects.', 'error')
                 return redirect(url_for('manage_entity', entity='faculty'))
+            FacultyDayLoad.query.filter_by(faculty_id=item_id).delete()
+            FacultyAvailability.query.filter_by(faculty_id=item_id).delete()
         
         elif entity == 'subject':
             item = Subject.query.get_or_404(item_id)
@@ -520,6 +1654,8 @@ def delete_entity(entity, item_id):
             if Timetable.query.filter_by(subject_id=item_id).first():
                 flash('Cannot delete subject. It is being used in timetables.', 'error')
                 return redirect(url_for('manage_entity', entity='subjects'))
+            ExamEntry.query.filter_by(subject_id=item_id).delete()
+            bump_cache_version('subjects')
         
         elif entity == 'batch':
             item = Batch.query.get_or_404(item_id)
@@ -527,6 +1663,11 @@ def delete_entity(entity, item_id):
             if User.query.filter_by(batch_id=item_id).first() or Timetable.query.filter_by(batch_id=item_id).first():
                 flash('Cannot delete batch. It has students or timetables assigned.', 'error')
                 return redirect(url_for('manage_entity', entity='batches'))
+            TimetableApproval.query.filter_by(batch_id=item_id).delete()
+            ActiveTimetableSnapshot.query.filter_by(batch_id=item_id).delete()
+            TimetableGenerationRun.query.filter_by(batch_id=item_id).delete()
+            TimetableSnapshot.query.filter_by(batch_id=item_id).delete()
+            ExamEntry.query.filter_by(batch_id=item_id).delete()
         
         elif entity == 'student':
             item = User.query.filter_by(id=item_id, role='student').first_or_404()
@@ -536,6 +1677,7 @@ def delete_entity(entity, item_id):
             return redirect(url_for('admin_dashboard'))
         
         db.session.delete(item)
+        mark_timetables_written()
         db.session.commit()
         flash(f'{entity.title()} deleted successfully!', 'success')
     
@@ -555,6 +1697,91 @@ def delete_entity(entity, item_id):
     plural_entity = entity_plurals.get(entity, entity + 's')
     return redirect(url_for('manage_entity', entity=plural_entity))
 
+# Portfolio generation: several seeded solver attempts, in a process pool when there are spare cores
+PORTFOLIO_ATTEMPTS = int(os.environ.get('PORTFOLIO_ATTEMPTS', 1))
+PORTFOLIO_MAX_ATTEMPTS = int(os.environ.get('PORTFOLIO_MAX_ATTEMPTS', 64))
+PORTFOLIO_TIME_BUDGET = float(os.environ.get('PORTFOLIO_TIME_BUDGET', 5))
+PORTFOLIO_MAX_TIME_BUDGET = float(os.environ.get('PORTFOLIO_MAX_TIME_BUDGET', 30))
+SOLVER_WORKERS = int(os.environ.get('SOLVER_WORKERS', os.cpu_count() or 1))
+_solver_pool = None
+
+def get_solver_pool():
+    """Process pool for solver attempts, created on first use (None means run in-process)"""
+    global _solver_pool
+    if _solver_pool is None and SOLVER_WORKERS > 1:
+        try:
+            # spawn: forking a threaded server process with open DB connections is not safe
+            _solver_pool = ProcessPoolExecutor(max_workers=SOLVER_WORKERS,
+                                               mp_context=multiprocessing.get_context('spawn'))
+        except (OSError, ValueError, NotImplementedError) as e:
+            print(f"Solver pool unavailable, solving in-process: {e}")
+    return _solver_pool
+
+def solve_timetable(problem, attempts, mode, time_budget, seed=None, config_index=0):
+    """Run the solver portfolio, falling back to in-process attempts if the pool is broken"""
+    global _solver_pool
+    executor = get_solver_pool() if attempts > 1 else None
+    try:
+        return solver.run_portfolio(problem, attempts, mode=mode, time_budget=time_budget, seed=seed,
+                                    config_index=config_index, executor=executor)
+    except BrokenProcessPool:
+        _solver_pool = None
+        return solver.run_portfolio(problem, attempts, mode=mode, time_budget=time_budget, seed=seed,
+                                    config_index=config_index)
+
+def build_solver_problem(batch, faculty_assignments):
+    """Gather everything the solver needs for one batch into a plain, picklable dict"""
+    subjects = []
+    for subject in Subject.query.options(db.joinedload(Subject.faculty)).filter_by(
+            semester=batch.semester, department=batch.department).order_by(Subject.id):
+        faculty_id = faculty_assignments.get(subject.id)
+        if not faculty_id:
+            # If no faculty assigned, use the first one qualified for the subject
+            if subject.faculty:
+                faculty_id = subject.faculty[0].id
+            else:
+                flash(f'No faculty assigned for {subject.name}. Skipping this subject.', 'warning')
+                continue
+        subjects.append({'id': subject.id, 'name': subject.name, 'type': subject.type,
+                         'hours_per_week': subject.hours_per_week, 'faculty_id': faculty_id})
+    
+    # Bookings of every other batch, so shared rooms and faculty are never double-booked
+    other_batches = db.session.query(Timetable.faculty_id, Timetable.classroom_id, Timetable.day_of_week,
+                                     Timetable.time_slot).filter(Timetable.batch_id != batch.id).all()
+    
+    # Daily limits, and what other batches already load onto each faculty member (counters less this batch)
+    faculty_ids = {subject['faculty_id'] for subject in subjects}
+    faculty_limits = db.session.query(Faculty.id, Faculty.max_hours_per_day).filter(Faculty.id.in_(faculty_ids)).all()
+    faculty_load = {(faculty_id, day): hours for faculty_id, day, hours in db.session.query(
+        FacultyDayLoad.faculty_id, FacultyDayLoad.day_of_week, FacultyDayLoad.hours
+    ).filter(FacultyDayLoad.faculty_id.in_(faculty_ids))}
+    own = db.session.query(Timetable.faculty_id, Timetable.day_of_week, Timetable.time_slot).filter(
+        Timetable.batch_id == batch.id, Timetable.faculty_id.in_(faculty_ids)).all()
+    for key, delta in faculty_load_deltas(removed=own).items():
+        faculty_load[key] = faculty_load.get(key, 0) + delta
+    
+    # Availability windows, ANDed into the solver's slot domains
+    windows = load_faculty_windows(faculty_ids)
+    
+    return {
+        'subjects': subjects,
+        'classrooms': [tuple(row) for row in db.session.query(Classroom.id, Classroom.capacity, Classroom.type)
+                       .filter_by(is_available=True).order_by(Classroom.id)],
+        'strength': batch.strength,
+        'days': DAYS,
+        'slots': TIME_SLOTS,
+        'lab_slots': LAB_TIME_SLOTS,
+        'slot_periods': SLOT_PERIODS,
+        'lunch_slot': LUNCH_SLOT,
+        'faculty_busy': [(row.faculty_id, row.day_of_week, row.time_slot) for row in other_batches],
+        'room_busy': [(row.classroom_id, row.day_of_week, row.time_slot) for row in other_batches],
+        'faculty_limits': [tuple(row) for row in faculty_limits],
+        'faculty_load': [(faculty_id, day, hours) for (faculty_id, day), hours in faculty_load.items() if hours > 0],
+        'faculty_available': [(faculty_id, day, available) for (faculty_id, day), (available, _) in windows.items()],
+        'faculty_preferred': [(faculty_id, day, preferred) for (faculty_id, day), (_, preferred) in windows.items()
+                              if preferred is not None]
+    }
+
 @app.route('/generate_timetable', methods=['GET', 'POST'])
 def generate_timetable():
     if 'user_id' not in session or session.get('user_role') != 'admin':
@@ -562,19 +1789,9 @@ def generate_timetable():
         return redirect(url_for('login'))
     
     if request.method == 'POST':
-        # Simple timetable generation logic
-        batch_id = request.form['batch_id']
+        batch_id = int(request.form['batch_id'])
         max_classes_per_day = int(request.form.get('max_classes_per_day', 6))
-        
-        # Clear existing timetable for this batch
-        Timetable.query.filter_by(batch_id=batch_id).delete()
-        
-        # Get subjects for this batch
-        batch = Batch.query.get(batch_id)
-        subjects = Subject.query.filter_by(semester=batch.semester, department=batch.department).all()
-        
-        days = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday']
-        time_slots = ['09:15-10:15', '10:15-11:15', '11:15-12:15', '12:15-01:00', '01:00-02:00', '02:00-03:00', '03:00-04:00']
+        batch = Batch.query.get_or_404(batch_id)
         
         # Get faculty assignments from form
         faculty_assignments = {}
@@ -583,155 +1800,78 @@ def generate_timetable():
                 subject_id = int(key.replace('subject_faculty_', ''))
                 faculty_assignments[subject_id] = int(value)
         
-        # Define 2-hour lab time slots (matching the image layout)
-        lab_time_slots = ['09:15-11:15', '10:15-12:15', '01:00-03:00', '02:00-04:00']
-        scheduled_slots = set()  # Track occupied slots to avoid conflicts
-        
-        # Import random for randomized scheduling
-        import random
-        
-        # Create list of all available time slots (excluding lunch)
-        available_slots = []
-        for day in days:
-            for time_slot in time_slots:
-                if time_slot != '12:15-01:00':  # Skip lunch break
-                    available_slots.append((day, time_slot))
-        
-        # Shuffle the available slots for randomization
-        random.shuffle(available_slots)
-        
-        # Randomized assignment with free periods
-        for subject in subjects:
-            # Get assigned faculty for this subject
-            faculty_id = faculty_assignments.get(subject.id)
-            if not faculty_id:
-                # If no faculty assigned, skip this subject or use first available faculty
-                if subject.faculty:
-                    faculty_id = subject.faculty[0].id
-                else:
-                    flash(f'No faculty assigned for {subject.name}. Skipping this subject.', 'warning')
-                    continue
-            
-            classes_needed = subject.hours_per_week
-            
-            # Handle lab/practical subjects (2-hour continuous slots like in the image)
-            if subject.type == 'practical':
-                lab_sessions_needed = (classes_needed + 1) // 2  # Round up for 2-hour blocks
-                
-                # Create list of available lab slots and shuffle them
-                available_lab_slots = []
-                for day in days:
-                    for lab_slot in lab_time_slots:
-                        available_lab_slots.append((day, lab_slot))
-                random.shuffle(available_lab_slots)
-                
-                for lab_session in range(lab_sessions_needed):
-                    scheduled = False
-                    # Try to find an available 2-hour slot randomly
-                    for day, lab_slot in available_lab_slots:
-                        slot_key = f"{day}_{lab_slot}"
-                        
-                        # Check for conflicts with existing bookings
-                        conflict = False
-                        if lab_slot == '09:15-11:15':
-                            if f"{day}_09:15-10:15" in scheduled_slots or f"{day}_10:15-11:15" in scheduled_slots:
-                                conflict = True
-                        elif lab_slot == '10:15-12:15':
-                            if f"{day}_10:15-11:15" in scheduled_slots or f"{day}_11:15-12:15" in scheduled_slots:
-                                conflict = True
-                        elif lab_slot == '01:00-03:00':
-                            if f"{day}_01:00-02:00" in scheduled_slots or f"{day}_02:00-03:00" in scheduled_slots:
-                                conflict = True
-                        elif lab_slot == '02:00-04:00':
-                            if f"{day}_02:00-03:00" in scheduled_slots or f"{day}_03:00-04:00" in scheduled_slots:
-                                conflict = True
-                        
-                        if not conflict and slot_key not in scheduled_slots:
-                            # Find suitable classroom (prefer lab type)
-                            classroom = Classroom.query.filter_by(type='lab', is_available=True).first()
-                            if not classroom:
-                                classroom = Classroom.query.filter_by(is_available=True).first()
-                            
-                            if classroom:
-                                # Create the 2-hour lab entry
-                                timetable_entry = Timetable(
-                                    batch_id=batch_id,
-                                    subject_id=subject.id,
-                                    faculty_id=faculty_id,
-                                    classroom_id=classroom.id,
-                                    day_of_week=day,
-                                    time_slot=lab_slot
-                                )
-                                db.session.add(timetable_entry)
-                                
-                                # Block the 2-hour slot and constituent 1-hour slots
-                                scheduled_slots.add(slot_key)
-                                if lab_slot == '09:15-11:15':
-                                    scheduled_slots.add(f"{day}_09:15-10:15")
-                                    scheduled_slots.add(f"{day}_10:15-11:15")
-                                elif lab_slot == '10:15-12:15':
-                                    scheduled_slots.add(f"{day}_10:15-11:15")
-                                    scheduled_slots.add(f"{day}_11:15-12:15")
-                                elif lab_slot == '01:00-03:00':
-                                    scheduled_slots.add(f"{day}_01:00-02:00")
-                                    scheduled_slots.add(f"{day}_02:00-03:00")
-                                elif lab_slot == '02:00-04:00':
-                                    scheduled_slots.add(f"{day}_02:00-03:00")
-                                    scheduled_slots.add(f"{day}_03:00-04:00")
-                                
-                                scheduled = True
-                                print(f"DEBUG: Scheduled lab {subject.name} on {day} {lab_slot}")
-                                
-                                # Remove used slots from available list
-                                available_lab_slots = [(d, s) for d, s in available_lab_slots if f"{d}_{s}" != slot_key]
-                                break
-                    
-                    if not scheduled:
-                        flash(f'Could not schedule all lab sessions for {subject.name}', 'warning')
-                        break
-            
-            # Handle regular 1-hour subjects
-            else:
-                # Create a copy of available slots for this subject
-                subject_available_slots = [slot for slot in available_slots if f"{slot[0]}_{slot[1]}" not in scheduled_slots]
-                
-                # Limit scheduling to create free periods (schedule only 60-80% of needed classes randomly)
-                max_classes_to_schedule = max(1, int(classes_needed * random.uniform(0.6, 0.9)))
-                classes_to_schedule = min(classes_needed, max_classes_to_schedule)
-                
-                for _ in range(classes_to_schedule):
-                    if not subject_available_slots:
-                        flash(f'No more available slots for {subject.name}', 'warning')
-                        break
-                    
-                    # Pick a random slot from available slots
-                    slot_index = random.randint(0, len(subject_available_slots) - 1)
-                    day, time_slot = subject_available_slots[slot_index]
-                    slot_key = f"{day}_{time_slot}"
-                    
-                    # Find available classroom
-                    classroom = Classroom.query.filter_by(is_available=True).first()
-                    if classroom:
-                        timetable_entry = Timetable(
-                            batch_id=batch_id,
-                            subject_id=subject.id,
-                            faculty_id=faculty_id,
-                            classroom_id=classroom.id,
-                            day_of_week=day,
-                            time_slot=time_slot
-                        )
-                        db.session.add(timetable_entry)
-                        scheduled_slots.add(slot_key)
-                        
-                        # Remove the used slot from available slots
-                        subject_available_slots.pop(slot_index)
-                        print(f"DEBUG: Scheduled {subject.name} on {day} {time_slot}")
-                    else:
-                        flash(f'No available classroom for {subject.name}', 'warning')
-                        break
+        problem = build_solver_problem(batch, faculty_assignments)
+        
+        # Counting bounds first: impossible inputs fail here, before any solver time or writes
+        faculty_names = dict(db.session.query(Faculty.id, Faculty.name).filter(
+            Faculty.id.in_({subject['faculty_id'] for subject in problem['subjects']})))
+        feasibility = solver.check_feasibility(problem, faculty_names)
+        for warning in feasibility['warnings']:
+            flash(warning, 'warning')
+        if feasibility['errors']:
+            flash(f'{batch.name} cannot be scheduled as configured, so nothing was generated:', 'error')
+            for error in feasibility['errors']:
+                flash(error, 'error')
+            return redirect(url_for('generate_timetable'))
+        
+        # Portfolio settings; a given seed and configuration reproduce an earlier result exactly
+        attempts = max(1, min(request.form.get('attempts', PORTFOLIO_ATTEMPTS, type=int), PORTFOLIO_MAX_ATTEMPTS))
+        mode = 'best' if request.form.get('portfolio_mode') == 'best' else 'first'
+        time_budget = max(0.1, min(request.form.get('time_budget', PORTFOLIO_TIME_BUDGET, type=float), PORTFOLIO_MAX_TIME_BUDGET))
+        seed = request.form.get('seed', type=int)
+        config_index = request.form.get('config_index', 0, type=int) % len(solver.CONFIGS)
+        
+        # Unchanged inputs reuse the stored solution; without an explicit seed any earlier seed will do
+        cache_key = solver.problem_key(problem, seed=seed, attempts=attempts, mode=mode,
+                                       time_budget=time_budget, config_index=config_index)
+        cached = None if request.form.get('ignore_cache') else solution_cache.get(cache_key)
+        if cached is None:
+            result = solve_timetable(problem, attempts, mode, time_budget, seed, config_index)
+            payload = snapshots.encode_entries(result.pop('placements'), DAYS, TIME_SLOTS + LAB_TIME_SLOTS)
+            solution_cache.set(cache_key, (payload, result))
+        else:
+            payload, result = cached
         
-        db.session.commit()
-        flash('Timetable generated successfully!', 'success')
+        for warning in result['warnings']:
+            flash(warning, 'warning')
+        # The feasibility check only bounds capacity, so say exactly which subjects came up short
+        for shortfall in result.get('shortfalls', ()):
+            flash(f"{shortfall['name']}: scheduled {shortfall['scheduled']} of {shortfall['demanded']} hours a week", 'warning')
+        
+        # Keep any manual edits as a version of their own; the new timetable is applied as a diff
+        portfolio = result['portfolio']
+        try:
+            capture_unsaved_edits(batch_id)
+            changes = persist_batch_timetable(batch_id, snapshots.decode_entries(payload))
+            active = get_active_snapshot(batch_id)
+            if active is None or bytes(active.payload) != payload:
+                snapshot = save_timetable_snapshot(batch_id, 'generated', payload)
+                db.session.add(TimetableGenerationRun(
+                    snapshot_id=snapshot.id, batch_id=batch_id, seed=result['seed'], config_index=result['config_index'],
+                    mode=portfolio['mode'], attempts=portfolio['attempts'], finished=portfolio['finished'],
+                    score=result['score'], complete=result['complete'], elapsed_ms=int(portfolio['elapsed_ms'])
+                ))
+            db.session.commit()
+        except TimetableConflict as e:
+            # Another batch booked some of the same faculty or rooms while this one was being solved
+            db.session.rollback()
+            flash(f'{e}. Please generate again.', 'error')
+            return redirect(url_for('generate_timetable'))
+        publish_timetable_change(batch_id)
+        if result.get('shortfalls'):
+            demanded = sum(shortfall['demanded'] for shortfall in result['shortfalls'])
+            scheduled = sum(shortfall['scheduled'] for shortfall in result['shortfalls'])
+            subjects = len(result['shortfalls'])
+            flash(f"Timetable generated with {demanded - scheduled} demanded hours unscheduled across "
+                  f"{subjects} subject{'' if subjects == 1 else 's'} ({describe_timetable_changes(changes)})", 'warning')
+        else:
+            flash(f'Timetable generated successfully! ({describe_timetable_changes(changes)})', 'success')
+        if cached is None:
+            flash(f"Seed {result['seed']}, configuration {result['config_index']}, score {result['score']} "
+                  f"(best of {portfolio['finished']}/{portfolio['attempts']} attempts in {portfolio['elapsed_ms']} ms)", 'info')
+        else:
+            flash(f"Inputs unchanged - reused the stored solution (seed {result['seed']}, "
+                  f"configuration {result['config_index']}, score {result['score']})", 'info')
         return redirect(url_for('view_timetable', batch_id=batch_id))
     
     # Calculate statistics for the dashboard
@@ -766,7 +1906,9 @@ def generate_timetable():
         'available_classrooms': Classroom.query.filter_by(is_available=True).count()
     }
     
-    return render_template('generate_timetable.html', batches=batches, stats=stats)
+    return render_template('generate_timetable.html', batches=batches, stats=stats,
+                           portfolio_attempts=PORTFOLIO_ATTEMPTS, portfolio_time_budget=PORTFOLIO_TIME_BUDGET,
+                           solver_configs=solver.CONFIGS)
 
 @app.route('/view_timetable/<int:batch_id>')
 def view_timetable(batch_id):
@@ -780,70 +1922,120 @@ def view_timetable(batch_id):
             return redirect(url_for('student_dashboard'))
     
     batch = Batch.query.get_or_404(batch_id)
-    timetable_entries = db.session.query(Timetable, Subject, Faculty, Classroom).join(
-        Subject, Timetable.subject_id == Subject.id
-    ).join(
-        Faculty, Timetable.faculty_id == Faculty.id
-    ).join(
-        Classroom, Timetable.classroom_id == Classroom.id
-    ).filter(Timetable.batch_id == batch_id).all()
     
-    # Organize by day and time
-    days = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday']
-    time_slots = ['09:15-10:15', '10:15-11:15', '11:15-12:15', '12:15-01:00', '01:00-02:00', '02:00-03:00', '03:00-04:00']
-    lab_time_slots = ['09:15-11:15', '10:15-12:15', '01:00-03:00', '02:00-04:00']
-    
-    timetable = {}
-    for day in days:
-        timetable[day] = {}
-        # Initialize regular time slots
-        for time_slot in time_slots:
-            timetable[day][time_slot] = None
-        # Initialize lab time slots
-        for lab_slot in lab_time_slots:
-            timetable[day][lab_slot] = None
-
-    for entry, subject, faculty, classroom in timetable_entries:
-        timetable[entry.day_of_week][entry.time_slot] = {
-            'subject': subject.name,
-            'faculty': faculty.name,
-            'classroom': classroom.name,
-            'type': subject.type
-        }
+    # Grid markup and statistics are cached per timetable version
+    version = get_timetable_version(batch_id)
+    grid = render_timetable_grid('fragments/batch_grid.html', batch_id, version)
+    
+    # Approval is one row per batch, valid only for the version it was given to
+    approval = get_timetable_approval(batch_id, version)
 
-    # Check if timetable is approved
-    is_approved = False
-    if timetable_entries:
-        # Check if all entries are approved
-        is_approved = all(entry.is_approved for entry, _, _, _ in timetable_entries)
+    return render_template('view_timetable.html', batch=batch, grid_html=grid['grid_html'], 
+                         timetable=grid['timetable'], version=version, lunch_slot=LUNCH_SLOT,
+                         days=DAYS, time_slots=TIME_SLOTS, lab_time_slots=LAB_TIME_SLOTS, 
+                         is_approved=approval is not None, approval=approval, total_hours=grid['total_hours'],
+                         theory_count=grid['theory_count'], practical_count=grid['practical_count'],
+                         tutorial_count=grid['tutorial_count'])
 
-    # Calculate statistics for this specific batch
-    # Count actual hours (lab sessions count as 2 hours each)
-    total_hours = 0
-    theory_count = 0
-    practical_count = 0
-    tutorial_count = 0
+@app.route('/timetable_stream/<int:batch_id>')
+def timetable_stream(batch_id):
+    """Server-sent events carrying every committed change to a batch's timetable"""
+    if 'user_id' not in session:
+        return jsonify({'error': 'Access denied'}), 403
+    if session.get('user_role') == 'student' and session.get('batch_id') != batch_id:
+        return jsonify({'error': 'Access denied'}), 403
+    if not live_updates_enabled():
+        # EventSource does not reconnect after a 204
+        return '', 204
     
-    for entry, subject, _, _ in timetable_entries:
-        if subject.type == 'theory':
-            theory_count += 1
-            total_hours += 1  # Theory classes are 1 hour
-        elif subject.type == 'practical':
-            practical_count += 1
-            # Check if it's a 2-hour lab session
-            if entry.time_slot in ['09:15-11:15', '10:15-12:15', '01:00-03:00', '02:00-04:00']:
-                total_hours += 2  # Lab sessions are 2 hours
-            else:
-                total_hours += 1  # Regular practical is 1 hour
-        elif subject.type == 'tutorial':
-            tutorial_count += 1
-            total_hours += 1  # Tutorial classes are 1 hour
+    # Subscribe before reading the version, so no change committed in between is missed
+    subscription = broker.subscribe(timetable_channel(batch_id))
+    try:
+        known = request.headers.get('Last-Event-ID') or request.args.get('version', '')
+        snapshot = timetable_delta(batch_id)
+        if known.isdigit() and int(known) == snapshot['version']:
+            snapshot = None
+    except Exception:
+        subscription.close()
+        raise
+    finally:
+        # The stream outlives the request context; it must not hold a database connection
+        db.session.remove()
+    
+    def stream():
+        try:
+            yield 'retry: 3000\n\n'
+            if snapshot is not None:
+                yield pubsub.format_event('timetable', snapshot, snapshot['version'])
+            deadline = time.monotonic() + TIMETABLE_STREAM_SECONDS
+            while (remaining := deadline - time.monotonic()) > 0:
+                message = subscription.get(timeout=min(TIMETABLE_STREAM_HEARTBEAT, remaining))
+                if subscription.overflowed:
+                    # Too far behind to catch up event by event
+                    yield pubsub.format_event('resync', {})
+                    return
+                if message is None:
+                    yield ': keep-alive\n\n'
+                else:
+                    yield pubsub.format_event(message['event'], message, message['version'])
+        finally:
+            subscription.close()
+    
+    return app.response_class(stream(), mimetype='text/event-stream',
+                              headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@app.route('/faculty_timetable/<int:faculty_id>')
+def faculty_timetable(faculty_id):
+    if 'user_id' not in session:
+        return redirect(url_for('login'))
+    
+    faculty = Faculty.query.get_or_404(faculty_id)
+    grid = render_resource_grid('faculty', faculty_id)
+    
+    return render_template('resource_timetable.html', kind='faculty', resource=faculty,
+                           grid_html=grid['grid_html'], total_hours=grid['total_hours'],
+                           batch_count=grid['batch_count'], clash_count=grid['clash_count'])
+
+@app.route('/classroom_timetable/<int:classroom_id>')
+def classroom_timetable(classroom_id):
+    if 'user_id' not in session:
+        return redirect(url_for('login'))
+    
+    classroom = Classroom.query.get_or_404(classroom_id)
+    grid = render_resource_grid('classroom', classroom_id)
+    
+    return render_template('resource_timetable.html', kind='classroom', resource=classroom,
+                           grid_html=grid['grid_html'], total_hours=grid['total_hours'],
+                           batch_count=grid['batch_count'], clash_count=grid['clash_count'])
 
-    return render_template('view_timetable.html', batch=batch, timetable=timetable, 
-                         days=days, time_slots=time_slots, lab_time_slots=lab_time_slots, 
-                         is_approved=is_approved, total_hours=total_hours,
-                         theory_count=theory_count, practical_count=practical_count,
-                         tutorial_count=tutorial_count)
+@app.route('/get_faculty_timetable/<int:faculty_id>')
+def get_faculty_timetable(faculty_id):
+    if 'user_id' not in session:
+        return jsonify({'error': 'Access denied'}), 403
+    
+    faculty = Faculty.query.get_or_404(faculty_id)
+    grid = render_resource_grid('faculty', faculty_id)
+    return jsonify({
+        'faculty': {'id': faculty.id, 'name': faculty.name, 'department': faculty.department},
+        'entries': grid['entries'],
+        'total_hours': grid['total_hours'],
+        'clash_count': grid['clash_count']
+    })
+
+@app.route('/get_classroom_timetable/<int:classroom_id>')
+def get_classroom_timetable(classroom_id):
+    if 'user_id' not in session:
+        return jsonify({'error': 'Access denied'}), 403
+    
+    classroom = Classroom.query.get_or_404(classroom_id)
+    grid = render_resource_grid('classroom', classroom_id)
+    return jsonify({
+        'classroom': {'id': classroom.id, 'name': classroom.name, 'capacity': classroom.capacity,
+                      'type': classroom.type},
+        'entries': grid['entries'],
+        'total_hours': grid['total_hours'],
+        'clash_count': grid['clash_count']
+    })
 
 @app.route('/view_all_timetables')
 def view_all_timetables():
@@ -890,13 +2082,7 @@ def suggest_changes(batch_id):
     batch = Batch.query.get_or_404(batch_id)
     
     # Get current timetable data
-    timetable_entries = db.session.query(Timetable, Subject, Faculty, Classroom).join(
-        Subject, Timetable.subject_id == Subject.id
-    ).join(
-        Faculty, Timetable.faculty_id == Faculty.id
-    ).join(
-        Classroom, Timetable.classroom_id == Classroom.id
-    ).filter(Timetable.batch_id == batch_id).all()
+    timetable_entries = load_timetable_slots(Timetable.batch_id == batch_id)
     
     # Get all available resources for dropdowns
     subjects = Subject.query.all()
@@ -908,33 +2094,90 @@ def suggest_changes(batch_id):
     time_slots = ['09:15-10:15', '10:15-11:15', '11:15-12:15', '12:15-01:00', '01:00-02:00', '02:00-03:00', '03:00-04:00']
     all_time_slots = time_slots + ['09:15-11:15', '10:15-12:15', '01:00-03:00', '02:00-04:00']
     
-    timetable = {}
-    for day in days:
-        timetable[day] = {}
-        for time_slot in all_time_slots:
-            timetable[day][time_slot] = None
-    
-    for entry, subject, faculty, classroom in timetable_entries:
-        timetable[entry.day_of_week][entry.time_slot] = {
-            'id': entry.id,
-            'subject': subject.name,
-            'subject_id': subject.id,
-            'faculty': faculty.name,
-            'faculty_id': faculty.id,  
-            'classroom': classroom.name,
-            'classroom_id': classroom.id,
-            'type': subject.type
-        }
+    timetable = readmodels.empty_grid(days, all_time_slots)
+    for slot in timetable_entries:
+        timetable[slot.day][slot.time_slot] = readmodels.grid_cell(slot, with_ids=True)
     
     return render_template('edit_timetable.html', 
                          batch=batch, 
+                         version=get_timetable_version(batch_id),
                          timetable=timetable, 
+                         lunch_slot=LUNCH_SLOT,
                          days=days, 
                          time_slots=time_slots,
                          subjects=subjects,
                          faculties=faculties,
                          classrooms=classrooms)
 
+def get_occupancy_index():
+    """Period bitmasks of every booking, rebuilt only when some timetable changed"""
+    def build():
+        rows = db.session.query(Timetable.id, Timetable.batch_id, Timetable.subject_id, Timetable.faculty_id,
+                                Timetable.classroom_id, Timetable.day_of_week, Timetable.time_slot)
+        return suggestions.OccupancyIndex(rows, suggestions.slot_masks(SLOT_PERIODS, TIME_SLOTS))
+    return occupancy_cache.get_or_create(get_cache_version('timetables'), build)
+
+def overlapping_slots(time_slot):
+    """Every slot sharing a period with time_slot (a 2-hour lab overlaps two 1-hour slots)"""
+    periods = set(SLOT_PERIODS.get(time_slot, (time_slot,)))
+    return [slot for slot, covered in SLOT_PERIODS.items() if periods & set(covered)] or [time_slot]
+
+@app.route('/suggest_alternatives/<int:batch_id>')
+def suggest_alternatives(batch_id):
+    """Top-ranked feasible placements for an existing class (?entry_id=) or an empty cell (?day=&time_slot=)"""
+    if 'user_id' not in session or session.get('user_role') != 'admin':
+        return jsonify({'error': 'Access denied'}), 403
+    
+    started = time.perf_counter()
+    batch = Batch.query.get_or_404(batch_id)
+    top_k = max(1, min(request.args.get('limit', 8, type=int), 50))
+    index = get_occupancy_index()
+    rooms = [tuple(row) for row in db.session.query(Classroom.id, Classroom.name, Classroom.capacity, Classroom.type)
+             .filter_by(is_available=True).order_by(Classroom.id)]
+    teaching_slots = [time_slot for time_slot in TIME_SLOTS if time_slot != LUNCH_SLOT]
+    
+    entry_id = request.args.get('entry_id', type=int)
+    if entry_id:
+        entry = Timetable.query.filter_by(id=entry_id, batch_id=batch_id).first_or_404()
+        subject = Subject.query.options(db.joinedload(Subject.faculty)).get(entry.subject_id)
+        faculty = {member.id: (member.id, member.name, member.max_hours_per_day) for member in subject.faculty}
+        if entry.faculty_id not in faculty:
+            member = Faculty.query.get(entry.faculty_id)
+            faculty[member.id] = (member.id, member.name, member.max_hours_per_day)
+        # Labs move between lab slots, other classes between 1-hour periods
+        slot_choices = LAB_TIME_SLOTS if entry.time_slot in LAB_TIME_SLOTS else teaching_slots
+        results = suggestions.suggest_moves(
+            index,
+            {'id': entry.id, 'batch_id': batch_id, 'day': entry.day_of_week, 'time_slot': entry.time_slot,
+             'faculty_id': entry.faculty_id, 'classroom_id': entry.classroom_id},
+            {'id': subject.id, 'name': subject.name, 'type': subject.type},
+            list(faculty.values()), rooms, batch.strength,
+            [(day, time_slot) for day in DAYS for time_slot in slot_choices],
+            top_k=top_k, windows=load_faculty_windows(list(faculty))
+        )
+    else:
+        day = request.args.get('day')
+        time_slot = request.args.get('time_slot')
+        if day not in DAYS or time_slot not in teaching_slots + LAB_TIME_SLOTS:
+            return jsonify({'error': 'Choose a class or an empty teaching slot'}), 400
+        # An empty 1-hour cell can also take a 2-hour lab starting there
+        slots = [(day, time_slot)] + [(day, lab_slot) for lab_slot in LAB_TIME_SLOTS
+                                      if SLOT_PERIODS[lab_slot][0] == time_slot]
+        subjects = [{
+            'id': subject.id, 'name': subject.name, 'type': subject.type, 'hours_per_week': subject.hours_per_week,
+            'faculty': [(member.id, member.name, member.max_hours_per_day) for member in subject.faculty]
+        } for subject in Subject.query.options(db.joinedload(Subject.faculty)).filter_by(
+            semester=batch.semester, department=batch.department).order_by(Subject.id)]
+        faculty_ids = {member[0] for subject in subjects for member in subject['faculty']}
+        results = suggestions.suggest_fills(index, batch_id, subjects, rooms, batch.strength, slots, top_k=top_k,
+                                            windows=load_faculty_windows(faculty_ids))
+    
+    return jsonify({
+        'suggestions': results,
+        'version': get_timetable_version(batch_id),
+        'elapsed_ms': round((time.perf_counter() - started) * 1000, 1)
+    })
+
 @app.route('/update_timetable_entry', methods=['POST'])
 def update_timetable_entry():
     if 'user_id' not in session or session.get('user_role') != 'admin':
@@ -949,29 +2192,48 @@ def update_timetable_entry():
         faculty_id = data.get('faculty_id')
         classroom_id = data.get('classroom_id')
         action = data.get('action')  # 'add', 'update', 'delete'
+        # Timetable version the editor was looking at; a stale one is rejected instead of overwriting
+        expected_version = data.get('version')
         
         if action == 'delete' and data.get('entry_id'):
             # Delete existing entry
             entry = Timetable.query.get(data.get('entry_id'))
             if entry:
+                batch_id, day, time_slot = entry.batch_id, entry.day_of_week, entry.time_slot
+                resource_versions = read_resource_versions(placement_resource_keys(
+                    [(day, time_slot, entry.subject_id, entry.faculty_id, entry.classroom_id)]))
+                adjust_faculty_load(faculty_load_deltas(removed=[(entry.faculty_id, day, time_slot)]))
                 db.session.delete(entry)
+                if expected_version is not None:
+                    claim_timetable_version(batch_id, expected_version)
+                else:
+                    bump_timetable_version(batch_id)
+                claim_resource_versions(resource_versions)
                 db.session.commit()
-                return jsonify({'success': True, 'message': 'Entry deleted successfully'})
+                delta = publish_timetable_change(batch_id, [day])
+                return jsonify({'success': True, 'message': 'Entry deleted successfully',
+                                'version': delta['version'], 'delta': delta})
         
         elif action in ['add', 'update']:
             if not all([batch_id, day, time_slot, subject_id, faculty_id, classroom_id]):
                 return jsonify({'success': False, 'message': 'Missing required fields'})
             
+            # Read resource versions before the clash checks; they are swapped on write
+            resource_versions = read_resource_versions([
+                ('faculty', int(faculty_id), day),
+                ('classroom', int(classroom_id), day)
+            ])
+            
             # Check for conflicts (except for the entry being updated)
             existing_entry = None
             if action == 'update' and data.get('entry_id'):
                 existing_entry = Timetable.query.get(data.get('entry_id'))
             
-            # Faculty conflict check
+            # Faculty conflict check - any booking sharing a period (a lab spans two)
             faculty_conflict = db.session.query(Timetable).filter(
                 Timetable.faculty_id == faculty_id,
                 Timetable.day_of_week == day,
-                Timetable.time_slot == time_slot,
+                Timetable.time_slot.in_(overlapping_slots(time_slot)),
                 Timetable.id != (existing_entry.id if existing_entry else 0)
             ).first()
             
@@ -982,18 +2244,45 @@ def update_timetable_entry():
             classroom_conflict = db.session.query(Timetable).filter(
                 Timetable.classroom_id == classroom_id,
                 Timetable.day_of_week == day,
-                Timetable.time_slot == time_slot,
+                Timetable.time_slot.in_(overlapping_slots(time_slot)),
                 Timetable.id != (existing_entry.id if existing_entry else 0)
             ).first()
             
             if classroom_conflict:
                 return jsonify({'success': False, 'message': 'Classroom is already booked for this time slot'})
             
+            if not faculty_is_available(int(faculty_id), day, time_slot):
+                return jsonify({'success': False, 'message': 'Faculty is not available at this time'})
+            
+            # Days whose cells change - a moved class leaves its old day too
+            changed_days = [day] + ([existing_entry.day_of_week] if existing_entry else [])
+            
+            # A new or moved class: the batch must be free for every period of the slot
+            moved = existing_entry and (existing_entry.day_of_week, existing_entry.time_slot) != (day, time_slot)
+            if moved or not existing_entry:
+                batch_conflict = db.session.query(Timetable.id).filter(
+                    Timetable.batch_id == (existing_entry.batch_id if existing_entry else batch_id),
+                    Timetable.day_of_week == day,
+                    Timetable.time_slot.in_(overlapping_slots(time_slot)),
+                    Timetable.id != (existing_entry.id if existing_entry else 0)
+                ).first()
+                if batch_conflict:
+                    return jsonify({'success': False, 'message': 'The batch already has a class at this time'})
+            
+            # Faculty daily limit, checked against the maintained per-day counters
+            adjust_faculty_load(faculty_load_deltas(
+                removed=[(existing_entry.faculty_id, existing_entry.day_of_week, existing_entry.time_slot)]
+                if existing_entry else [],
+                added=[(faculty_id, day, time_slot)]
+            ), enforce=True)
+            
             if action == 'update' and existing_entry:
                 # Update existing entry
                 existing_entry.subject_id = subject_id
                 existing_entry.faculty_id = faculty_id
                 existing_entry.classroom_id = classroom_id
+                existing_entry.day_of_week = day
+                existing_entry.time_slot = time_slot
             else:
                 # Add new entry
                 new_entry = Timetable(
@@ -1006,25 +2295,53 @@ def update_timetable_entry():
                 )
                 db.session.add(new_entry)
             
+            target_batch_id = existing_entry.batch_id if existing_entry else batch_id
+            if expected_version is not None:
+                claim_timetable_version(target_batch_id, expected_version)
+            else:
+                bump_timetable_version(target_batch_id)
+            claim_resource_versions(resource_versions)
             db.session.commit()
             
-            # Get updated entry data for response
-            subject = Subject.query.get(subject_id)
-            faculty = Faculty.query.get(faculty_id)
-            classroom = Classroom.query.get(classroom_id)
+            # The changed days go to every open page of the batch, and back to the editor
+            delta = publish_timetable_change(target_batch_id, changed_days)
+            entry = next((cell['entry'] for cell in delta['cells']
+                          if (cell['day'], cell['time_slot']) == (day, time_slot)), None)
             
             return jsonify({
                 'success': True, 
                 'message': 'Timetable updated successfully',
-                'entry': {
-                    'subject': subject.name,
-                    'faculty': faculty.name,
-                    'classroom': classroom.name,
-                    'type': subject.type
-                }
+                'version': delta['version'],
+                'delta': delta,
+                'entry': entry and {key: entry[key] for key in ('subject', 'faculty', 'classroom', 'type')}
             })
         
         return jsonify({'success': False, 'message': 'Invalid action'})
+    
+    except FacultyOverloaded as e:
+        db.session.rollback()
+        return jsonify({'success': False, 'message': str(e)})
+    
+    except TimetableConflict as e:
+        db.session.rollback()
+        # Hand back what the slot holds now so the editor can retry from fresh state
+        current = load_timetable_slots(
+            Timetable.batch_id == batch_id,
+            Timetable.day_of_week == day,
+            Timetable.time_slot == time_slot
+        ) if batch_id else None
+        return jsonify({
+            'success': False,
+            'conflict': True,
+            'message': f'{e}. Review the latest timetable and try again.',
+            'version': get_timetable_version(batch_id) if batch_id else None,
+            'current_entry': {
+                'id': current[0].id,
+                'subject': current[0].subject,
+                'faculty': current[0].faculty,
+                'classroom': current[0].classroom
+            } if current else None
+        }), 409
         
     except Exception as e:
         db.session.rollback()
@@ -1041,9 +2358,19 @@ def delete_batch_timetable(batch_id):
         batch = Batch.query.get_or_404(batch_id)
         batch_name = batch.name
         
-        # Delete all timetable entries for this batch
+        # Delete all timetable entries for this batch (it stays restorable from its versions)
+        capture_unsaved_edits(batch_id)
+        removed = db.session.query(Timetable.day_of_week, Timetable.time_slot, Timetable.subject_id,
+                                   Timetable.faculty_id, Timetable.classroom_id).filter_by(batch_id=batch_id).all()
+        resource_versions = read_resource_versions(placement_resource_keys(removed))
+        adjust_faculty_load(faculty_load_deltas(
+            removed=[(faculty_id, day, time_slot) for day, time_slot, _, faculty_id, _ in removed]))
         deleted_count = Timetable.query.filter_by(batch_id=batch_id).delete()
+        ActiveTimetableSnapshot.query.filter_by(batch_id=batch_id).delete()
+        claim_resource_versions(resource_versions)
+        bump_timetable_version(batch_id)
         db.session.commit()
+        publish_timetable_change(batch_id)
         
         flash(f'Timetable for {batch_name} deleted successfully! ({deleted_count} classes removed)', 'success')
     
@@ -1053,6 +2380,33 @@ def delete_batch_timetable(batch_id):
     
     return redirect(url_for('view_all_timetables'))
 
+def load_subjects_with_faculty(semester, department):
+    """Subjects of a semester/department with their faculty, loaded in a single joined query"""
+    subjects = Subject.query.options(db.joinedload(Subject.faculty)).filter_by(
+        semester=semester, 
+        department=department
+    ).order_by(Subject.id).all()
+    
+    subjects_data = []
+    for subject in subjects:
+        faculty_data = []
+        for faculty in subject.faculty:
+            faculty_data.append({
+                'id': faculty.id,
+                'name': faculty.name,
+                'department': faculty.department
+            })
+        
+        subjects_data.append({
+            'id': subject.id,
+            'name': subject.name,
+            'code': subject.code,
+            'hours_per_week': subject.hours_per_week,
+            'type': subject.type,
+            'faculty': faculty_data
+        })
+    return subjects_data
+
 @app.route('/get_batch_subjects_faculty/<int:batch_id>')
 def get_batch_subjects_faculty(batch_id):
     if 'user_id' not in session or session.get('user_role') != 'admin':
@@ -1062,46 +2416,76 @@ def get_batch_subjects_faculty(batch_id):
         # Get batch details
         batch = Batch.query.get_or_404(batch_id)
         
-        # Get subjects for this batch (same semester and department)
-        subjects = Subject.query.filter_by(
-            semester=batch.semester, 
-            department=batch.department
-        ).all()
-        
-        # Format response data
-        subjects_data = []
-        for subject in subjects:
-            faculty_data = []
-            for faculty in subject.faculty:
-                faculty_data.append({
-                    'id': faculty.id,
-                    'name': faculty.name,
-                    'department': faculty.department
-                })
-            
-            subjects_data.append({
-                'id': subject.id,
-                'name': subject.name,
-                'code': subject.code,
-                'hours_per_week': subject.hours_per_week,
-                'type': subject.type,
-                'faculty': faculty_data
+        # Subjects change rarely - the payload is cached until one is added or removed
+        version = get_cache_version('subjects')
+        etag = f"subjects-{version}-batch-{batch.id}"
+        if etag in request.if_none_match:
+            response = app.response_class(status=304)
+        else:
+            subjects_data = subject_faculty_cache.get_or_create(
+                (batch.semester, batch.department, version),
+                lambda: load_subjects_with_faculty(batch.semester, batch.department)
+            )
+            response = jsonify({
+                'subjects': subjects_data,
+                'batch': {
+                    'id': batch.id,
+                    'name': batch.name,
+                    'department': batch.department,
+                    'semester': batch.semester
+                }
             })
         
-        return jsonify({
-            'subjects': subjects_data,
-            'batch': {
-                'id': batch.id,
-                'name': batch.name,
-                'department': batch.department,
-                'semester': batch.semester
-            }
-        })
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = 'private, no-cache'
+        return response
     
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 # Initialize database
+@app.route('/timetable_versions/<int:batch_id>')
+def timetable_versions(batch_id):
+    if 'user_id' not in session or session.get('user_role') != 'admin':
+        flash('Access denied. Admin privileges required.', 'error')
+        return redirect(url_for('login'))
+    
+    batch = Batch.query.get_or_404(batch_id)
+    versions = TimetableSnapshot.query.options(db.defer(TimetableSnapshot.payload)).filter_by(
+        batch_id=batch_id).order_by(TimetableSnapshot.id.desc()).all()
+    active = get_active_snapshot(batch_id)
+    # Manual edits since the active version are not stored until something replaces them
+    has_unsaved_edits = (active is not None and bytes(active.payload) != encode_live_timetable(batch_id))
+    
+    runs = {run.snapshot_id: run for run in TimetableGenerationRun.query.filter(
+        TimetableGenerationRun.snapshot_id.in_([version.id for version in versions]))} if versions else {}
+    
+    return render_template('timetable_versions.html', batch=batch, versions=versions, runs=runs,
+                           active_id=active.id if active else None, has_unsaved_edits=has_unsaved_edits,
+                           retention=SNAPSHOT_RETENTION)
+
+@app.route('/activate_timetable_version/<int:batch_id>/<int:snapshot_id>', methods=['POST'])
+def activate_timetable_version(batch_id, snapshot_id):
+    """Roll a batch back (or forward) to a stored timetable version"""
+    if 'user_id' not in session or session.get('user_role') != 'admin':
+        flash('Access denied. Admin privileges required.', 'error')
+        return redirect(url_for('login'))
+    
+    snapshot = TimetableSnapshot.query.filter_by(id=snapshot_id, batch_id=batch_id).first_or_404()
+    try:
+        capture_unsaved_edits(batch_id)
+        changes = restore_timetable_snapshot(batch_id, snapshot)
+        db.session.commit()
+        publish_timetable_change(batch_id)
+        flash(f'Timetable restored to the version from {snapshot.created_at.strftime("%d %b %Y, %H:%M")} '
+              f'({describe_timetable_changes(changes)}).', 'success')
+    except Exception as e:
+        db.session.rollback()
+        flash(f'Error restoring timetable: {str(e)}', 'error')
+        return redirect(url_for('timetable_versions', batch_id=batch_id))
+    
+    return redirect(url_for('view_timetable', batch_id=batch_id))
+
 @app.route('/approve_timetable/<int:batch_id>', methods=['POST'])
 def approve_timetable(batch_id):
     if 'user_id' not in session or session.get('user_role') != 'admin':
@@ -1109,19 +2493,20 @@ def approve_timetable(batch_id):
         return redirect(url_for('login'))
     
     try:
-        # Update all timetable entries for this batch to approved status
-        timetable_entries = Timetable.query.filter_by(batch_id=batch_id).all()
-        
-        if not timetable_entries:
+        if not db.session.query(Timetable.id).filter_by(batch_id=batch_id).first():
             flash('No timetable found for this batch.', 'error')
             return redirect(url_for('view_timetable', batch_id=batch_id))
         
-        # Set all entries as approved
-        for entry in timetable_entries:
-            entry.is_approved = True
-        
+        # Approve the version the admin reviewed as a whole, and only if nobody has changed it since
+        version = request.form.get('version', type=int)
+        if version is None or version != get_timetable_version(batch_id):
+            flash('This timetable has changed since you opened it. Review the current version and approve again.', 'error')
+            return redirect(url_for('view_timetable', batch_id=batch_id))
+        approve_timetable_version(batch_id, version, session.get('user_id'))
+        mark_timetables_written()
         db.session.commit()
         
+        publish_timetable_approval(batch_id, version, session.get('username'))
         batch = Batch.query.get(batch_id)
         flash(f'Timetable for {batch.name} has been successfully approved!', 'success')
         
@@ -1131,6 +2516,303 @@ def approve_timetable(batch_id):
     
     return redirect(url_for('view_timetable', batch_id=batch_id))
 
+def run_conflict_audit(batch_size=5000, pause_gc=False):
+    """Scan every Timetable row once and report conflicts across the whole institution.
+    
+    pause_gc turns off cyclic GC for the scan; it is process-wide, so only the CLI uses it.
+    """
+    auditor = audit.ConflictAuditor(
+        SLOT_PERIODS, TIME_SLOTS,
+        room_capacity=dict(db.session.query(Classroom.id, Classroom.capacity).all()),
+        batch_strength=dict(db.session.query(Batch.id, Batch.strength).all()),
+        faculty_max_hours=dict(db.session.query(Faculty.id, Faculty.max_hours_per_day).all())
+    )
+    
+    rows = db.session.query(
+        Timetable.id, Timetable.batch_id, Timetable.faculty_id, Timetable.classroom_id,
+        Timetable.day_of_week, Timetable.time_slot
+    ).yield_per(batch_size)
+    
+    # The scan only allocates long-lived bookkeeping, so cyclic GC passes are pure overhead
+    gc_was_enabled = gc.isenabled()
+    if pause_gc:
+        gc.disable()
+    try:
+        for row in rows:
+            auditor.add(*row)
+    finally:
+        if pause_gc and gc_was_enabled:
+            gc.enable()
+    
+    report = auditor.report()
+    report['generated_at'] = datetime.utcnow().isoformat()
+    return report
+
+@app.route('/audit_conflicts')
+def audit_conflicts():
+    """Institution-wide conflict report as JSON"""
+    if 'user_id' not in session or session.get('user_role') != 'admin':
+        return jsonify({'error': 'Access denied'}), 403
+    
+    try:
+        return jsonify(run_conflict_audit())
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+def run_utilization_analytics():
+    """Room/faculty utilization report, rebuilt only when some timetable changes"""
+    version = get_cache_version('timetables')
+    
+    def build():
+        entries = db.session.query(
+            Timetable.batch_id, Timetable.faculty_id, Timetable.classroom_id,
+            Timetable.day_of_week, Timetable.time_slot
+        ).all()
+        report = analytics.compute_utilization(
+            entries,
+            db.session.query(Classroom.id, Classroom.name, Classroom.capacity, Classroom.type).all(),
+            db.session.query(Faculty.id, Faculty.name, Faculty.max_hours_per_day).all(),
+            db.session.query(Batch.id, Batch.strength).all(),
+            DAYS, TIME_SLOTS, SLOT_PERIODS,
+            teaching_periods=[slot for slot in TIME_SLOTS if slot != LUNCH_SLOT]
+        )
+        report['generated_at'] = datetime.utcnow().isoformat()
+        return report
+    
+    return analytics_cache.get_or_create(version, build)
+
+@app.route('/analytics')
+def utilization_analytics():
+    """Capacity-planning dashboard: room and faculty utilization across all timetables"""
+    if 'user_id' not in session or session.get('user_role') != 'admin':
+        flash('Access denied. Admin privileges required.', 'error')
+        return redirect(url_for('login'))
+    
+    report = run_utilization_analytics()
+    if request.args.get('format') == 'json':
+        return jsonify(report)
+    
+    return render_template('analytics.html', report=report, days=DAYS, time_slots=TIME_SLOTS,
+                           lunch_slot=LUNCH_SLOT)
+
+EXAM_SESSIONS = ['Morning', 'Afternoon', 'Evening']
+
+def build_exam_problem():
+    """Every subject with the batches sitting its exam (same semester and department), and the exam rooms"""
+    cohorts = {}
+    strength = {}
+    for batch_id, semester, department, batch_strength in db.session.query(
+            Batch.id, Batch.semester, Batch.department, Batch.strength):
+        cohorts.setdefault((semester, department), []).append(batch_id)
+        strength[batch_id] = batch_strength
+    subject_batches = {subject_id: cohorts.get((semester, department), [])
+                       for subject_id, semester, department in db.session.query(
+                           Subject.id, Subject.semester, Subject.department)}
+    
+    # Labs only when there is nothing else
+    rooms = db.session.query(Classroom.id, Classroom.capacity).filter_by(is_available=True)
+    exam_rooms = rooms.filter(Classroom.type != 'lab').all() or rooms.all()
+    return subject_batches, strength, [tuple(room) for room in exam_rooms]
+
+def schedule_exam_timetable(sessions_per_day, max_days=None):
+    """Colour the subject conflict graph into exam slots and replace the stored exam timetable"""
+    subject_batches, strength, rooms = build_exam_problem()
+    result = exams.schedule_exams(subject_batches, strength, rooms,
+                                  max_slots=max_days * sessions_per_day if max_days else None)
+    
+    ExamEntry.query.delete()
+    rows = [{'subject_id': subject_id, 'batch_id': batch_id, 'classroom_id': classroom_id,
+             'slot': result['slots'][subject_id],
+             'exam_day': result['slots'][subject_id] // sessions_per_day + 1,
+             'session': EXAM_SESSIONS[result['slots'][subject_id] % sessions_per_day]}
+            for (subject_id, batch_id), classroom_id in result['rooms'].items()]
+    if rows:
+        db.session.execute(db.insert(ExamEntry), rows)
+    mark_timetables_written()
+    db.session.commit()
+    return result
+
+def load_exam_timetable():
+    """Stored exam sittings, ordered by slot, as {day: {session: [sittings]}}"""
+    rows = db.session.query(
+        ExamEntry.exam_day, ExamEntry.session, Subject.id, Subject.code, Subject.name,
+        Batch.name, Batch.strength, Classroom.name, Classroom.capacity
+    ).join(Subject, Subject.id == ExamEntry.subject_id).join(Batch, Batch.id == ExamEntry.batch_id).join(
+        Classroom, Classroom.id == ExamEntry.classroom_id
+    ).order_by(ExamEntry.slot, Subject.code, Batch.name).all()
+    
+    schedule = {}
+    for exam_day, exam_session, subject_id, code, subject, batch, batch_strength, room, capacity in rows:
+        schedule.setdefault(exam_day, {}).setdefault(exam_session, []).append({
+            'subject_id': subject_id, 'subject_code': code, 'subject': subject, 'batch': batch,
+            'strength': batch_strength, 'classroom': room, 'capacity': capacity
+        })
+    return schedule
+
+@app.route('/exam_timetable', methods=['GET', 'POST'])
+def exam_timetable():
+    """Exam timetable: no batch sits two exams at once, and every sitting gets a room that seats it"""
+    if 'user_id' not in session or session.get('user_role') != 'admin':
+        flash('Access denied. Admin privileges required.', 'error')
+        return redirect(url_for('login'))
+    
+    if request.method == 'POST':
+        sessions_per_day = min(max(request.form.get('sessions_per_day', 2, type=int), 1), len(EXAM_SESSIONS))
+        max_days = request.form.get('max_days', type=int)
+        if max_days is not None and max_days < 1:
+            max_days = None
+    
+        try:
+            result = schedule_exam_timetable(sessions_per_day, max_days)
+        except Exception as e:
+            db.session.rollback()
+            flash(f'Error scheduling exams: {str(e)}', 'error')
+            return redirect(url_for('exam_timetable'))
+    
+        days_used = -(-result['slot_count'] // sessions_per_day)
+        flash(f"Scheduled {len(result['slots'])} exams in {result['slot_count']} sessions over "
+              f"{days_used} day{'' if days_used == 1 else 's'} ({result['elapsed_ms']} ms).", 'success')
+        unscheduled = list(result['unscheduled'].items())
+        if unscheduled:
+            names = dict(db.session.query(Subject.id, Subject.name).filter(Subject.id.in_(result['unscheduled'])))
+            for subject_id, reason in unscheduled[:10]:
+                flash(f'{names.get(subject_id, subject_id)} was not scheduled: {reason}.', 'warning')
+            if len(unscheduled) > 10:
+                flash(f'{len(unscheduled) - 10} more subjects were not scheduled.', 'warning')
+        return redirect(url_for('exam_timetable'))
+    
+    schedule = load_exam_timetable()
+    if request.args.get('format') == 'json':
+        return jsonify({'days': [{'day': day, 'sessions': sessions} for day, sessions in sorted(schedule.items())]})
+    
+    return render_template('exam_timetable.html', schedule=schedule, sessions=EXAM_SESSIONS,
+                           subject_count=Subject.query.count())
+
+@app.cli.command('audit-conflicts')
+@click.option('--output', '-o', type=click.Path(dir_okay=False), help='Write the JSON report to this file.')
+@click.option('--batch-size', default=5000, show_default=True, help='Rows fetched per round trip.')
+def audit_conflicts_command(output, batch_size):
+    """Scan all timetables for double bookings, overlaps, capacity and load issues."""
+    # A one-off process, so pausing GC cannot stall other requests' threads
+    report = run_conflict_audit(batch_size=batch_size, pause_gc=True)
+    payload = json.dumps(report, indent=2)
+    if output:
+        with open(output, 'w') as f:
+            f.write(payload)
+        click.echo(f"Scanned {report['rows_scanned']} rows in {report['elapsed_ms']} ms, "
+                   f"{report['issue_count']} issues -> {output}")
+    else:
+        click.echo(payload)
+    # Non-zero exit status lets cron jobs and CI flag conflicting timetables
+    if report['issue_count']:
+        sys.exit(1)
+
+@app.cli.command('rebuild-faculty-load')
+def rebuild_faculty_load_command():
+    """Recount the per-day faculty load counters from the timetable."""
+    count = rebuild_faculty_day_loads()
+    db.session.commit()
+    click.echo(f"Rebuilt load counters for {count} faculty-days")
+
+def provision_students(roster, chunk_size=500, workers=None):
+    """Create student accounts from roster rows, hashing passwords in a process pool.
+    
+    roster yields (line_number, username, batch_name, password or None) as
+    read by provisioning.read_roster(). Batches are matched by name. Users
+    are inserted chunk_size at a time, one transaction per chunk, while the
+    pool hashes the following chunks. Returns the report rows, one per
+    roster line.
+    """
+    batch_ids = {}
+    for batch_id, name in db.session.query(Batch.id, Batch.name):
+        # A name shared by several batches cannot be resolved
+        batch_ids[name] = None if name in batch_ids else batch_id
+    taken = {username for (username,) in db.session.query(User.username)}
+    
+    report = []
+    accepted = []
+    for line_number, username, batch_name, password in roster:
+        row = {'username': username, 'batch': batch_name, 'password': '', 'status': ''}
+        report.append(row)
+        if not username:
+            row['status'] = f'skipped: no username on line {line_number}'
+        elif username in taken:
+            row['status'] = 'skipped: username already exists'
+        elif batch_name not in batch_ids:
+            row['status'] = 'skipped: unknown batch'
+        elif batch_ids[batch_name] is None:
+            row['status'] = 'skipped: batch name is ambiguous'
+        else:
+            taken.add(username)
+            row['password'] = password or provisioning.generate_password()
+            accepted.append((row, batch_ids[batch_name]))
+    
+    workers = workers or os.cpu_count() or 1
+    executor = None
+    if workers > 1 and len(accepted) > 1:
+        # spawn, like the solver pool: the children only hash and must not inherit DB connections
+        executor = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'))
+    try:
+        hashes = provisioning.hash_passwords([row['password'] for row, _ in accepted], executor)
+        for start in range(0, len(accepted), chunk_size):
+            chunk = [(row, batch_id, next(hashes)) for row, batch_id in accepted[start:start + chunk_size]]
+            insert_student_chunk(chunk)
+    finally:
+        if executor is not None:
+            executor.shutdown(cancel_futures=True)
+    return report
+
+def insert_student_chunk(chunk):
+    """Insert (report row, batch_id, password hash) students in one transaction"""
+    try:
+        db.session.execute(db.insert(User), [
+            {'username': row['username'], 'password_hash': password_hash, 'role': 'student', 'batch_id': batch_id}
+            for row, batch_id, password_hash in chunk
+        ])
+        db.session.commit()
+    except IntegrityError:
+        # Someone took a username meanwhile - retry row by row to find out which
+        db.session.rollback()
+        for row, batch_id, password_hash in chunk:
+            try:
+                with db.session.begin_nested():
+                    db.session.add(User(username=row['username'], password_hash=password_hash,
+                                        role='student', batch_id=batch_id))
+            except IntegrityError:
+                row['status'] = 'skipped: username already exists'
+                row['password'] = ''
+                continue
+            row['status'] = 'created'
+        db.session.commit()
+        return
+    for row, _, _ in chunk:
+        row['status'] = 'created'
+
+@app.cli.command('provision-students')
+@click.argument('roster', type=click.File('r', encoding='utf-8-sig'))
+@click.option('--report', '-o', 'report_path', type=click.Path(dir_okay=False), required=True,
+              help='CSV file for the credentials report (created readable by the owner only).')
+@click.option('--chunk-size', default=500, show_default=True, help='Students inserted per transaction.')
+@click.option('--workers', default=os.cpu_count() or 1, show_default=True, help='Password hashing processes.')
+def provision_students_command(roster, report_path, chunk_size, workers):
+    """Create student accounts from a CSV with username, batch and optional password columns."""
+    started = datetime.utcnow()
+    try:
+        report = provision_students(provisioning.read_roster(roster), chunk_size=chunk_size, workers=workers)
+    except ValueError as e:
+        raise click.ClickException(str(e))
+    
+    # The report holds plain-text passwords
+    fd = os.open(report_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, 'w', newline='') as f:
+        provisioning.write_report(report, f)
+    
+    created = sum(1 for row in report if row['status'] == 'created')
+    elapsed = (datetime.utcnow() - started).total_seconds()
+    click.echo(f"Created {created} of {len(report)} students in {elapsed:.1f}s -> {report_path}")
+    if created < len(report):
+        click.echo(f"{len(report) - created} rows skipped; see the status column of the report")
+
 def init_db():
     """Initialize database with proper error handling"""
     try:
@@ -1141,6 +2823,8 @@ def init_db():
         
         # Only create tables, don't drop existing ones
         db.create_all()
+        ensure_indexes()
+        ensure_cache_versions()
         print("Database tables initialized")
         
         # Ensure default users exist
@@ -1300,12 +2984,16 @@ def backup_data():
                 'type': subject.type
             })
         
+        availability = {row.faculty_id: row for row in FacultyAvailability.query.all()}
         for faculty in Faculty.query.all():
+            window = availability.get(faculty.id)
             backup_data['faculty'].append({
                 'name': faculty.name,
                 'email': faculty.email,
                 'department': faculty.department,
-                'max_hours_per_day': faculty.max_hours_per_day
+                'max_hours_per_day': faculty.max_hours_per_day,
+                'available': window.available if window else WEEK_PERIOD_MASK,
+                'preferred': window.preferred if window else 0
             })
         
         for classroom in Classroom.query.all():
@@ -1350,8 +3038,15 @@ def setup_database():
             
             # Create tables
             db.create_all()
+            ensure_indexes()
+            ensure_cache_versions()
             print("Database tables created")
             
+            # Faculty load counters start empty on databases that predate them
+            if not db.session.query(FacultyDayLoad.faculty_id).first() and db.session.query(Timetable.id).first():
+                print(f"Faculty load counters rebuilt ({rebuild_faculty_day_loads()} faculty-days)")
+                db.session.commit()
+            
             # Ensure default users exist
             ensure_default_users()
             print("Default users ensured")
@@ -0,0 +1,168 @@
+"""
+Static asset pipeline for the timetable scheduler.
+
+Builds an in-memory manifest of every file under ``static/`` with a
+content-hashed public name, rewrites relative ``url(...)`` references inside
+CSS to the hashed names, and keeps gzip/brotli variants of text assets so
+they can be served with ``Cache-Control: immutable``.
+"""
+import gzip
+import hashlib
+import mimetypes
+import os
+import posixpath
+import re
+
+try:
+    import brotli
+except ImportError:  # Brotli is optional, gzip is always available
+    brotli = None
+
+# Assets are served for a year - a new hash means a new URL
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+# Formats that are already compressed gain nothing from gzip/brotli
+COMPRESSIBLE_EXTENSIONS = {'.css', '.js', '.svg', '.ttf', '.json', '.txt', '.html'}
+
+CSS_URL_PATTERN = re.compile(r'url\(\s*([\'"]?)([^\'")]+)\1\s*\)')
+
+HASH_LENGTH = 10
+
+
+class Asset:
+    """One fingerprinted static file with its precompressed variants"""
+
+    __slots__ = ('path', 'hashed_path', 'mimetype', 'etag', 'body', 'gzip', 'br')
+
+    def __init__(self, path, hashed_path, mimetype, etag, body):
+        self.path = path
+        self.hashed_path = hashed_path
+        self.mimetype = mimetype
+        self.etag = etag
+        self.body = body
+        self.gzip = None
+        self.br = None
+
+    def variant(self, accept_encoding):
+        """Pick the smallest encoding the client accepts: (body, content_encoding)"""
+        accepted = accepted_encodings(accept_encoding)
+        if self.br is not None and 'br' in accepted:
+            return self.br, 'br'
+        if self.gzip is not None and 'gzip' in accepted:
+            return self.gzip, 'gzip'
+        return self.body, None
+
+
+def accepted_encodings(header):
+    """Parse an Accept-Encoding header into the set of codings with q > 0"""
+    accepted = set()
+    for part in (header or '').lower().split(','):
+        coding, _, params = part.strip().partition(';')
+        if not coding:
+            continue
+        quality = params.strip()
+        if quality.startswith('q='):
+            try:
+                if float(quality[2:]) <= 0:
+                    continue
+            except ValueError:
+                continue
+        accepted.add(coding.strip())
+    return accepted
+
+
+def _hashed_name(path, body):
+    digest = hashlib.sha256(body).hexdigest()[:HASH_LENGTH]
+    root, ext = posixpath.splitext(path)
+    return f"{root}.{digest}{ext}", digest
+
+
+def _rewrite_css_urls(path, body, hashed_paths):
+    """Point relative url(...) references at the hashed file names"""
+    css_dir = posixpath.dirname(path)
+    text = body.decode('utf-8')
+
+    def replace(match):
+        quote, target = match.group(1), match.group(2)
+        if target.startswith(('data:', 'http:', 'https:', '/', '#')):
+            return match.group(0)
+        clean_target, _, suffix = target.partition('?')
+        resolved = posixpath.normpath(posixpath.join(css_dir, clean_target))
+        hashed = hashed_paths.get(resolved)
+        if not hashed:
+            return match.group(0)
+        relative = posixpath.relpath(hashed, css_dir or '.')
+        if suffix:
+            relative = f"{relative}?{suffix}"
+        return f"url({quote}{relative}{quote})"
+
+    return CSS_URL_PATTERN.sub(replace, text).encode('utf-8')
+
+
+def _compress(asset, min_size):
+    ext = posixpath.splitext(asset.path)[1].lower()
+    if ext not in COMPRESSIBLE_EXTENSIONS or len(asset.body) < min_size:
+        return
+    gzipped = gzip.compress(asset.body, compresslevel=9, mtime=0)
+    if len(gzipped) < len(asset.body):
+        asset.gzip = gzipped
+    if brotli is not None:
+        compressed = brotli.compress(asset.body, quality=11)
+        if len(compressed) < len(asset.body):
+            asset.br = compressed
+
+
+def static_signature(static_folder):
+    """(path, mtime, size) of every file under static_folder - changes whenever a file does"""
+    signature = []
+    for root, _, files in os.walk(static_folder):
+        for filename in files:
+            stat = os.stat(os.path.join(root, filename))
+            signature.append((os.path.join(root, filename), stat.st_mtime_ns, stat.st_size))
+    return sorted(signature)
+
+
+def build_manifest(static_folder, min_size=512, compress=True):
+    """Fingerprint and precompress every file under static_folder.
+
+    Returns (by_source, by_hashed): lookups keyed by the original relative
+    path and by the public hashed path. compress=False skips the gzip/brotli
+    variants (brotli at quality 11 takes seconds over the vendored fonts).
+    """
+    sources = {}
+    for root, _, files in os.walk(static_folder):
+        for filename in files:
+            full_path = os.path.join(root, filename)
+            rel_path = os.path.relpath(full_path, static_folder).replace(os.sep, '/')
+            with open(full_path, 'rb') as f:
+                sources[rel_path] = f.read()
+
+    by_source = {}
+    hashed_paths = {}
+
+    # Non-CSS files first so stylesheets can reference their hashed names
+    ordered = sorted(sources, key=lambda p: (p.endswith('.css'), p))
+    for rel_path in ordered:
+        body = sources[rel_path]
+        if rel_path.endswith('.css'):
+            body = _rewrite_css_urls(rel_path, body, hashed_paths)
+        hashed_path, digest = _hashed_name(rel_path, body)
+        mimetype = mimetypes.guess_type(rel_path)[0] or 'application/octet-stream'
+        asset = Asset(rel_path, hashed_path, mimetype, digest, body)
+        if compress:
+            _compress(asset, min_size)
+        by_source[rel_path] = asset
+        hashed_paths[rel_path] = hashed_path
+
+    by_hashed = {asset.hashed_path: asset for asset in by_source.values()}
+    return by_source, by_hashed
+
+
+def compress_body(body, accept_encoding, level=6):
+    """Compress a dynamic response body: (compressed, content_encoding) or (None, None)"""
+    accepted = accepted_encodings(accept_encoding)
+    if brotli is not None and 'br' in accepted:
+        return brotli.compress(body, quality=4), 'br'
+    if 'gzip' in accepted:
+        return gzip.compress(body, compresslevel=level), 'gzip'
+    return None, None
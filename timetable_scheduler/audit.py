@@ -0,0 +1,152 @@
+"""
+Institution-wide timetable conflict audit.
+
+Timetable rows are fed through ConflictAuditor.add() one at a time, so the
+caller can stream them straight from the database. Each (resource, day)
+keeps a bitmask of occupied one-hour periods, which makes a 2-hour lab and
+a 1-hour class that share a period collide even though their slot strings
+differ (e.g. 09:15-11:15 vs 10:15-11:15).
+"""
+import time
+
+
+class ConflictAuditor:
+    """Single-pass detector for double bookings, overlaps, capacity and load issues"""
+
+    # Issue reported when two bookings of the same resource overlap, by resource kind
+    ISSUE_TYPES = ('faculty_double_booking', 'room_double_booking', 'batch_overlap')
+
+    def __init__(self, slot_periods, periods, room_capacity=None, batch_strength=None,
+                 faculty_max_hours=None):
+        self.periods = list(periods)
+        period_index = {period: i for i, period in enumerate(self.periods)}
+        # slot -> (period bitmask, period indexes, hours)
+        self.slots = {}
+        for slot, covered in slot_periods.items():
+            indexes = tuple(period_index[period] for period in covered)
+            mask = 0
+            for index in indexes:
+                mask |= 1 << index
+            self.slots[slot] = (mask, indexes, len(indexes))
+
+        self.room_capacity = room_capacity or {}
+        self.batch_strength = batch_strength or {}
+        self.faculty_max_hours = faculty_max_hours or {}
+
+        # (resource kind, resource_id, day) -> [occupied mask, {period index: (entry_id, slot)}]
+        self.occupancy = {}
+        # (issue type, resource_id, day, period) -> {entry_id: slot}
+        self.clashes = {}
+        # (faculty_id, day) -> hours booked
+        self.faculty_hours = {}
+        # (classroom_id, batch_id) -> [entry ids]
+        self.capacity_shortfalls = {}
+        self.unknown_slots = []
+        self.rows_scanned = 0
+        self.started = time.perf_counter()
+
+    def add(self, entry_id, batch_id, faculty_id, classroom_id, day, time_slot):
+        """Account for one timetable row"""
+        self.rows_scanned += 1
+        slot = self.slots.get(time_slot)
+        if slot is None:
+            self.unknown_slots.append({'entry_id': entry_id, 'time_slot': time_slot})
+            return
+        mask, indexes, hours = slot
+        owner = (entry_id, time_slot)
+        occupancy = self.occupancy
+
+        for kind, resource_id in ((0, faculty_id), (1, classroom_id), (2, batch_id)):
+            key = (kind, resource_id, day)
+            record = occupancy.get(key)
+            if record is None:
+                occupancy[key] = [mask, {index: owner for index in indexes}]
+                continue
+            owners = record[1]
+            if record[0] & mask:
+                self._record_clash(self.ISSUE_TYPES[kind], resource_id, day, indexes, owners, owner)
+            else:
+                for index in indexes:
+                    owners[index] = owner
+            record[0] |= mask
+
+        hours_key = (faculty_id, day)
+        self.faculty_hours[hours_key] = self.faculty_hours.get(hours_key, 0) + hours
+
+        capacity = self.room_capacity.get(classroom_id)
+        if capacity is not None:
+            strength = self.batch_strength.get(batch_id)
+            if strength is not None and capacity < strength:
+                self.capacity_shortfalls.setdefault((classroom_id, batch_id), []).append(entry_id)
+
+    def _record_clash(self, issue_type, resource_id, day, indexes, owners, owner):
+        for index in indexes:
+            first = owners.get(index)
+            if first is None:
+                owners[index] = owner
+                continue
+            clash = self.clashes.setdefault((issue_type, resource_id, day, self.periods[index]), {})
+            clash[first[0]] = first[1]
+            clash[owner[0]] = owner[1]
+
+    def report(self):
+        """Machine-readable summary of everything found so far"""
+        issues = []
+        for (issue_type, resource_id, day, period), entries in sorted(self.clashes.items(), key=_clash_sort_key):
+            issues.append({
+                'type': issue_type,
+                'resource_id': resource_id,
+                'day': day,
+                'period': period,
+                'entry_ids': sorted(entries),
+                'time_slots': sorted(set(entries.values())),
+                # A 2-hour lab colliding with a 1-hour class (or another lab offset by an hour)
+                'partial_overlap': len(set(entries.values())) > 1
+            })
+
+        for (faculty_id, day), hours in sorted(self.faculty_hours.items(), key=_none_last):
+            limit = self.faculty_max_hours.get(faculty_id)
+            # A limit of 0 (or less) means unlimited, as in the editor and the solver
+            if limit is not None and 0 < limit < hours:
+                issues.append({
+                    'type': 'faculty_overload',
+                    'resource_id': faculty_id,
+                    'day': day,
+                    'hours': hours,
+                    'max_hours_per_day': limit
+                })
+
+        for (classroom_id, batch_id), entry_ids in sorted(self.capacity_shortfalls.items()):
+            issues.append({
+                'type': 'room_capacity_shortfall',
+                'resource_id': classroom_id,
+                'batch_id': batch_id,
+                'capacity': self.room_capacity[classroom_id],
+                'strength': self.batch_strength[batch_id],
+                'entry_ids': entry_ids
+            })
+
+        for unknown in self.unknown_slots:
+            issues.append(dict(unknown, type='unknown_time_slot'))
+
+        summary = {}
+        for issue in issues:
+            summary[issue['type']] = summary.get(issue['type'], 0) + 1
+
+        return {
+            'rows_scanned': self.rows_scanned,
+            'elapsed_ms': round((time.perf_counter() - self.started) * 1000, 1),
+            'issue_count': len(issues),
+            'summary': summary,
+            'issues': issues
+        }
+
+
+def _clash_sort_key(item):
+    (issue_type, resource_id, day, period), _ = item
+    return issue_type, resource_id is None, resource_id or 0, str(day), period
+
+
+def _none_last(item):
+    (resource_id, day), _ = item
+    return resource_id is None, resource_id or 0, str(day)
@@ -0,0 +1,88 @@
+"""
+In-process caches shared by the timetable views.
+
+Entries are keyed by values that change whenever the underlying data
+changes (e.g. a batch's timetable version), so stale entries are never
+served - they simply stop being looked up and age out of the LRU.
+"""
+import threading
+from collections import OrderedDict
+
+
+class LRUCache:
+    """Thread-safe least-recently-used cache with a bounded number of entries.
+
+    With max_bytes set, sizeof(value) is also charged against a byte budget
+    and the oldest entries are evicted until the cache fits both limits; a
+    value larger than the whole budget is not stored at all.
+    """
+
+    def __init__(self, max_entries=256, max_bytes=None, sizeof=None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.sizeof = sizeof or len
+        self.size = 0
+        self._data = OrderedDict()
+        self._sizes = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, default=None):
+        with self._lock:
+            try:
+                value = self._data[key]
+            except KeyError:
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value):
+        size = self.sizeof(value) if self.max_bytes is not None else 0
+        with self._lock:
+            self._remove(key)
+            if self.max_bytes is not None and size > self.max_bytes:
+                return
+            self._data[key] = value
+            self._sizes[key] = size
+            self.size += size
+            while len(self._data) > self.max_entries or (self.max_bytes is not None and self.size > self.max_bytes):
+                self._remove(next(iter(self._data)))
+
+    def _remove(self, key):
+        if key in self._data:
+            del self._data[key]
+            self.size -= self._sizes.pop(key)
+
+    def get_or_create(self, key, factory):
+        """Return the cached value for key, building it with factory() on a miss"""
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            value = factory()
+            self.set(key, value)
+        return value
+
+    def discard(self, predicate):
+        """Drop every entry whose key matches predicate(key)"""
+        with self._lock:
+            for key in [k for k in self._data if predicate(k)]:
+                self._remove(key)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._sizes.clear()
+            self.size = 0
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self):
+        return {'entries': len(self._data), 'max_entries': self.max_entries,
+                'bytes': self.size, 'max_bytes': self.max_bytes,
+                'hits': self.hits, 'misses': self.misses}
+
+
+_MISSING = object()
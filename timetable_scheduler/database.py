@@ -0,0 +1,77 @@
+"""
+Engine profiles and read/write routing for the Flask-SQLAlchemy session.
+
+RoutingSession sends plain SELECTs made while serving a GET or HEAD request
+to the 'reader' bind when one is configured, and those of any request when
+the reader is a pool on the primary's own SQLite file (it cannot lag behind).
+Everything else goes to the primary engine: flushes, bulk UPDATE/DELETE,
+locking reads and raw SQL. Once a session has written, its later reads stay
+on the primary too, so a request always sees its own changes.
+"""
+from flask import current_app, has_request_context, request
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event
+from sqlalchemy.sql import Select
+
+READER_BIND = 'reader'
+READ_METHODS = frozenset({'GET', 'HEAD'})
+
+# session.info flag: this session must not use the reader any more
+PRIMARY_ONLY = 'primary_only'
+
+# app.config flag: the reader opens the primary's own database, so reads of any request may use it
+READER_SHARES_PRIMARY = 'DATABASE_READER_SHARES_PRIMARY'
+
+
+class RoutingSession(Session):
+    """Session that routes read-only work to the reader bind"""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and READER_BIND in self._db.engines:
+            if self._is_plain_read(clause) and self._reader_allowed():
+                return self._db.engines[READER_BIND]
+            self.info[PRIMARY_ONLY] = True
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+    def _is_plain_read(self, clause):
+        return (not self._flushing and isinstance(clause, Select)
+                and clause._for_update_arg is None)
+
+    def _reader_allowed(self):
+        return (not self.info.get(PRIMARY_ONLY) and has_request_context()
+                and (request.method in READ_METHODS or current_app.config.get(READER_SHARES_PRIMARY)))
+
+
+def use_primary(session):
+    """Keep the rest of this session's work on the primary engine"""
+    session.info[PRIMARY_ONLY] = True
+
+
+def configure_sqlite(engine, pragmas, writer=False):
+    """Apply pragmas to every new connection of a SQLite engine.
+
+    A writer switches the journal to WAL and opens its transactions with
+    BEGIN IMMEDIATE, so it waits on busy_timeout instead of failing with
+    "database is locked" when it upgrades a read. With READER_SHARES_PRIMARY
+    set, plain reads never check out the writer, so its transaction (and the
+    write lock) begins with the session's first write and ends at commit.
+    Other engines are made read-only with query_only.
+    """
+    @event.listens_for(engine, 'connect')
+    def apply_pragmas(dbapi_connection, connection_record):
+        if writer:
+            # Let SQLAlchemy's begin event below issue BEGIN, not the driver
+            dbapi_connection.isolation_level = None
+        cursor = dbapi_connection.cursor()
+        if writer:
+            cursor.execute('PRAGMA journal_mode=WAL')
+        for name, value in pragmas.items():
+            cursor.execute(f'PRAGMA {name}={value}')
+        if not writer:
+            cursor.execute('PRAGMA query_only=ON')
+        cursor.close()
+
+    if writer:
+        @event.listens_for(engine, 'begin')
+        def begin_immediate(connection):
+            connection.exec_driver_sql('BEGIN IMMEDIATE')
@@ -0,0 +1,203 @@
+"""
+Exam timetabling by graph colouring.
+
+Subjects are vertices, and two subjects conflict when some batch sits both
+exams, so they need different slots. schedule_exams() colours the graph
+with DSATUR: it repeatedly places the subject whose neighbours already use
+the most distinct slots (ties: most neighbours, then most seats) into the
+lowest slot that none of its neighbours use and that still has rooms for
+its batches. Given a slot limit, a repair pass then moves subjects out of
+the slots past the limit, evicting one blocking subject into another slot
+when that makes room.
+
+Every sitting (subject, batch) needs one room that seats the whole batch,
+and a room holds one sitting per slot. Within a slot, each sitting takes
+the smallest free room that fits it, keeping the large rooms for the large
+batches.
+"""
+import bisect
+import heapq
+import time
+
+
+def conflict_graph(subject_batches):
+    """subject -> set of subjects that share a batch with it"""
+    by_batch = {}
+    for subject, batches in subject_batches.items():
+        for batch in batches:
+            by_batch.setdefault(batch, []).append(subject)
+    graph = {subject: set() for subject in subject_batches}
+    for subjects in by_batch.values():
+        for subject in subjects:
+            graph[subject].update(subjects)
+    for subject, neighbours in graph.items():
+        neighbours.discard(subject)
+    return graph
+
+
+class _Slot:
+    """Free rooms of one exam slot as parallel sorted (capacity, room_id) lists"""
+
+    def __init__(self, rooms):
+        self.capacities = [capacity for capacity, _ in rooms]
+        self.room_ids = [room_id for _, room_id in rooms]
+        self.subjects = set()
+
+    def fit(self, strengths):
+        """Indexes of the rooms best-fit sittings would take (largest first), or None"""
+        taken = []
+        for strength in strengths:
+            index = bisect.bisect_left(self.capacities, strength)
+            while index < len(self.capacities) and index in taken:
+                index += 1
+            if index == len(self.capacities):
+                return None
+            taken.append(index)
+        return taken
+
+    def take(self, indexes):
+        """Remove rooms by index; returns their (capacity, room_id) pairs"""
+        rooms = [(self.capacities[index], self.room_ids[index]) for index in indexes]
+        for index in sorted(indexes, reverse=True):
+            del self.capacities[index]
+            del self.room_ids[index]
+        return rooms
+
+    def give_back(self, rooms):
+        for capacity, room_id in rooms:
+            index = bisect.bisect_left(self.capacities, capacity)
+            self.capacities.insert(index, capacity)
+            self.room_ids.insert(index, room_id)
+
+
+def schedule_exams(subject_batches, batch_strength, rooms, max_slots=None, repair_rounds=3, time_budget=2.0):
+    """Assign every subject an exam slot and every sitting a room.
+
+    subject_batches: subject -> batches sitting its exam
+    batch_strength: batch -> students
+    rooms: (room_id, capacity) pairs usable for exams
+    max_slots: slot limit (None to use as many as needed)
+    time_budget: seconds the repair pass may spend before giving up
+
+    Returns {'slot_count', 'slots': {subject: slot}, 'rooms': {(subject, batch):
+    room_id}, 'unscheduled': {subject: reason}, 'elapsed_ms'}.
+    """
+    started = time.perf_counter()
+    graph = conflict_graph(subject_batches)
+    all_rooms = sorted((capacity, room_id) for room_id, capacity in rooms)
+    capacity_of = {room_id: capacity for capacity, room_id in all_rooms}
+    largest = all_rooms[-1][0] if all_rooms else 0
+    empty = _Slot(all_rooms)
+
+    sittings = {}
+    unscheduled = {}
+    for subject, batches in subject_batches.items():
+        # Largest batch first, so it gets first pick of the rooms
+        sittings[subject] = sorted(((batch_strength.get(batch, 0), batch) for batch in batches), reverse=True)
+        if not batches:
+            unscheduled[subject] = 'no batch takes this subject'
+        elif sittings[subject][0][0] > largest:
+            unscheduled[subject] = f'no room seats {sittings[subject][0][0]} students'
+        elif empty.fit([strength for strength, _ in sittings[subject]]) is None:
+            # Would not fit even into a slot of its own
+            unscheduled[subject] = f'not enough large rooms for its {len(batches)} batches at once'
+
+    slots = []
+    assigned = {}
+    room_of = {}
+
+    def place(subject, index):
+        """Put subject in slot index if its neighbours and the free rooms allow; True on success"""
+        while index >= len(slots):
+            slots.append(_Slot(all_rooms))
+        slot = slots[index]
+        if not graph[subject].isdisjoint(slot.subjects):
+            return False
+        indexes = slot.fit([strength for strength, _ in sittings[subject]])
+        if indexes is None:
+            return False
+        for (_, batch), (_, room_id) in zip(sittings[subject], slot.take(indexes)):
+            room_of[(subject, batch)] = room_id
+        slot.subjects.add(subject)
+        assigned[subject] = index
+        return True
+
+    def unplace(subject):
+        slot = slots[assigned.pop(subject)]
+        slot.subjects.discard(subject)
+        room_ids = [room_of.pop((subject, batch)) for _, batch in sittings[subject]]
+        slot.give_back([(capacity_of[room_id], room_id) for room_id in room_ids])
+
+    # DSATUR with a lazy heap: stale entries are skipped when popped
+    saturation = {subject: set() for subject in graph}
+    seats = {subject: sum(strength for strength, _ in sittings[subject]) for subject in graph}
+    heap = [(0, -len(graph[subject]), -seats[subject], subject) for subject in graph if subject not in unscheduled]
+    heapq.heapify(heap)
+    while heap:
+        negative_saturation, _, _, subject = heapq.heappop(heap)
+        if subject in assigned or -negative_saturation != len(saturation[subject]):
+            continue
+        index = 0
+        while index in saturation[subject] or not place(subject, index):
+            index += 1
+        for neighbour in graph[subject]:
+            if neighbour not in assigned and neighbour not in unscheduled and index not in saturation[neighbour]:
+                saturation[neighbour].add(index)
+                heapq.heappush(heap, (-len(saturation[neighbour]), -len(graph[neighbour]),
+                                      -seats[neighbour], neighbour))
+
+    if max_slots is not None:
+        _repair(max_slots, repair_rounds, started + time_budget, assigned, slots, graph, seats, place, unplace)
+        for subject in [subject for subject, index in assigned.items() if index >= max_slots]:
+            unplace(subject)
+            unscheduled[subject] = f'does not fit into {max_slots} slots'
+
+    used = max(assigned.values()) + 1 if assigned else 0
+    return {
+        'slot_count': used,
+        'slots': assigned,
+        'rooms': room_of,
+        'unscheduled': unscheduled,
+        'elapsed_ms': round((time.perf_counter() - started) * 1000, 1)
+    }
+
+
+def _repair(max_slots, rounds, deadline, assigned, slots, graph, seats, place, unplace):
+    """Move subjects from slots past max_slots into allowed ones, evicting one subject where needed"""
+    for _ in range(rounds):
+        overflow = sorted((subject for subject, index in assigned.items() if index >= max_slots),
+                          key=lambda subject: (-len(graph[subject]), -seats[subject]))
+        if not overflow:
+            return
+        moved = False
+        for subject in overflow:
+            if time.perf_counter() > deadline:
+                return
+            origin = assigned[subject]
+            unplace(subject)
+            if any(place(subject, index) for index in range(max_slots)):
+                moved = True
+                continue
+            if _place_with_eviction(subject, max_slots, assigned, slots, graph, seats, place, unplace):
+                moved = True
+                continue
+            place(subject, origin)
+        if not moved:
+            return
+
+
+def _place_with_eviction(subject, max_slots, assigned, slots, graph, seats, place, unplace, tries=3):
+    for index in range(max_slots):
+        blockers = graph[subject] & slots[index].subjects
+        if len(blockers) > 1:
+            continue
+        # A single conflicting subject must go; otherwise free rooms by moving the largest exams
+        candidates = list(blockers) or sorted(slots[index].subjects, key=lambda other: -seats[other])[:tries]
+        for other in candidates:
+            unplace(other)
+            if place(subject, index):
+                if any(place(other, target) for target in range(max_slots) if target != index):
+                    return True
+                unplace(subject)
+            place(other, index)
+    return False
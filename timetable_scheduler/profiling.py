@@ -0,0 +1,171 @@
+"""
+Opt-in profiling of live workers.
+
+RequestProfiler runs cProfile around the next N requests to one endpoint
+and merges them into a single pstats table. StackSampler snapshots the
+stacks of the threads serving requests at a fixed interval for a time
+window and folds them into collapsed stacks ("frame;frame;frame count"
+lines, the input of flamegraph.pl and speedscope). Results are kept per
+process, in memory.
+"""
+import cProfile
+import io
+import marshal
+import os
+import pstats
+import sys
+import threading
+import time
+
+
+class RequestProfiler:
+    """cProfile around the next requests to one endpoint, merged into one table"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._active = False
+        self._stats = None
+        self.endpoint = None
+        self.remaining = 0
+        self.captured = 0
+
+    def arm(self, endpoint, count):
+        """Profile the next count requests to endpoint, discarding earlier results"""
+        with self._lock:
+            self.endpoint = endpoint
+            self.remaining = count
+            self.captured = 0
+            self._stats = None
+
+    def reset(self):
+        self.arm(None, 0)
+
+    def start(self, endpoint):
+        """A running cProfile.Profile if this request is to be profiled, otherwise None"""
+        if not self.remaining or endpoint != self.endpoint:
+            return None
+        with self._lock:
+            # One request at a time - a profiler only sees its own thread, and newer
+            # Pythons allow just one active profiler per interpreter
+            if self._active or not self.remaining or endpoint != self.endpoint:
+                return None
+            self._active = True
+            self.remaining -= 1
+        profile = cProfile.Profile()
+        profile.enable()
+        return profile
+
+    def finish(self, profile):
+        profile.disable()
+        with self._lock:
+            self._active = False
+            self.captured += 1
+            if self._stats is None:
+                self._stats = pstats.Stats(profile)
+            else:
+                self._stats.add(profile)
+
+    def dump(self):
+        """The merged table in pstats file format (for pstats, snakeviz...), or None"""
+        with self._lock:
+            return None if self._stats is None else marshal.dumps(self._stats.stats)
+
+    def report(self, sort='cumulative', limit=60):
+        """The merged table as text, or None"""
+        with self._lock:
+            if self._stats is None:
+                return None
+            stream = io.StringIO()
+            self._stats.stream = stream
+            self._stats.sort_stats(sort).print_stats(limit)
+            return stream.getvalue()
+
+    def status(self):
+        return {'endpoint': self.endpoint, 'remaining': self.remaining, 'captured': self.captured}
+
+
+def _frame_label(code):
+    filename = code.co_filename
+    if 'site-packages' + os.sep in filename:
+        filename = filename.split('site-packages' + os.sep, 1)[1]
+    else:
+        filename = os.path.basename(filename)
+    return f'{code.co_name} ({filename}:{code.co_firstlineno})'
+
+
+def fold_stack(frame):
+    """'outer;...;inner' for a frame and its callers"""
+    labels = []
+    while frame is not None:
+        labels.append(_frame_label(frame.f_code))
+        frame = frame.f_back
+    return ';'.join(reversed(labels))
+
+
+class StackSampler:
+    """Periodic stack samples of request threads (or all threads), as collapsed stacks"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._thread = None
+        self._stop = threading.Event()
+        self.request_threads = set()
+        self.counts = {}
+        self.samples = 0
+        self.started_at = None
+        self.duration = 0
+        self.interval = 0
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def request_started(self):
+        self.request_threads.add(threading.get_ident())
+
+    def request_finished(self):
+        self.request_threads.discard(threading.get_ident())
+
+    def start(self, duration, interval, all_threads=False):
+        """Sample for duration seconds every interval seconds; False if already sampling"""
+        with self._lock:
+            if self.running:
+                return False
+            self.counts = {}
+            self.samples = 0
+            self.started_at = time.time()
+            self.duration = duration
+            self.interval = interval
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, args=(duration, interval, all_threads),
+                                            name='stack-sampler', daemon=True)
+            self._thread.start()
+            return True
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self, duration, interval, all_threads):
+        own = threading.get_ident()
+        deadline = time.monotonic() + duration
+        while time.monotonic() < deadline:
+            frames = sys._current_frames()
+            with self._lock:
+                for thread_id, frame in frames.items():
+                    if thread_id != own and (all_threads or thread_id in self.request_threads):
+                        stack = fold_stack(frame)
+                        self.counts[stack] = self.counts.get(stack, 0) + 1
+                self.samples += 1
+            del frames
+            if self._stop.wait(interval):
+                break
+
+    def collapsed(self):
+        """Collapsed stacks, most sampled first"""
+        with self._lock:
+            counts = sorted(self.counts.items(), key=lambda item: -item[1])
+        return ''.join(f'{stack} {count}\n' for stack, count in counts)
+
+    def status(self):
+        return {'running': self.running, 'samples': self.samples, 'stacks': len(self.counts),
+                'started_at': self.started_at, 'duration': self.duration, 'interval': self.interval}
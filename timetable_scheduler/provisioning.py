@@ -0,0 +1,51 @@
+"""
+Bulk student provisioning helpers.
+
+Password hashing is deliberately slow (scrypt/pbkdf2), so hash_passwords()
+spreads it over a process pool and yields hashes in roster order as they
+complete; the caller inserts finished chunks while later ones are still
+being hashed. Everything else here is plain CSV handling.
+"""
+import csv
+import secrets
+import string
+
+from werkzeug.security import generate_password_hash
+
+PASSWORD_ALPHABET = string.ascii_letters + string.digits
+REPORT_COLUMNS = ('username', 'batch', 'password', 'status')
+
+
+def generate_password(length=12):
+    return ''.join(secrets.choice(PASSWORD_ALPHABET) for _ in range(length))
+
+
+def read_roster(lines):
+    """Yield (line_number, username, batch_name, password) from a roster CSV.
+
+    The header must name 'username' and 'batch' columns; an optional
+    'password' column may be left blank to have one generated.
+    """
+    reader = csv.DictReader(lines)
+    fields = {name.strip().lower(): name for name in reader.fieldnames or ()}
+    missing = [column for column in ('username', 'batch') if column not in fields]
+    if missing:
+        raise ValueError(f"Roster is missing column(s): {', '.join(missing)}")
+    for row in reader:
+        password = (row.get(fields.get('password')) or '').strip() if 'password' in fields else ''
+        yield (reader.line_num, (row[fields['username']] or '').strip(), (row[fields['batch']] or '').strip(),
+               password or None)
+
+
+def hash_passwords(passwords, executor=None, chunksize=32):
+    """Hash passwords in order, across executor's processes when one is given"""
+    if executor is None:
+        return map(generate_password_hash, passwords)
+    return executor.map(generate_password_hash, passwords, chunksize=chunksize)
+
+
+def write_report(rows, stream):
+    """Write report rows (dicts keyed by REPORT_COLUMNS) as CSV"""
+    writer = csv.DictWriter(stream, fieldnames=REPORT_COLUMNS)
+    writer.writeheader()
+    writer.writerows(rows)
@@ -0,0 +1,145 @@
+"""
+Publish/subscribe for live timetable updates.
+
+Publishers hand a JSON-serialisable message to a named channel and every
+current subscriber of that channel receives it, in publish order, through
+its own bounded queue. A subscriber that falls too far behind is marked as
+overflowed instead of blocking publishers, and is expected to resync.
+
+LocalBroker delivers within the current process. RedisBroker fans messages
+out to every worker and host through Redis pub/sub, then delivers them to
+that process's subscribers; it needs the optional redis package.
+create_broker() picks one from a URL.
+"""
+import json
+import os
+import queue
+import threading
+
+try:
+    import redis
+except ImportError:  # Only needed for RedisBroker
+    redis = None
+
+
+def format_event(event, data, event_id=None):
+    """One server-sent event carrying data as JSON"""
+    lines = []
+    if event_id is not None:
+        lines.append(f'id: {event_id}')
+    lines.append(f'event: {event}')
+    lines.append(f'data: {json.dumps(data, separators=(",", ":"))}')
+    return '\n'.join(lines) + '\n\n'
+
+
+class Subscription:
+    """Messages for one subscriber of one channel"""
+
+    def __init__(self, broker, channel, maxsize):
+        self.broker = broker
+        self.channel = channel
+        self.overflowed = False
+        self._queue = queue.Queue(maxsize)
+
+    def put(self, message):
+        try:
+            self._queue.put_nowait(message)
+        except queue.Full:
+            self.overflowed = True
+
+    def get(self, timeout=None):
+        """The next message, or None if none arrived within timeout seconds"""
+        try:
+            return self._queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def close(self):
+        self.broker.unsubscribe(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class LocalBroker:
+    """In-process channels - reaches only the subscribers of this worker"""
+
+    def __init__(self, maxsize=100):
+        self.maxsize = maxsize
+        self._lock = threading.Lock()
+        self._channels = {}
+
+    def publish(self, channel, message):
+        self.deliver(channel, message)
+
+    def deliver(self, channel, message):
+        with self._lock:
+            subscribers = list(self._channels.get(channel, ()))
+        for subscription in subscribers:
+            subscription.put(message)
+
+    def subscribe(self, channel):
+        subscription = Subscription(self, channel, self.maxsize)
+        with self._lock:
+            self._channels.setdefault(channel, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscribers = self._channels.get(subscription.channel)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._channels[subscription.channel]
+
+    def subscriber_count(self):
+        with self._lock:
+            return sum(len(subscribers) for subscribers in self._channels.values())
+
+
+class RedisBroker(LocalBroker):
+    """Channels shared by every process through Redis pub/sub"""
+
+    def __init__(self, url, prefix='timetable-scheduler:', maxsize=100):
+        if redis is None:
+            raise RuntimeError('A redis:// PUBSUB_URL needs the redis package (pip install redis)')
+        super().__init__(maxsize)
+        self.prefix = prefix
+        self._client = redis.Redis.from_url(url)
+        self._listener = None
+        self._listener_pid = None
+
+    def publish(self, channel, message):
+        self._client.publish(self.prefix + channel, json.dumps(message))
+
+    def subscribe(self, channel):
+        self._ensure_listener()
+        return super().subscribe(channel)
+
+    def _ensure_listener(self):
+        # One listener thread per process, started lazily so it never crosses a fork
+        with self._lock:
+            if self._listener is not None and self._listener_pid == os.getpid():
+                return
+            pubsub = self._client.pubsub(ignore_subscribe_messages=True)
+            pubsub.psubscribe(**{self.prefix + '*': self._relay})
+            self._listener = pubsub.run_in_thread(sleep_time=1.0, daemon=True)
+            self._listener_pid = os.getpid()
+
+    def _relay(self, message):
+        channel = message['channel']
+        if isinstance(channel, bytes):
+            channel = channel.decode('utf-8')
+        self.deliver(channel[len(self.prefix):], json.loads(message['data']))
+
+
+def create_broker(url=None, maxsize=100):
+    """LocalBroker without a URL, RedisBroker for redis:// and rediss:// URLs"""
+    if not url or url == 'local':
+        return LocalBroker(maxsize)
+    if url.startswith(('redis://', 'rediss://', 'unix://')):
+        return RedisBroker(url, maxsize=maxsize)
+    raise ValueError(f'Unsupported PUBSUB_URL: {url}')
@@ -0,0 +1,33 @@
+"""
+Compact read models for the timetable views.
+
+Pages that only display a timetable select the few columns they show and
+wrap each row in a TimetableSlot namedtuple. Nothing is hydrated into ORM
+entities, added to the session identity map or tracked for changes, which
+keeps per-request memory and CPU proportional to the data actually used.
+"""
+from collections import namedtuple
+
+TimetableSlot = namedtuple('TimetableSlot', (
+    'id', 'day', 'time_slot', 'subject_id', 'subject', 'type',
+    'faculty_id', 'faculty', 'classroom_id', 'classroom'
+))
+
+
+def empty_grid(days, time_slots):
+    """day -> time_slot -> None, ready to be filled with cells"""
+    return {day: dict.fromkeys(time_slots) for day in days}
+
+
+def grid_cell(slot, with_ids=False):
+    """Template-facing dict for one placed class (ids are only needed by the editor)"""
+    cell = {
+        'subject': slot.subject,
+        'faculty': slot.faculty,
+        'classroom': slot.classroom,
+        'type': slot.type
+    }
+    if with_ids:
+        cell.update(id=slot.id, subject_id=slot.subject_id, faculty_id=slot.faculty_id,
+                    classroom_id=slot.classroom_id)
+    return cell
@@ -0,0 +1,107 @@
+"""
+Compact encoding and diffing of timetable placements.
+
+A snapshot is the full set of (day, time_slot, subject, faculty, classroom)
+placements of one batch. Days and slots are stored as indexes into a small
+vocabulary header so that every placement packs into a fixed 14-byte record;
+ids are unsigned 32-bit integers. Records are sorted, so two snapshots of
+the same timetable encode to identical bytes and can be compared directly.
+
+diff_placements() works out the fewest row inserts, updates and deletes
+needed to move a stored timetable to a new set of placements.
+"""
+import json
+import struct
+
+MAGIC = b'TT1'
+RECORD = struct.Struct('<BBIII')
+HEADER_LENGTH = struct.Struct('<H')
+
+
+def encode_entries(entries, days, slots):
+    """Pack (day, time_slot, subject_id, faculty_id, classroom_id) tuples into bytes.
+
+    days and slots seed the vocabulary; any other value found in entries is
+    appended to it, so legacy slot labels survive a round trip.
+    """
+    days, slots = list(days), list(slots)
+    day_index = {day: i for i, day in enumerate(days)}
+    slot_index = {slot: i for i, slot in enumerate(slots)}
+    records = []
+    # Sorted input keeps the vocabulary (and so the bytes) identical for identical timetables
+    for day, time_slot, subject_id, faculty_id, classroom_id in sorted(tuple(entry) for entry in entries):
+        if day not in day_index:
+            day_index[day] = len(days)
+            days.append(day)
+        if time_slot not in slot_index:
+            slot_index[time_slot] = len(slots)
+            slots.append(time_slot)
+        records.append((day_index[day], slot_index[time_slot], int(subject_id), int(faculty_id), int(classroom_id)))
+    records.sort()
+    header = json.dumps([days, slots], separators=(',', ':')).encode('utf-8')
+    body = b''.join(RECORD.pack(*record) for record in records)
+    return MAGIC + HEADER_LENGTH.pack(len(header)) + header + body
+
+
+def decode_entries(payload):
+    """Unpack a snapshot into a list of (day, time_slot, subject_id, faculty_id, classroom_id)"""
+    payload = bytes(payload)
+    if not payload.startswith(MAGIC):
+        raise ValueError('Not a timetable snapshot')
+    offset = len(MAGIC)
+    (header_length,) = HEADER_LENGTH.unpack_from(payload, offset)
+    offset += HEADER_LENGTH.size
+    days, slots = json.loads(payload[offset:offset + header_length].decode('utf-8'))
+    offset += header_length
+    return [(days[day], slots[slot], subject_id, faculty_id, classroom_id)
+            for day, slot, subject_id, faculty_id, classroom_id in RECORD.iter_unpack(payload[offset:])]
+
+
+def entry_count(payload):
+    """Number of placements in an encoded snapshot without decoding it"""
+    offset = len(MAGIC)
+    (header_length,) = HEADER_LENGTH.unpack_from(payload, offset)
+    return (len(payload) - offset - HEADER_LENGTH.size - header_length) // RECORD.size
+
+
+def diff_placements(existing, placements):
+    """Minimal changes that turn stored rows into a new set of placements.
+
+    existing is a list of (row_id, placement) and placements a list of
+    placements, each (day, time_slot, subject_id, faculty_id, classroom_id).
+    Rows that already match keep their identity; a row whose day and slot are
+    still used is updated in place rather than deleted and re-inserted.
+
+    Returns (unchanged_ids, updates, inserts, deletes) where updates is a
+    list of (row_id, placement), inserts a list of placements and deletes a
+    list of row ids.
+    """
+    unmatched = {}
+    for row_id, placement in sorted(existing):
+        unmatched.setdefault(tuple(placement), []).append(row_id)
+
+    unchanged = []
+    remaining = []
+    for placement in placements:
+        row_ids = unmatched.get(tuple(placement))
+        if row_ids:
+            unchanged.append(row_ids.pop(0))
+        else:
+            remaining.append(tuple(placement))
+
+    # Rows left over, by (day, time_slot), can be reused for a different class in the same slot
+    by_slot = {}
+    for placement, row_ids in unmatched.items():
+        by_slot.setdefault(placement[:2], []).extend(row_ids)
+
+    updates = []
+    inserts = []
+    for placement in remaining:
+        row_ids = by_slot.get(placement[:2])
+        if row_ids:
+            updates.append((row_ids.pop(0), placement))
+        else:
+            inserts.append(placement)
+
+    deletes = sorted(row_id for row_ids in by_slot.values() for row_id in row_ids)
+    return unchanged, updates, inserts, deletes
@@ -0,0 +1,463 @@
+"""
+Timetable solver for one batch, and a portfolio runner for several attempts.
+
+solve() is a pure function of a picklable problem dict, a seed and a
+configuration, so attempts can run in a process pool and any result can be
+reproduced from its (seed, config). check_feasibility() runs counting
+bounds first, so impossible inputs are rejected without solving. Rooms, faculty and the batch itself keep
+a bitmask of occupied one-hour periods per day (2-hour labs cover two
+periods), seeded with the bookings of every other batch so a new timetable
+never double-books a shared room or faculty member. Periods outside a
+faculty member's availability are seeded as booked too, so they drop out
+of every slot domain through the same AND; preferred periods are tried
+first.
+
+problem = {
+    'subjects': [{'id', 'name', 'type', 'hours_per_week', 'faculty_id'}, ...],
+    'classrooms': [(id, capacity, type), ...],   # available rooms, by id
+    'strength': batch strength,
+    'days', 'slots', 'lab_slots', 'slot_periods', 'lunch_slot',
+    'faculty_busy': [(faculty_id, day, time_slot), ...],   # other batches
+    'room_busy': [(classroom_id, day, time_slot), ...],
+    'faculty_limits': [(faculty_id, max_hours_per_day), ...],   # optional
+    'faculty_load': [(faculty_id, day, hours), ...],   # hours other batches already use
+    'faculty_available': [(faculty_id, day, period_mask), ...],   # optional, only restricted faculty
+    'faculty_preferred': [(faculty_id, day, period_mask), ...]   # optional, only faculty with preferences
+}
+Period masks use the bit layout of slot masks: bit i is problem['slots'][i].
+
+"""
+import concurrent.futures
+import hashlib
+import json
+import random
+import statistics
+import time
+
+# Configurations a portfolio cycles through - they trade off differently, not just by seed
+CONFIGS = (
+    {'room_strategy': 'first', 'spread_days': False},
+    {'room_strategy': 'best_fit', 'spread_days': True},
+    {'room_strategy': 'best_fit', 'spread_days': False},
+    {'room_strategy': 'first', 'spread_days': True},
+)
+
+SEED_BITS = 32
+
+
+def new_seed():
+    return random.SystemRandom().getrandbits(SEED_BITS)
+
+
+def problem_key(problem, **settings):
+    """Stable hash of a problem and the portfolio settings used to solve it.
+
+    Other batches' bookings only ever set bits, so their order carries no
+    meaning and they are sorted first; subject and room order do affect the
+    result and are hashed as given.
+    """
+    canonical = dict(problem,
+                     faculty_busy=sorted(problem['faculty_busy']),
+                     room_busy=sorted(problem['room_busy']),
+                     faculty_load=sorted(problem.get('faculty_load', ())),
+                     faculty_limits=sorted(problem.get('faculty_limits', ())),
+                     faculty_available=sorted(problem.get('faculty_available', ())),
+                     faculty_preferred=sorted(problem.get('faculty_preferred', ())),
+                     settings=settings)
+    encoded = json.dumps(canonical, sort_keys=True, separators=(',', ':'), default=list)
+    return hashlib.sha256(encoded.encode('utf-8')).hexdigest()
+
+
+class _Occupancy:
+    """Period bitmasks per (resource, day)"""
+
+    def __init__(self, slot_masks):
+        self.slot_masks = slot_masks
+        self.masks = {}
+
+    def book(self, key, day, time_slot):
+        self.block(key, day, self.slot_masks.get(time_slot, 0))
+
+    def block(self, key, day, mask):
+        self.masks[(key, day)] = self.masks.get((key, day), 0) | mask
+
+    def is_free(self, key, day, mask):
+        return not self.masks.get((key, day), 0) & mask
+
+
+def _slot_masks(slots, slot_periods):
+    period_bit = {slot: 1 << i for i, slot in enumerate(slots)}
+    masks = {}
+    for time_slot, periods in slot_periods.items():
+        mask = 0
+        for period in periods:
+            mask |= period_bit[period]
+        masks[time_slot] = mask
+    return masks
+
+
+def _faculty_occupancy(problem, slot_masks):
+    """Faculty bookings by other batches, plus every period outside their availability"""
+    occupancy = _Occupancy(slot_masks)
+    for faculty_id, day, time_slot in problem['faculty_busy']:
+        occupancy.book(faculty_id, day, time_slot)
+    all_periods = (1 << len(problem['slots'])) - 1
+    for faculty_id, day, available in problem.get('faculty_available', ()):
+        occupancy.block(faculty_id, day, all_periods & ~available)
+    return occupancy
+
+
+def _disjoint_count(masks):
+    """Most slots from masks that can run on one day without overlapping (slots are contiguous periods)"""
+    taken = 0
+    count = 0
+    for mask in sorted(set(masks), key=lambda mask: (mask.bit_length(), mask)):
+        if not mask & taken:
+            taken |= mask
+            count += 1
+    return count
+
+
+def check_feasibility(problem, faculty_names=None):
+    """Necessary conditions the problem must meet before it is worth solving.
+
+    Every check is a counting bound (weekly hours against free periods, lab
+    sessions against free lab-room slots, each faculty member's hours against
+    their daily limits and free periods), so a reported error is proof the
+    weekly hours cannot all be scheduled. Passing does not guarantee the
+    solver succeeds. Returns {'errors', 'warnings', 'elapsed_ms'}.
+    """
+    started = time.perf_counter()
+    errors = []
+    warnings = []
+    faculty_names = faculty_names or {}
+    days = problem['days']
+    slot_masks = _slot_masks(problem['slots'], problem['slot_periods'])
+    periods = [slot_masks[slot] for slot in problem['slots'] if slot != problem['lunch_slot']]
+    lab_masks = {slot: slot_masks[slot] for slot in problem['lab_slots']}
+
+    faculty_busy = _faculty_occupancy(problem, slot_masks)
+    restricted = {faculty_id for faculty_id, _, _ in problem.get('faculty_available', ())}
+    room_busy = _Occupancy(slot_masks)
+    for classroom_id, day, time_slot in problem['room_busy']:
+        room_busy.book(classroom_id, day, time_slot)
+    limits = dict(problem.get('faculty_limits', ()))
+    load = {(faculty_id, day): hours for faculty_id, day, hours in problem.get('faculty_load', ())}
+
+    # Weekly demand: theory hours, and practicals as 2-hour lab sessions
+    demand = {}
+    sessions = {}
+    for subject in problem['subjects']:
+        faculty_id = subject['faculty_id']
+        if subject['type'] == 'practical':
+            count = (subject['hours_per_week'] + 1) // 2
+            sessions[faculty_id] = sessions.get(faculty_id, 0) + count
+            demand[faculty_id] = demand.get(faculty_id, 0) + count * 2
+        else:
+            demand[faculty_id] = demand.get(faculty_id, 0) + subject['hours_per_week']
+    total_hours = sum(demand.values())
+    total_sessions = sum(sessions.values())
+
+    # The batch itself: one class at a time, lunch kept free
+    batch_periods = len(days) * len(periods)
+    if total_hours > batch_periods:
+        errors.append(f'Subjects need {total_hours} hours a week but the batch only has {batch_periods} '
+                      f'teaching periods ({len(days)} days x {len(periods)} periods)')
+    batch_lab_sessions = len(days) * _disjoint_count(lab_masks.values())
+    if total_sessions > batch_lab_sessions:
+        errors.append(f'Practicals need {total_sessions} lab sessions a week but the batch can fit at most '
+                      f'{batch_lab_sessions} ({_disjoint_count(lab_masks.values())} per day)')
+
+    # Rooms: seats for the whole batch, and a free room in enough periods
+    classrooms = problem['classrooms']
+    strength = problem.get('strength') or 0
+    if not classrooms:
+        errors.append('No classrooms are available')
+    elif strength and max(room[1] for room in classrooms) < strength:
+        errors.append(f'No available classroom seats {strength} students '
+                      f'(the largest holds {max(room[1] for room in classrooms)})')
+    else:
+        room_periods = sum(1 for day in days for mask in periods
+                           if any(room_busy.is_free(room[0], day, mask) for room in classrooms))
+        if batch_periods >= total_hours > room_periods:
+            errors.append(f'Subjects need {total_hours} hours a week but a classroom is free '
+                          f'in only {room_periods} periods')
+
+    # Labs: sessions that can start in a free lab room, at most one overlap-free set per day
+    labs = [room for room in classrooms if room[2] == 'lab']
+    if total_sessions and classrooms:
+        def lab_capacity(rooms):
+            return sum(_disjoint_count([mask for mask in lab_masks.values()
+                                        if any(room_busy.is_free(room[0], day, mask) for room in rooms)])
+                       for day in days)
+
+        lab_room_sessions = lab_capacity(labs)
+        if total_sessions > lab_room_sessions:
+            any_room_sessions = lab_capacity(classrooms)
+            if total_sessions > any_room_sessions:
+                errors.append(f'Practicals need {total_sessions} lab sessions a week but rooms are free '
+                              f'for only {any_room_sessions}')
+            else:
+                warnings.append(f'Practicals need {total_sessions} lab sessions a week but lab rooms are free '
+                                f'for only {lab_room_sessions}; the rest will use regular classrooms')
+
+    # Faculty: hours left under the daily limit and free periods, day by day, for everything
+    # they teach this batch - a member shared between subjects or batches runs out first
+    for faculty_id, hours in sorted(demand.items()):
+        name = faculty_names.get(faculty_id, f'Faculty #{faculty_id}')
+        limit = limits.get(faculty_id) or 0
+        capacity = 0
+        lab_capacity = 0
+        for day in days:
+            busy = faculty_busy.masks.get((faculty_id, day), 0)
+            free = sum(1 for mask in periods if not busy & mask)
+            remaining = max(limit - load.get((faculty_id, day), 0), 0) if limit else free
+            capacity += min(free, remaining)
+            lab_capacity += min(_disjoint_count([mask for mask in lab_masks.values() if not busy & mask]),
+                                remaining // 2)
+        if hours > capacity:
+            detail = f'{limit} hours/day x {len(days)} days' if limit else f'{len(days)} days'
+            elsewhere = sum(load.get((faculty_id, day), 0) for day in days)
+            if elsewhere:
+                detail += f', {elsewhere} hours already taught to other batches'
+            if faculty_id in restricted:
+                detail += ', only within their availability'
+            errors.append(f'{name} is assigned {hours} hours a week but can teach at most {capacity} more ({detail})')
+        elif sessions.get(faculty_id, 0) > lab_capacity:
+            errors.append(f'{name} is assigned {sessions[faculty_id]} lab sessions a week but has room '
+                          f'for only {lab_capacity} within their daily limit')
+
+    return {
+        'errors': errors,
+        'warnings': warnings,
+        'elapsed_ms': round((time.perf_counter() - started) * 1000, 2)
+    }
+
+
+def solve(problem, seed, config=None):
+    """Build one timetable attempt: placements plus warnings and a quality score.
+
+    'shortfalls' lists every subject placed for fewer hours than its
+    hours_per_week, as {'subject_id', 'name', 'demanded', 'scheduled'}.
+    """
+    started = time.perf_counter()
+    config = dict(CONFIGS[0], **(config or {}))
+    rng = random.Random(seed)
+
+    days = problem['days']
+    lunch_slot = problem['lunch_slot']
+    slot_masks = _slot_masks(problem['slots'], problem['slot_periods'])
+    faculty = _faculty_occupancy(problem, slot_masks)
+    rooms = _Occupancy(slot_masks)
+    batch = _Occupancy(slot_masks)
+    for classroom_id, day, time_slot in problem['room_busy']:
+        rooms.book(classroom_id, day, time_slot)
+
+    # Daily hour limits, checked against a running count seeded from other batches
+    limits = dict(problem.get('faculty_limits', ()))
+    load = {(faculty_id, day): hours for faculty_id, day, hours in problem.get('faculty_load', ())}
+
+    def within_limit(faculty_id, day, hours):
+        limit = limits.get(faculty_id)
+        return not limit or load.get((faculty_id, day), 0) + hours <= limit
+
+    # Preferred periods per (faculty, day); a member without any is happy everywhere
+    preferred = {(faculty_id, day): mask for faculty_id, day, mask in problem.get('faculty_preferred', ())}
+    preferring = {faculty_id for faculty_id, _ in preferred}
+
+    def is_preferred(faculty_id, day, mask):
+        return faculty_id not in preferring or preferred.get((faculty_id, day), 0) & mask == mask
+
+    classrooms = problem['classrooms']
+    strength = problem.get('strength') or 0
+
+    capacity = {room[0]: room[1] for room in classrooms}
+
+    def pick_room(day, mask, lab):
+        free = [room for room in classrooms if rooms.is_free(room[0], day, mask)]
+        if not free:
+            return None
+        # Only rooms that seat the whole batch, whatever the strategy, unless none of them is free
+        fitting = [room for room in free if room[1] >= strength]
+        candidates = fitting or free
+        if lab:
+            candidates = [room for room in candidates if room[2] == 'lab'] or candidates
+        if not fitting:
+            # The largest room leaves the fewest students without a seat
+            return max(candidates, key=lambda room: (room[1], -room[0]))
+        if config['room_strategy'] == 'best_fit':
+            return min(candidates, key=lambda room: (room[1], room[0]))
+        return candidates[0]
+
+    placements = []
+    warnings = []
+    subject_days = {}
+    target_hours = 0
+    scheduled_hours = 0
+    unpreferred_hours = 0
+    undersized_hours = 0
+    subject_hours = {}
+
+    def book(subject, day, time_slot, room_id):
+        nonlocal unpreferred_hours, undersized_hours
+        placements.append((day, time_slot, subject['id'], subject['faculty_id'], room_id))
+        if capacity[room_id] < strength:
+            undersized_hours += len(problem['slot_periods'].get(time_slot, (time_slot,)))
+        if not is_preferred(subject['faculty_id'], day, slot_masks[time_slot]):
+            unpreferred_hours += len(problem['slot_periods'].get(time_slot, (time_slot,)))
+        faculty.book(subject['faculty_id'], day, time_slot)
+        rooms.book(room_id, day, time_slot)
+        batch.book(None, day, time_slot)
+        subject_days.setdefault(subject['id'], []).append(day)
+        key = (subject['faculty_id'], day)
+        load[key] = load.get(key, 0) + len(problem['slot_periods'].get(time_slot, (time_slot,)))
+        subject_hours[subject['id']] = (subject_hours.get(subject['id'], 0)
+                                        + len(problem['slot_periods'].get(time_slot, (time_slot,))))
+
+    available_slots = [(day, time_slot) for day in days for time_slot in problem['slots'] if time_slot != lunch_slot]
+    rng.shuffle(available_slots)
+
+    for subject in problem['subjects']:
+        faculty_id = subject['faculty_id']
+        hours = subject['hours_per_week']
+
+        # Practical subjects run as continuous 2-hour lab sessions
+        if subject['type'] == 'practical':
+            sessions = (hours + 1) // 2
+            target_hours += sessions * 2
+            lab_options = [(day, lab_slot) for day in days for lab_slot in problem['lab_slots']]
+            rng.shuffle(lab_options)
+            lab_options.sort(key=lambda option: not is_preferred(faculty_id, option[0], slot_masks[option[1]]))
+            for _ in range(sessions):
+                for option in lab_options:
+                    day, lab_slot = option
+                    mask = slot_masks[lab_slot]
+                    if not batch.is_free(None, day, mask) or not faculty.is_free(faculty_id, day, mask):
+                        continue
+                    if not within_limit(faculty_id, day, 2):
+                        continue
+                    room = pick_room(day, mask, lab=True)
+                    if room is None:
+                        continue
+                    book(subject, day, lab_slot, room[0])
+                    lab_options.remove(option)
+                    scheduled_hours += 2
+                    break
+                else:
+                    warnings.append(f"Could not schedule all lab sessions for {subject['name']}")
+                    break
+
+        # Regular 1-hour classes, every hour the subject asks for
+        else:
+            target_hours += hours
+            for _ in range(hours):
+                candidates = [(day, time_slot) for day, time_slot in available_slots
+                              if batch.is_free(None, day, slot_masks[time_slot])
+                              and faculty.is_free(faculty_id, day, slot_masks[time_slot])
+                              and within_limit(faculty_id, day, 1)]
+                candidates = [c for c in candidates if is_preferred(faculty_id, c[0], slot_masks[c[1]])] or candidates
+                if config['spread_days']:
+                    used_days = subject_days.get(subject['id'], ())
+                    candidates = [c for c in candidates if c[0] not in used_days] or candidates
+                if not candidates:
+                    warnings.append(f"No more available slots for {subject['name']}")
+                    break
+                day, time_slot = candidates[rng.randrange(len(candidates))]
+                room = pick_room(day, slot_masks[time_slot], lab=False)
+                if room is None:
+                    warnings.append(f"No available classroom for {subject['name']}")
+                    break
+                book(subject, day, time_slot, room[0])
+                scheduled_hours += 1
+
+    shortfalls = [{'subject_id': subject['id'], 'name': subject['name'], 'demanded': subject['hours_per_week'],
+                   'scheduled': subject_hours.get(subject['id'], 0)}
+                  for subject in problem['subjects'] if subject_hours.get(subject['id'], 0) < subject['hours_per_week']]
+
+    return {
+        'seed': seed,
+        'config': config,
+        'placements': placements,
+        'warnings': warnings,
+        'shortfalls': shortfalls,
+        # Complete only when every demanded hour was placed
+        'complete': not warnings and not shortfalls,
+        'score': _score(placements, warnings, subject_days, days, problem['slot_periods'],
+                        scheduled_hours, target_hours, unpreferred_hours, undersized_hours),
+        'scheduled_hours': scheduled_hours,
+        'target_hours': target_hours,
+        'elapsed_ms': round((time.perf_counter() - started) * 1000, 1)
+    }
+
+
+def _score(placements, warnings, subject_days, days, slot_periods, scheduled_hours, target_hours,
+           unpreferred_hours=0, undersized_hours=0):
+    """Higher is better: coverage and seats first, then fewer same-day repeats, an even week, preferred hours"""
+    coverage = scheduled_hours / target_hours if target_hours else 1.0
+    repeats = sum(len(used) - len(set(used)) for used in subject_days.values())
+    daily_hours = dict.fromkeys(days, 0)
+    for day, time_slot, *_ in placements:
+        daily_hours[day] += len(slot_periods.get(time_slot, (time_slot,)))
+    imbalance = statistics.pstdev(daily_hours.values()) if daily_hours else 0.0
+    return round(100 * coverage - 5 * len(warnings) - 3 * undersized_hours - 2 * repeats - imbalance
+                 - unpreferred_hours, 3)
+
+
+def _better(candidate, best):
+    return best is None or (candidate['complete'], candidate['score']) > (best['complete'], best['score'])
+
+
+def run_portfolio(problem, attempts, mode='first', time_budget=5.0, seed=None, config_index=0, executor=None):
+    """Run several seeded/configured attempts and keep one.
+
+    mode 'first' returns the first complete timetable; 'best' keeps the
+    highest-scoring one found within time_budget seconds. Attempt i uses
+    seed + i (seed is random unless given) and CONFIGS[config_index + i], so
+    the winner can be re-run on its own from the seed and config_index
+    recorded in its result. Without an executor the attempts run one after
+    another in this process.
+    """
+    started = time.perf_counter()
+    base_seed = new_seed() if seed is None else seed
+    jobs = [((base_seed + i) % (1 << SEED_BITS), (config_index + i) % len(CONFIGS)) for i in range(max(1, attempts))]
+    deadline = started + time_budget
+    best = None
+    finished = 0
+
+    def consider(result, index):
+        nonlocal best, finished
+        finished += 1
+        result['config_index'] = index
+        if _better(result, best):
+            best = result
+
+    if executor is None:
+        for job_seed, index in jobs:
+            consider(solve(problem, job_seed, CONFIGS[index]), index)
+            if (mode == 'first' and best['complete']) or time.perf_counter() > deadline:
+                break
+    else:
+        futures = {executor.submit(solve, problem, job_seed, CONFIGS[index]): index for job_seed, index in jobs}
+        try:
+            for future in concurrent.futures.as_completed(futures, timeout=time_budget):
+                consider(future.result(), futures[future])
+                if mode == 'first' and best['complete']:
+                    break
+        except concurrent.futures.TimeoutError:
+            pass
+        finally:
+            for future in futures:
+                future.cancel()
+        if best is None:
+            # Nothing finished inside the budget - fall back to the first attempt rather than fail
+            job_seed, index = jobs[0]
+            consider(solve(problem, job_seed, CONFIGS[index]), index)
+
+    best['portfolio'] = {
+        'attempts': len(jobs),
+        'finished': finished,
+        'mode': mode,
+        'base_seed': base_seed,
+        'elapsed_ms': round((time.perf_counter() - started) * 1000, 1)
+    }
+    return best
@@ -0,0 +1,137 @@
+/*
+ * Live timetable updates.
+ *
+ * A page keeps a day -> time slot -> class model of one batch's timetable.
+ * LiveTimetable.connect() follows /timetable_stream/<batch_id> and applies
+ * every change delta to the model; LiveTimetable.render() then redraws the
+ * day cells of the page's grid in place, keeping its server-rendered time
+ * column. A delta replaces whole days: {version, days, cells: [{day,
+ * time_slot, entry}]}.
+ */
+const LiveTimetable = (function () {
+    // A lab starting in the key period also covers the next one
+    const LAB_STARTS = {
+        '09:15-10:15': '09:15-11:15',
+        '10:15-11:15': '10:15-12:15',
+        '01:00-02:00': '01:00-03:00',
+        '02:00-03:00': '02:00-04:00'
+    };
+    const LAB_SLOTS = Object.values(LAB_STARTS);
+
+    function escapeHtml(text) {
+        const div = document.createElement('div');
+        div.textContent = text == null ? '' : String(text);
+        return div.innerHTML;
+    }
+
+    function applyDelta(grid, delta) {
+        delta.days.forEach(day => {
+            Object.keys(grid[day]).forEach(slot => { grid[day][slot] = null; });
+        });
+        delta.cells.forEach(cell => { grid[cell.day][cell.time_slot] = cell.entry; });
+    }
+
+    // Cells per row in the order the grid templates lay them out
+    function layout(grid, days, timeSlots, lunchSlot) {
+        const covered = new Set();
+        return timeSlots.map((timeSlot, index) => days
+            .filter(day => !covered.has(day + '_' + timeSlot))
+            .map(day => {
+                if (timeSlot === lunchSlot) {
+                    return {day: day, timeSlot: timeSlot, lunch: true, entry: null, rowspan: 1, isLabStart: false};
+                }
+                const labSlot = LAB_STARTS[timeSlot];
+                if (labSlot && grid[day][labSlot]) {
+                    covered.add(day + '_' + timeSlots[index + 1]);
+                    return {day: day, timeSlot: labSlot, lunch: false, entry: grid[day][labSlot], rowspan: 2, isLabStart: true};
+                }
+                return {day: day, timeSlot: timeSlot, lunch: false, entry: grid[day][timeSlot], rowspan: 1, isLabStart: false};
+            }));
+    }
+
+    // Redraw the day cells of every row; the first headerCells cells of a row are left alone
+    function render(tbody, grid, options) {
+        const rows = layout(grid, options.days, options.timeSlots, options.lunchSlot);
+        rows.forEach((cells, index) => {
+            const row = tbody.rows[index];
+            while (row.cells.length > options.headerCells) {
+                row.deleteCell(-1);
+            }
+            cells.forEach(cell => {
+                const td = options.renderCell(cell);
+                if (cell.rowspan > 1) {
+                    td.rowSpan = cell.rowspan;
+                }
+                row.appendChild(td);
+            });
+        });
+    }
+
+    // Same counting as build_batch_grid()
+    function stats(grid) {
+        const result = {total_hours: 0, theory_count: 0, practical_count: 0, tutorial_count: 0};
+        Object.values(grid).forEach(slots => Object.entries(slots).forEach(([slot, entry]) => {
+            if (!entry) {
+                return;
+            }
+            if (entry.type === 'practical') {
+                result.practical_count += 1;
+                result.total_hours += LAB_SLOTS.includes(slot) ? 2 : 1;
+            } else if (entry.type === 'theory' || entry.type === 'tutorial') {
+                result[entry.type + '_count'] += 1;
+                result.total_hours += 1;
+            }
+        }));
+        return result;
+    }
+
+    /*
+     * Follow a batch's stream. options: url (null for no stream), version (of the rendered grid), grid,
+     * onChange(delta) after a delta is applied, onApproval(message).
+     * Returns {apply(delta), version()} so a page can apply its own writes at once.
+     */
+    function connect(options) {
+        let version = options.version;
+        let source = null;
+
+        function open() {
+            if (source) {
+                source.close();
+            }
+            // A reconnect from an older version starts with the full week
+            source = new EventSource(options.url + '?version=' + encodeURIComponent(version));
+            source.addEventListener('timetable', event => apply(JSON.parse(event.data)));
+            source.addEventListener('approval', event => {
+                const message = JSON.parse(event.data);
+                if (message.version === version && options.onApproval) {
+                    options.onApproval(message);
+                }
+            });
+            source.addEventListener('resync', open);
+        }
+
+        function apply(delta) {
+            if (delta.version <= version) {
+                return;
+            }
+            // A gap means a missed change; only a full week can be applied over it
+            if (delta.version > version + 1 && delta.days.length < Object.keys(options.grid).length) {
+                open();
+                return;
+            }
+            applyDelta(options.grid, delta);
+            version = delta.version;
+            if (options.onChange) {
+                options.onChange(delta);
+            }
+        }
+
+        // No url: the server cannot hold a stream, so only the page's own writes are applied
+        if (options.url && window.EventSource) {
+            open();
+        }
+        return {apply: apply, version: () => version};
+    }
+
+    return {connect: connect, render: render, stats: stats, escapeHtml: escapeHtml};
+})();
@@ -0,0 +1,212 @@
+"""
+Ranked alternative placements for the timetable editor.
+
+OccupancyIndex keeps, for every (resource kind, resource id, day), the
+bookings on it as (entry_id, period bitmask) pairs, so whether a faculty
+member, room or batch is free for a slot is a couple of integer ANDs, and
+the entry being moved can be left out of its own clash checks.
+
+suggest_moves() lists every feasible (day, slot, faculty, room) for an
+existing class and suggest_fills() every (subject, faculty, room) for an
+empty cell. Hard constraints (clashes, faculty daily limits and
+availability, lab slots for practicals) filter candidates; soft ones add
+penalties, and the lowest penalties come first, each with the reasons
+behind its score.
+"""
+import heapq
+
+FACULTY, ROOM, BATCH = 'faculty', 'room', 'batch'
+
+# Soft-constraint penalties
+WEIGHTS = {
+    'move_day': 2.0,               # class moves to another day
+    'move_slot': 1.0,              # class moves to another period
+    'change_faculty': 3.0,
+    'change_room': 1.0,
+    'undersized_room': 10.0,       # scaled by the share of students without a seat
+    'empty_seats': 2.0,            # scaled by the share of seats left empty
+    'practical_outside_lab': 4.0,
+    'lab_for_theory': 2.0,         # labs are scarce, keep them for practicals
+    'same_day_repeat': 3.0,        # per other session of the subject that day
+    'faculty_day_load': 0.5,       # per hour the faculty member already teaches that day
+    'batch_day_load': 0.3,         # per hour the batch already has that day
+    'outside_preferred': 2.0,      # faculty member would rather not teach then
+    'hours_met': 5.0,              # filling with a subject that already has its weekly hours
+    'hours_remaining': -1.0        # per weekly hour a subject still needs
+}
+
+
+def slot_masks(slot_periods, periods):
+    """time_slot -> bitmask over periods"""
+    period_bit = {period: 1 << i for i, period in enumerate(periods)}
+    return {slot: sum(period_bit[period] for period in covered) for slot, covered in slot_periods.items()}
+
+
+class OccupancyIndex:
+    """Bookings of every faculty member, room and batch as period bitmasks per day"""
+
+    def __init__(self, rows, masks):
+        """rows: (entry_id, batch_id, subject_id, faculty_id, classroom_id, day, time_slot)"""
+        self.masks = masks
+        self.bookings = {}
+        # (batch_id, subject_id) -> [(entry_id, day, hours)]
+        self.subject_sessions = {}
+        for entry_id, batch_id, subject_id, faculty_id, classroom_id, day, time_slot in rows:
+            mask = masks.get(time_slot)
+            if mask is None:
+                continue
+            for key in ((FACULTY, faculty_id, day), (ROOM, classroom_id, day), (BATCH, batch_id, day)):
+                self.bookings.setdefault(key, []).append((entry_id, mask))
+            self.subject_sessions.setdefault((batch_id, subject_id), []).append(
+                (entry_id, day, bin(mask).count('1')))
+
+    def busy(self, kind, resource_id, day, exclude=None):
+        mask = 0
+        for entry_id, booked in self.bookings.get((kind, resource_id, day), ()):
+            if entry_id != exclude:
+                mask |= booked
+        return mask
+
+    def hours(self, kind, resource_id, day, exclude=None):
+        return bin(self.busy(kind, resource_id, day, exclude)).count('1')
+
+    def subject_hours(self, batch_id, subject_id, day=None, exclude=None):
+        return sum(hours for entry_id, session_day, hours in self.subject_sessions.get((batch_id, subject_id), ())
+                   if entry_id != exclude and (day is None or session_day == day))
+
+
+def _room_penalty(room, strength, practical, reasons):
+    _, name, capacity, room_type = room
+    penalty = 0.0
+    if strength and capacity < strength:
+        penalty += WEIGHTS['undersized_room'] * (strength - capacity) / strength
+        reasons.append(f'{strength - capacity} students without a seat')
+    elif capacity:
+        penalty += WEIGHTS['empty_seats'] * (capacity - strength) / capacity
+    if practical and room_type != 'lab':
+        penalty += WEIGHTS['practical_outside_lab']
+        reasons.append('not a lab')
+    elif not practical and room_type == 'lab':
+        penalty += WEIGHTS['lab_for_theory']
+        reasons.append('uses a lab')
+    return penalty
+
+
+def _candidates(index, batch_id, subject, slots, faculty, rooms, strength, exclude, base, windows):
+    """Yield (penalty, reasons, day, slot, faculty row, room row) for every feasible placement.
+
+    base(day, slot, faculty_id, room_id, reasons) adds the caller's own
+    penalties (moving the class, changing faculty or room...). windows maps
+    (faculty_id, day) to (available, preferred) period masks, preferred None
+    when the member has no preference; faculty not in it are always available.
+    """
+    practical = subject['type'] == 'practical'
+    for day, time_slot in slots:
+        mask = index.masks[time_slot]
+        if index.busy(BATCH, batch_id, day, exclude) & mask:
+            continue
+        hours = bin(mask).count('1')
+        slot_reasons = []
+        slot_penalty = WEIGHTS['batch_day_load'] * index.hours(BATCH, batch_id, day, exclude)
+        repeats = index.subject_hours(batch_id, subject['id'], day, exclude)
+        if repeats:
+            slot_penalty += WEIGHTS['same_day_repeat'] * repeats
+            slot_reasons.append(f"{subject['name']} already on {day}")
+
+        free_rooms = [room for room in rooms if not index.busy(ROOM, room[0], day, exclude) & mask]
+        if not free_rooms:
+            continue
+        for member in faculty:
+            faculty_id, _, max_hours = member
+            if index.busy(FACULTY, faculty_id, day, exclude) & mask:
+                continue
+            available, preferred = windows.get((faculty_id, day), (None, None))
+            if available is not None and available & mask != mask:
+                continue
+            load = index.hours(FACULTY, faculty_id, day, exclude)
+            if max_hours and load + hours > max_hours:
+                continue
+            faculty_penalty = WEIGHTS['faculty_day_load'] * load
+            faculty_reasons = slot_reasons
+            if preferred is not None and preferred & mask != mask:
+                faculty_penalty += WEIGHTS['outside_preferred']
+                faculty_reasons = slot_reasons + [f"outside {member[1]}'s preferred hours"]
+            for room in free_rooms:
+                reasons = list(faculty_reasons)
+                penalty = slot_penalty + faculty_penalty + _room_penalty(room, strength, practical, reasons)
+                penalty += base(day, time_slot, faculty_id, room[0], reasons)
+                yield penalty, reasons, day, time_slot, member, room
+
+
+def _ranked(candidates, subject, top_k):
+    best = heapq.nsmallest(top_k, candidates, key=lambda candidate: candidate[0])
+    return [{
+        'day': day,
+        'time_slot': time_slot,
+        'subject_id': subject['id'],
+        'subject': subject['name'],
+        'type': subject['type'],
+        'faculty_id': member[0],
+        'faculty': member[1],
+        'classroom_id': room[0],
+        'classroom': room[1],
+        'score': round(penalty, 2),
+        'reasons': reasons
+    } for penalty, reasons, day, time_slot, member, room in best]
+
+
+def suggest_moves(index, entry, subject, faculty, rooms, strength, slots, top_k=10, windows=None):
+    """Best alternative (day, slot, faculty, room) placements for an existing class.
+
+    entry: dict with id, batch_id, day, time_slot, faculty_id, classroom_id
+    subject: dict with id, name, type
+    faculty: (id, name, max_hours_per_day) of everyone who may teach it
+    rooms: (id, name, capacity, type) of the available rooms
+    slots: (day, time_slot) pairs the class may move to
+    windows: faculty availability, as for _candidates()
+    """
+    def base(day, time_slot, faculty_id, room_id, reasons):
+        penalty = 0.0
+        if day != entry['day']:
+            penalty += WEIGHTS['move_day']
+        if time_slot != entry['time_slot']:
+            penalty += WEIGHTS['move_slot']
+        if faculty_id != entry['faculty_id']:
+            penalty += WEIGHTS['change_faculty']
+            reasons.append('different faculty')
+        if room_id != entry['classroom_id']:
+            penalty += WEIGHTS['change_room']
+        return penalty
+
+    candidates = (candidate for candidate in _candidates(
+        index, entry['batch_id'], subject, slots, faculty, rooms, strength, entry['id'], base, windows or {})
+        # The class as it stands is not an alternative
+        if candidate[2:4] != (entry['day'], entry['time_slot'])
+        or candidate[4][0] != entry['faculty_id'] or candidate[5][0] != entry['classroom_id'])
+    return _ranked(candidates, subject, top_k)
+
+
+def suggest_fills(index, batch_id, subjects, rooms, strength, slots, top_k=10, windows=None):
+    """Best (subject, faculty, room) to put into an empty cell.
+
+    subjects: dicts with id, name, type, hours_per_week and faculty, a list
+    of (id, name, max_hours_per_day); slots: the (day, time_slot) pairs the
+    cell can hold (a 1-hour slot, or a 2-hour lab starting there); windows:
+    faculty availability, as for _candidates().
+    """
+    ranked = []
+    for subject in subjects:
+        remaining = subject['hours_per_week'] - index.subject_hours(batch_id, subject['id'])
+
+        def base(day, time_slot, faculty_id, room_id, reasons, remaining=remaining):
+            if remaining <= 0:
+                reasons.append('weekly hours already met')
+                return WEIGHTS['hours_met']
+            return WEIGHTS['hours_remaining'] * remaining
+
+        practical = subject['type'] == 'practical'
+        subject_slots = [(day, time_slot) for day, time_slot in slots
+                         if practical == (bin(index.masks[time_slot]).count('1') > 1)]
+        ranked.extend(_ranked(_candidates(index, batch_id, subject, subject_slots, subject['faculty'],
+                                          rooms, strength, None, base, windows or {}), subject, top_k))
+    return heapq.nsmallest(top_k, ranked, key=lambda suggestion: suggestion['score'])